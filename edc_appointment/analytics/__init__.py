@@ -1 +1 @@
-from .dataframes import get_appointment_df
+from .dataframes import get_appointment_df, get_appointment_df_by_site
@@ -1 +1 @@
-from .get_appointment_df import get_appointment_df
+from .get_appointment_df import get_appointment_df, get_appointment_df_by_site
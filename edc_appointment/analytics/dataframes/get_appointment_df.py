@@ -1,91 +1,218 @@
+from __future__ import annotations
+
+from itertools import islice
+from typing import TYPE_CHECKING, Iterator
+
 import pandas as pd
 from django.apps import apps as django_apps
-from django_pandas.io import read_frame
 from edc_pdutils.utils import convert_dates_from_model
+from pandas.api.types import union_categoricals
 
 from ...constants import NEW_APPT
 from ...utils import get_appointment_model_cls
 
+if TYPE_CHECKING:
+    from django.db.models import QuerySet
+
+__all__ = ["get_appointment_df", "get_appointment_df_by_site"]
+
+CATEGORY_COLUMNS = [
+    "subject_identifier",
+    "visit_schedule_name",
+    "schedule_name",
+    "visit_code",
+    "appt_status",
+    "appt_timing",
+    "appt_reason",
+]
+
+DEFAULT_CHUNK_SIZE = 5000
+
 
 def get_appointment_df(
     normalize: bool | None = None,
     localize: bool | None = None,
     values: list[str] | None = None,
     site_id: int | None = None,
+    chunk_size: int | None = None,
 ) -> pd.DataFrame:
-    normalize = True if normalize is None else normalize
-    localize = True if localize is None else localize
-    appointment_model_cls = get_appointment_model_cls()
-    appointment_type_model_cls = django_apps.get_model("edc_appointment.appointmenttype")
-    opts = {}
+    """Returns a dataframe of appointments with the baseline, last
+    and next appointment merged in per subject.
+
+    Rows are read from the DB in chunks of `chunk_size` into typed
+    columns. String columns with few distinct values (e.g.
+    subject_identifier, visit_code, appt_status) are categoricals,
+    integer columns are downcast and float columns are float32.
+    """
+    queryset = get_appointment_model_cls().objects.all()
     if site_id:
-        opts = {"site_id": site_id}
-    if values:
-        df_appt = read_frame(
-            appointment_model_cls.objects.values(*values).filter(**opts), verbose=False
+        queryset = queryset.filter(site_id=site_id)
+    return get_appointment_df_for_queryset(
+        queryset,
+        normalize=normalize,
+        localize=localize,
+        values=values,
+        chunk_size=chunk_size,
+    )
+
+
+def get_appointment_df_by_site(
+    normalize: bool | None = None,
+    localize: bool | None = None,
+    values: list[str] | None = None,
+    chunk_size: int | None = None,
+) -> Iterator[tuple[int, pd.DataFrame]]:
+    """Yields a tuple of (site_id, dataframe) per site instead of
+    materializing one dataframe for all sites.
+
+    See `get_appointment_df`.
+    """
+    site_ids = list(
+        get_appointment_model_cls()
+        .objects.values_list("site_id", flat=True)
+        .order_by("site_id")
+        .distinct()
+    )
+    for site_id in site_ids:
+        yield site_id, get_appointment_df(
+            normalize=normalize,
+            localize=localize,
+            values=values,
+            site_id=site_id,
+            chunk_size=chunk_size,
         )
-    else:
-        df_appt = read_frame(appointment_model_cls.objects.filter(**opts), verbose=False)
-    df_appt = convert_dates_from_model(
-        df_appt, appointment_model_cls, normalize=normalize, localize=localize
+
+
+def get_appointment_df_for_queryset(
+    queryset: QuerySet,
+    normalize: bool | None = None,
+    localize: bool | None = None,
+    values: list[str] | None = None,
+    chunk_size: int | None = None,
+) -> pd.DataFrame:
+    normalize = True if normalize is None else normalize
+    localize = True if localize is None else localize
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    model_cls = queryset.model
+    fields = (
+        [model_cls._meta.get_field(name) for name in values]
+        if values
+        else model_cls._meta.concrete_fields
     )
+    columns = [field.attname for field in fields]
+    rows = queryset.order_by().values_list(*columns).iterator(chunk_size=chunk_size)
+    frames = []
+    while True:
+        df = pd.DataFrame.from_records(list(islice(rows, chunk_size)), columns=columns)
+        if frames and df.empty:
+            break
+        df = convert_dates_from_model(df, model_cls, normalize=normalize, localize=localize)
+        frames.append(to_typed_columns(df, fields))
+        if len(df) < chunk_size:
+            break
+    df_appt = concat_typed(frames)
+    del frames
     df_appt = df_appt.rename(
         columns={
             "id": "appointment_id",
-            "site": "site_id",
+            **{
+                field.attname: field.name
+                for field in fields
+                if field.is_relation and field.name != "site"
+            },
         }
     )
+
     # rework visit code
     df_appt["visit_code_str"] = df_appt["visit_code"]
-    df_appt["visit_code"] = df_appt["visit_code"].astype(float)
-    df_appt["visit_code_sequence"] = df_appt["visit_code_sequence"].astype(float)
-    df_appt["visit_code_sequence"] = df_appt["visit_code_sequence"].apply(
-        lambda x: x / 10.0 if x > 0.0 else 0.0
+    df_appt["visit_code"] = df_appt["visit_code"].astype("float64")
+    visit_code_sequence = df_appt["visit_code_sequence"].astype("float64")
+    df_appt["visit_code_sequence"] = (visit_code_sequence / 10.0).where(
+        visit_code_sequence > 0.0, 0.0
     )
     df_appt["visit_code"] = df_appt["visit_code"] + df_appt["visit_code_sequence"]
 
-    # merge in baseline_datetime
-    df_baseline = df_appt.copy()
-    df_baseline = df_baseline[(df_baseline["visit_code"] == 1000.0)]
-    df_baseline = df_baseline.rename(columns={"appt_datetime": "baseline_datetime"})
-    df_baseline = df_baseline[["subject_identifier", "baseline_datetime"]]
-    df_appt = df_appt.merge(df_baseline, on="subject_identifier", how="left")
-
-    # merge in last appointment
-    df_last = (
-        df_appt[df_appt.appt_status != NEW_APPT]
-        .groupby("subject_identifier")
-        .agg({"visit_code": "max", "appt_datetime": "max"})
-    ).copy()
-    df_last = df_last.rename(
-        columns={"visit_code": "endline_visit_code", "appt_datetime": "last_appt_datetime"}
+    # baseline, last and next appointment per subject
+    add_subject_aggregates(df_appt)
+
+    # appt type
+    if "appt_type" in df_appt.columns:
+        appt_types = dict(
+            django_apps.get_model("edc_appointment.appointmenttype").objects.values_list(
+                "id", "name"
+            )
+        )
+        appt_type = df_appt.pop("appt_type").map(appt_types)
+        df_appt["appt_type"] = appt_type.astype("category")
+    return df_appt
+
+
+def add_subject_aggregates(df_appt: pd.DataFrame) -> None:
+    """Adds the baseline, last and next appointment columns for each
+    subject in place using vectorized groupby transforms.
+    """
+    groupby_opts = dict(by=df_appt["subject_identifier"], observed=True, sort=False)
+    not_new = df_appt["appt_status"] != NEW_APPT
+
+    df_appt["baseline_datetime"] = (
+        df_appt["appt_datetime"]
+        .where(df_appt["visit_code"] == 1000.0)
+        .groupby(**groupby_opts)
+        .transform("max")
     )
-    df_last["endline_visit_code_str"] = (
-        df_last["endline_visit_code"].astype("int64").apply(lambda x: str(x))
+    df_appt["endline_visit_code"] = (
+        df_appt["visit_code"].where(not_new).groupby(**groupby_opts).transform("max")
     )
-    df_last = df_last.reset_index()
-    df_appt = df_appt.merge(df_last, on="subject_identifier", how="left")
-
-    # merge in next appointment
-    df_next = (
-        df_appt[df_appt.appt_status == NEW_APPT]
-        .groupby("subject_identifier")
-        .agg({"visit_code": "min", "appt_datetime": "min"})
-    ).copy()
-    df_next = df_next.rename(
-        columns={"visit_code": "next_visit_code", "appt_datetime": "next_appt_datetime"}
+    df_appt["last_appt_datetime"] = (
+        df_appt["appt_datetime"].where(not_new).groupby(**groupby_opts).transform("max")
     )
-    df_next["next_visit_code_str"] = (
-        df_next["next_visit_code"].astype("int64").apply(lambda x: str(x))
+    df_appt["endline_visit_code_str"] = visit_code_to_str(df_appt["endline_visit_code"])
+    df_appt["next_visit_code"] = (
+        df_appt["visit_code"].where(~not_new).groupby(**groupby_opts).transform("min")
     )
-    df_next = df_next.reset_index()
-    df_appt = df_appt.merge(df_next, on="subject_identifier", how="left")
+    df_appt["next_appt_datetime"] = (
+        df_appt["appt_datetime"].where(~not_new).groupby(**groupby_opts).transform("min")
+    )
+    df_appt["next_visit_code_str"] = visit_code_to_str(df_appt["next_visit_code"])
 
-    # merge in appt type
-    df1 = read_frame(appointment_type_model_cls.objects.values("id", "name").all())
-    df1 = df1.rename(columns={"id": "appt_type"})
-    df_appt = df_appt.merge(df1, on="appt_type", how="left")
-    df_appt = df_appt.drop(columns=["appt_type"])
-    df_appt = df_appt.rename(columns={"name": "appt_type"})
 
-    return df_appt
+def visit_code_to_str(visit_code: pd.Series) -> pd.Series:
+    """Returns the integer part of a float visit code as a
+    categorical string, e.g. 1000.1 -> "1000".
+    """
+    return visit_code.floordiv(1).astype("Int64").astype("string").astype("category")
+
+
+def to_typed_columns(df: pd.DataFrame, fields: list) -> pd.DataFrame:
+    """Returns the dataframe with compact dtypes by model field."""
+    for field in fields:
+        column = field.attname
+        internal_type = field.get_internal_type()
+        if column in CATEGORY_COLUMNS or (field.choices and internal_type == "CharField"):
+            df[column] = df[column].astype("category")
+        elif internal_type in [
+            "AutoField",
+            "BigIntegerField",
+            "IntegerField",
+            "PositiveIntegerField",
+            "PositiveSmallIntegerField",
+            "SmallIntegerField",
+        ] or (field.is_relation and field.target_field.get_internal_type() == "AutoField"):
+            df[column] = pd.to_numeric(df[column], downcast="integer")
+        elif internal_type in ["DecimalField", "FloatField"]:
+            df[column] = df[column].astype("float32")
+    return df
+
+
+def concat_typed(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """Returns the frames concatenated column by column, keeping
+    categoricals categorical.
+    """
+    data = {}
+    for column in frames[0].columns:
+        series = [frame.pop(column) for frame in frames]
+        if isinstance(series[0].dtype, pd.CategoricalDtype):
+            data[column] = pd.Series(union_categoricals(series), name=column)
+        else:
+            data[column] = pd.concat(series, ignore_index=True)
+    return pd.DataFrame(data)
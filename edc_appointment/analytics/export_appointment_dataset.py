@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import json
+from datetime import datetime
+from pathlib import Path
+from uuid import uuid4
+
+from django.db.models import Max
+from django.utils import timezone
+
+from ..utils import get_appointment_model_cls
+from .dataframes.get_appointment_df import get_appointment_df_for_queryset
+
+__all__ = [
+    "ExportAppointmentDatasetError",
+    "compact_appointment_dataset",
+    "export_appointment_dataset",
+]
+
+PARTITION_COLS = ["site_id", "visit_schedule_name"]
+WATERMARK_FILENAME = "_watermark.json"
+
+
+class ExportAppointmentDatasetError(Exception):
+    pass
+
+
+def import_pyarrow():
+    """Returns the pyarrow and pyarrow.parquet modules.
+
+    pyarrow is only needed to export and is not a requirement of
+    this package.
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ExportAppointmentDatasetError(
+            f"Exporting the appointment dataset requires `pyarrow`. Got {e}."
+        )
+    return pyarrow, pyarrow.parquet
+
+
+def get_watermarks(path: Path) -> dict[int, datetime]:
+    """Returns the largest `modified` value of the last export of
+    each site.
+    """
+    try:
+        data = json.loads((path / WATERMARK_FILENAME).read_text())
+    except FileNotFoundError:
+        return {}
+    return {int(k): datetime.fromisoformat(v) for k, v in data.items()}
+
+
+def set_watermarks(path: Path, watermarks: dict[int, datetime]) -> None:
+    (path / WATERMARK_FILENAME).write_text(
+        json.dumps({str(k): v.isoformat() for k, v in sorted(watermarks.items())})
+    )
+
+
+def decode_dictionaries(table):
+    """Returns the table with dictionary columns cast to their
+    value type.
+
+    The index type of a dictionary column depends on the number of
+    categories in the part file, so part files with dictionary
+    columns cannot be concatenated.
+    """
+    pa, _ = import_pyarrow()
+    schema = pa.schema(
+        [
+            (
+                field.with_type(field.type.value_type)
+                if pa.types.is_dictionary(field.type)
+                else field
+            )
+            for field in table.schema
+        ],
+        metadata=table.schema.metadata,
+    )
+    return table.cast(schema)
+
+
+def get_part_basename() -> str:
+    """Returns a basename template for new part files.
+
+    Part files sort by the time they were written so that, for a
+    given appointment, the row in the last part file is the latest.
+    """
+    return f"part-{timezone.now().strftime('%Y%m%dT%H%M%S%f')}-{uuid4().hex[:8]}-{{i}}.parquet"
+
+
+def export_appointment_dataset(
+    path: str | Path,
+    incremental: bool | None = None,
+    site_id: int | None = None,
+    chunk_size: int | None = None,
+) -> int:
+    """Writes the appointment dataframe (see `get_appointment_df`) to
+    a Parquet dataset partitioned by site_id and visit_schedule_name
+    and returns the number of rows written.
+
+    If `incremental`, only appointments for subjects with an
+    appointment modified since the last export of the site are
+    written, as new part files. All of a subject's appointments are
+    written so that the subject's baseline, endline and next columns
+    are current. Use `compact_appointment_dataset` to merge part files.
+
+    If not `incremental`, the existing part files of each site
+    exported are replaced. If `site_id`, only that site is exported
+    and the part files of other sites are left as they are.
+
+    The largest `modified` value exported for each site is kept in
+    `_watermark.json` in `path`.
+
+    Deleted appointments are not removed by an incremental export.
+    Run a full export to remove them.
+    """
+    pa, pq = import_pyarrow()
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    queryset = get_appointment_model_cls().objects.all()
+    if site_id:
+        queryset = queryset.filter(site_id=site_id)
+    watermarks = get_watermarks(path)
+    # replaced parts are removed once the export completes
+    if incremental:
+        replaced = []
+    elif site_id:
+        replaced = list(path.glob(f"site_id={site_id}/**/*.parquet"))
+    else:
+        replaced = list(path.glob("site_id=*/**/*.parquet"))
+    basename_template = get_part_basename()
+    count = 0
+    site_ids = list(queryset.values_list("site_id", flat=True).order_by("site_id").distinct())
+    for site_id in site_ids:
+        site_queryset = queryset.filter(site_id=site_id)
+        modified = site_queryset.aggregate(modified=Max("modified"))["modified"]
+        watermark = watermarks.get(site_id) if incremental else None
+        if watermark:
+            site_queryset = site_queryset.filter(
+                subject_identifier__in=site_queryset.filter(modified__gt=watermark).values(
+                    "subject_identifier"
+                )
+            )
+        df = get_appointment_df_for_queryset(site_queryset, chunk_size=chunk_size)
+        if not df.empty:
+            # categoricals are written as strings, see `decode_dictionaries`
+            columns = list(df.select_dtypes(["object", "category"]).columns)
+            df[columns] = df[columns].astype("string")
+            pq.write_to_dataset(
+                pa.Table.from_pandas(df, preserve_index=False),
+                root_path=str(path),
+                partition_cols=PARTITION_COLS,
+                basename_template=basename_template,
+            )
+            count += len(df)
+        watermarks[site_id] = max(modified, watermark) if watermark else modified
+    for part in replaced:
+        part.unlink()
+    set_watermarks(path, watermarks)
+    return count
+
+
+def compact_appointment_dataset(path: str | Path) -> int:
+    """Merges the part files in each partition into one part file
+    and returns the number of partitions compacted.
+
+    Where an appointment is in more than one part file, the row from
+    the last part file written is kept.
+    """
+    pa, pq = import_pyarrow()
+    path = Path(path)
+    count = 0
+    for partition in sorted({part.parent for part in path.glob("site_id=*/**/*.parquet")}):
+        parts = sorted(partition.glob("*.parquet"))
+        if len(parts) < 2:
+            continue
+        table = pa.concat_tables(
+            [decode_dictionaries(pq.read_table(part)) for part in parts],
+            promote_options="default",
+        )
+        df = table.to_pandas().drop_duplicates(subset=["appointment_id"], keep="last")
+        pq.write_table(
+            pa.Table.from_pandas(df, preserve_index=False),
+            partition / get_part_basename().format(i=0),
+        )
+        for part in parts:
+            part.unlink()
+        count += 1
+    return count
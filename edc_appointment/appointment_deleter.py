@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import ProtectedError
+from edc_utils import formatted_datetime, get_utcnow
+
+from .managers import AppointmentDeleteError
+from .schedule_index import get_schedule_index
+from .subject_appointment_timeline import invalidate_timeline
+from .utils import reset_visit_code_sequence_or_pass
+
+if TYPE_CHECKING:
+    from .models import Appointment
+
+__all__ = [
+    "AppointmentDeleter",
+    "bulk_delete",
+    "get_appointment_delete_error",
+    "in_bulk_delete",
+]
+
+_in_bulk_delete: ContextVar[bool] = ContextVar("edc_appointment_in_bulk_delete", default=False)
+
+
+def in_bulk_delete() -> bool:
+    """Returns True if called from within `bulk_delete`.
+
+    The appointment pre_delete and post_delete signals do nothing
+    if True.
+    """
+    return _in_bulk_delete.get()
+
+
+@contextmanager
+def bulk_delete():
+    """Suppresses the per-appointment checks and sequence resets of
+    the appointment pre_delete and post_delete signals.
+
+    The caller is responsible for doing the checks before and the
+    resets after (see `AppointmentDeleter`).
+    """
+    token = _in_bulk_delete.set(True)
+    try:
+        yield
+    finally:
+        _in_bulk_delete.reset(token)
+
+
+ScheduleStatus = tuple[datetime, list[str], datetime | None]
+
+
+def get_schedule_status(appointment: Appointment) -> ScheduleStatus:
+    """Returns a tuple of (onschedule_datetime, visit codes for the
+    subject's consent, offschedule_datetime or None) for the
+    appointment's schedule.
+    """
+    schedule = get_schedule_index().get_schedule(
+        appointment.visit_schedule_name, appointment.schedule_name
+    )
+    onschedule_datetime = schedule.onschedule_model_cls.objects.get(
+        subject_identifier=appointment.subject_identifier
+    ).onschedule_datetime
+    # get visits for this consent/consent ext
+    visits = schedule.visits_for_subject(
+        subject_identifier=appointment.subject_identifier,
+        report_datetime=onschedule_datetime,
+        site_id=appointment.site_id,
+    )
+    try:
+        offschedule_datetime = schedule.offschedule_model_cls.objects.get(
+            subject_identifier=appointment.subject_identifier
+        ).offschedule_datetime
+    except ObjectDoesNotExist:
+        offschedule_datetime = None
+    return onschedule_datetime, [visit for visit in visits], offschedule_datetime
+
+
+def get_appointment_delete_error(
+    appointment: Appointment, schedule_status: ScheduleStatus | None = None
+) -> str | None:
+    """Returns a message if the scheduled appointment may not be
+    deleted because the subject is on schedule, otherwise None.
+    """
+    if appointment.visit_code_sequence != 0:
+        return None
+    onschedule_datetime, visit_codes, offschedule_datetime = (
+        schedule_status or get_schedule_status(appointment)
+    )
+    if appointment.visit_code not in visit_codes:
+        return None
+    if not offschedule_datetime:
+        return (
+            f"Appointment may not be deleted. "
+            f"Subject {appointment.subject_identifier} is on schedule "
+            f"'{appointment.visit_schedule.verbose_name}.{appointment.schedule_name}' "
+            f"as of '{formatted_datetime(onschedule_datetime)}'. "
+            f"Got appointment {appointment.visit_code}.{appointment.visit_code_sequence} "
+            f"datetime {formatted_datetime(appointment.appt_datetime)}. "
+            f"Perhaps complete off schedule model "
+            f"'{appointment.schedule.offschedule_model_cls().verbose_name.title()}' "
+            f"first."
+        )
+    if onschedule_datetime <= appointment.appt_datetime <= offschedule_datetime:
+        return (
+            f"Appointment may not be deleted. "
+            f"Subject {appointment.subject_identifier} is on schedule "
+            f"'{appointment.visit_schedule.verbose_name}.{appointment.schedule_name}' "
+            f"as of '{formatted_datetime(onschedule_datetime)}' "
+            f"until '{formatted_datetime(get_utcnow())}'. "
+            f"Got appointment datetime "
+            f"{formatted_datetime(appointment.appt_datetime)}. "
+        )
+    return None
+
+
+class AppointmentDeleter:
+    """Deletes a list of a subject's appointments in one statement.
+
+    Rules applied by the appointment pre_delete signal are checked
+    once per schedule instead of once per appointment:
+
+    * an appointment with a related visit is protected;
+    * a scheduled appointment may not be deleted while the subject
+      is on schedule (see `get_appointment_delete_error`).
+
+    Visit code sequences are reset once per visit code after the
+    delete instead of once per deleted appointment.
+
+    For example, to delete future appointments until the first with
+    a visit report:
+
+        appointments = Appointment.objects.filter(...).order_by(
+            "-timepoint", "-visit_code_sequence"
+        )
+        deleted = AppointmentDeleter(appointments).delete(stop_if_protected=True)
+    """
+
+    def __init__(self, appointments):
+        self.appointments: list[Appointment] = list(appointments)
+        self._schedule_status: dict[tuple, ScheduleStatus] = {}
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(appointments={len(self.appointments)})"
+
+    @property
+    def protected_ids(self) -> set:
+        """Returns the ids of appointments with a related visit, in
+        one query.
+        """
+        if not self.appointments:
+            return set()
+        related_visit_model_cls = self.appointments[0].related_visit_model_cls()
+        return set(
+            related_visit_model_cls.objects.filter(
+                appointment_id__in=[obj.id for obj in self.appointments]
+            ).values_list("appointment_id", flat=True)
+        )
+
+    def get_delete_error(self, appointment: Appointment) -> str | None:
+        if appointment.visit_code_sequence != 0:
+            return None
+        key = (
+            appointment.subject_identifier,
+            appointment.visit_schedule_name,
+            appointment.schedule_name,
+            appointment.site_id,
+        )
+        if key not in self._schedule_status:
+            self._schedule_status[key] = get_schedule_status(appointment)
+        return get_appointment_delete_error(appointment, self._schedule_status[key])
+
+    def get_deletable(
+        self, stop_if_protected: bool, raise_if_not_deletable: bool
+    ) -> list[Appointment]:
+        """Returns the appointments that may be deleted.
+
+        Appointments are considered in the order given. If
+        `stop_if_protected`, stops at the first protected
+        appointment, otherwise protected appointments are skipped.
+        """
+        protected_ids = self.protected_ids
+        deletable = []
+        for appointment in self.appointments:
+            if appointment.id in protected_ids:
+                if stop_if_protected:
+                    break
+                continue
+            if error := self.get_delete_error(appointment):
+                if raise_if_not_deletable:
+                    raise AppointmentDeleteError(error)
+                continue
+            deletable.append(appointment)
+        return deletable
+
+    def delete(
+        self,
+        stop_if_protected: bool | None = None,
+        raise_if_not_deletable: bool | None = None,
+    ) -> int:
+        """Deletes the appointments that may be deleted and returns
+        the number deleted.
+
+        If `raise_if_not_deletable`, raises AppointmentDeleteError
+        before anything is deleted, otherwise such appointments are
+        skipped.
+        """
+        deletable = self.get_deletable(
+            stop_if_protected=stop_if_protected,
+            raise_if_not_deletable=raise_if_not_deletable,
+        )
+        if not deletable:
+            return 0
+        model_cls = deletable[0].__class__
+        try:
+            with transaction.atomic(), bulk_delete():
+                model_cls.objects.filter(id__in=[obj.id for obj in deletable]).delete()
+        except ProtectedError:
+            # protected by a model other than the related visit
+            return self.delete_one_by_one(deletable, stop_if_protected)
+        self.reset_visit_code_sequences(deletable)
+        for subject_identifier in {obj.subject_identifier for obj in deletable}:
+            invalidate_timeline(subject_identifier)
+        return len(deletable)
+
+    @staticmethod
+    def delete_one_by_one(appointments: list[Appointment], stop_if_protected: bool) -> int:
+        deleted = 0
+        for appointment in appointments:
+            try:
+                with transaction.atomic():
+                    appointment.delete()
+                    deleted += 1
+            except ProtectedError:
+                if stop_if_protected:
+                    break
+        return deleted
+
+    @staticmethod
+    def reset_visit_code_sequences(appointments: list[Appointment]) -> None:
+        for opts in {
+            (
+                obj.subject_identifier,
+                obj.visit_schedule_name,
+                obj.schedule_name,
+                obj.visit_code,
+            )
+            for obj in appointments
+        }:
+            reset_visit_code_sequence_or_pass(
+                subject_identifier=opts[0],
+                visit_schedule_name=opts[1],
+                schedule_name=opts[2],
+                visit_code=opts[3],
+            )
@@ -1,11 +1,34 @@
 from __future__ import annotations
 
+from collections import Counter, defaultdict
+from contextlib import ExitStack
 from typing import TYPE_CHECKING
 
-from .constants import IN_PROGRESS_APPT
-from .utils import update_appt_status
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Exists, F, OuterRef, Value, When
+from edc_metadata.constants import REQUIRED
+from edc_metadata.utils import (
+    get_crf_metadata_model_cls,
+    get_requisition_metadata_model_cls,
+)
+from simple_history.utils import get_history_manager_for_model
+
+from .constants import (
+    CANCELLED_APPT,
+    COMPLETE_APPT,
+    IN_PROGRESS_APPT,
+    INCOMPLETE_APPT,
+    NEW_APPT,
+    SKIPPED_APPT,
+)
+from .subject_appointment_timeline import invalidate_timeline
+from .subject_lock import subject_lock
+from .utils import get_appointment_model_cls
 
 if TYPE_CHECKING:
+    from django.db.models import QuerySet
+
     from .models import Appointment
 
 
@@ -14,13 +37,28 @@ class AppointmentStatusUpdaterError(Exception):
 
 
 class AppointmentStatusUpdater:
+    """Changes the appointment to IN_PROGRESS_APPT and/or updates the
+    status of other IN_PROGRESS_APPT appointments.
+
+    Other appointments are those for this subject in the same visit
+    schedule and schedule. If `clear_others_for_subject_only` (or
+    `settings.EDC_APPOINTMENT_CLEAR_IN_PROGRESS_FOR_SUBJECT_ONLY`) is
+    False, appointments for all subjects are considered.
+    """
+
     def __init__(
         self,
         appointment: Appointment,
         change_to_in_progress: bool | None = None,
         clear_others_in_progress: bool | None = None,
+        clear_others_for_subject_only: bool | None = None,
     ):
         self.appointment = appointment
+        self.clear_others_for_subject_only = (
+            getattr(settings, "EDC_APPOINTMENT_CLEAR_IN_PROGRESS_FOR_SUBJECT_ONLY", True)
+            if clear_others_for_subject_only is None
+            else clear_others_for_subject_only
+        )
         if "historical" in self.appointment._meta.label_lower:
             raise AppointmentStatusUpdaterError(
                 f"Not an Appointment model instance. Got {self.appointment._meta.label_lower}."
@@ -30,13 +68,206 @@ class AppointmentStatusUpdater:
                 raise AppointmentStatusUpdaterError(
                     "Appointment instance must exist. Got `id` is None"
                 )
-            if change_to_in_progress and self.appointment.appt_status != IN_PROGRESS_APPT:
-                self.appointment.appt_status = IN_PROGRESS_APPT
-                self.appointment.save_base(update_fields=["appt_status"])
-            if clear_others_in_progress:
-                for appointment in self.appointment.__class__.objects.filter(
-                    visit_schedule_name=self.appointment.visit_schedule_name,
-                    schedule_name=self.appointment.schedule_name,
-                    appt_status=IN_PROGRESS_APPT,
-                ).exclude(id=self.appointment.id):
-                    update_appt_status(appointment, save=True)
+            with subject_lock(self.appointment.subject_identifier):
+                if change_to_in_progress and self.appointment.appt_status != IN_PROGRESS_APPT:
+                    self.appointment.appt_status = IN_PROGRESS_APPT
+                    self.appointment.save_base(update_fields=["appt_status"])
+                if clear_others_in_progress:
+                    self.clear_others_in_progress()
+
+    def clear_others_in_progress(self) -> Counter:
+        """Updates the status of other IN_PROGRESS_APPT appointments
+        and returns a Counter of the number of appointments changed
+        per transition.
+
+        New statuses are determined for all rows in one aggregate
+        query and written in one UPDATE. Rows are locked in primary
+        key order first so that concurrent requests acquire locks in
+        the same order.
+
+        If not `clear_others_for_subject_only`, the subject lock of
+        each affected subject is acquired, in subject_identifier
+        order, before rows are locked.
+        """
+        opts = dict(
+            visit_schedule_name=self.appointment.visit_schedule_name,
+            schedule_name=self.appointment.schedule_name,
+            appt_status=IN_PROGRESS_APPT,
+        )
+        if self.clear_others_for_subject_only:
+            opts.update(subject_identifier=self.appointment.subject_identifier)
+        model_cls = self.appointment.__class__
+        counter = Counter()
+        with ExitStack() as stack:
+            if not self.clear_others_for_subject_only:
+                subject_identifiers = list(
+                    model_cls.objects.filter(**opts)
+                    .exclude(id=self.appointment.id)
+                    .order_by("subject_identifier")
+                    .values_list("subject_identifier", flat=True)
+                    .distinct()
+                )
+                for subject_identifier in subject_identifiers:
+                    stack.enter_context(subject_lock(subject_identifier))
+                opts.update(subject_identifier__in=subject_identifiers)
+            stack.enter_context(transaction.atomic())
+            ids = list(
+                model_cls.objects.select_for_update()
+                .filter(**opts)
+                .exclude(id=self.appointment.id)
+                .order_by("pk")
+                .values_list("id", flat=True)
+            )
+            if not ids:
+                return counter
+            updater = BulkAppointmentStatusUpdater(model_cls.objects.filter(id__in=ids))
+            transitions = updater.get_transitions()
+            if not transitions:
+                return counter
+            whens = []
+            for (_, new_appt_status), rows in transitions.items():
+                whens.append(When(id__in=[pk for pk, _ in rows], then=Value(new_appt_status)))
+                counter[(IN_PROGRESS_APPT, new_appt_status)] += len(rows)
+            changed = [row for rows in transitions.values() for row in rows]
+            model_cls.objects.filter(
+                id__in=[pk for pk, _ in changed], appt_status=IN_PROGRESS_APPT
+            ).update(appt_status=Case(*whens, default=F("appt_status")))
+            get_history_manager_for_model(model_cls).bulk_history_create(
+                model_cls.objects.filter(id__in=[pk for pk, _ in changed]), update=True
+            )
+        for subject_identifier in {subject_identifier for _, subject_identifier in changed}:
+            invalidate_timeline(subject_identifier)
+        return counter
+
+
+class BulkAppointmentStatusUpdater:
+    """Updates `appt_status` for a queryset of appointments in bulk.
+
+    Uses the same rules as `update_appt_status` but reads the related
+    visit and REQUIRED CRF/requisition metadata for all appointments
+    in one query and writes changes with one UPDATE per transition and
+    batch.
+
+    `update()` returns a Counter of {(from_status, to_status): count}.
+
+    For example:
+
+        updater = BulkAppointmentStatusUpdater(
+            Appointment.objects.filter(site_id=10)
+        )
+        transitions = updater.update()
+    """
+
+    def __init__(
+        self,
+        queryset: QuerySet[Appointment] | None = None,
+        batch_size: int | None = None,
+        dry_run: bool | None = None,
+    ):
+        self.model_cls = get_appointment_model_cls()
+        self.queryset = self.model_cls.objects.all() if queryset is None else queryset
+        self.batch_size = batch_size or 1000
+        self.dry_run = dry_run
+
+    @staticmethod
+    def get_appt_status(
+        appt_status: str, has_related_visit: bool, has_required_metadata: bool
+    ) -> str:
+        """Returns the appt_status using the rules of
+        `update_appt_status`.
+        """
+        if appt_status in [CANCELLED_APPT, SKIPPED_APPT]:
+            pass
+        elif not has_related_visit:
+            appt_status = NEW_APPT
+        elif has_required_metadata:
+            appt_status = INCOMPLETE_APPT
+        else:
+            appt_status = COMPLETE_APPT
+        return appt_status
+
+    def annotated(self, queryset: QuerySet[Appointment]) -> QuerySet[Appointment]:
+        """Returns the queryset annotated with `has_related_visit`,
+        `crf_required` and `requisition_required`.
+        """
+        metadata_opts = dict(
+            subject_identifier=OuterRef("subject_identifier"),
+            visit_schedule_name=OuterRef("visit_schedule_name"),
+            schedule_name=OuterRef("schedule_name"),
+            visit_code=OuterRef("visit_code"),
+            visit_code_sequence=OuterRef("visit_code_sequence"),
+            entry_status=REQUIRED,
+        )
+        return queryset.annotate(
+            has_related_visit=Exists(
+                self.model_cls.related_visit_model_cls().objects.filter(
+                    appointment=OuterRef("pk")
+                )
+            ),
+            crf_required=Exists(get_crf_metadata_model_cls().objects.filter(**metadata_opts)),
+            requisition_required=Exists(
+                get_requisition_metadata_model_cls().objects.filter(**metadata_opts)
+            ),
+        )
+
+    def get_transitions(self) -> dict[tuple[str, str], list]:
+        """Returns a dictionary of {(from_status, to_status): [(id,
+        subject_identifier), ...]} for appointments where the status
+        should change.
+        """
+        transitions = defaultdict(list)
+        rows = (
+            self.annotated(self.queryset)
+            .order_by()
+            .values_list(
+                "id",
+                "subject_identifier",
+                "appt_status",
+                "has_related_visit",
+                "crf_required",
+                "requisition_required",
+            )
+        )
+        for pk, subject_identifier, appt_status, *values in rows.iterator(
+            chunk_size=self.batch_size
+        ):
+            has_related_visit, crf_required, requisition_required = values
+            new_appt_status = self.get_appt_status(
+                appt_status, has_related_visit, crf_required or requisition_required
+            )
+            if new_appt_status != appt_status:
+                transitions[(appt_status, new_appt_status)].append((pk, subject_identifier))
+        return transitions
+
+    def update(self, transitions: dict[tuple[str, str], list] | None = None) -> Counter:
+        """Updates appt_status and returns a Counter of the number of
+        appointments changed per transition.
+
+        Appointments are only updated if `appt_status` has not changed
+        since read. A history record is added for each updated
+        appointment.
+
+        If `transitions` is None, uses `get_transitions`.
+        """
+        counter = Counter()
+        history_manager = get_history_manager_for_model(self.model_cls)
+        transitions = self.get_transitions() if transitions is None else transitions
+        for (appt_status, new_appt_status), rows in transitions.items():
+            if self.dry_run:
+                counter[(appt_status, new_appt_status)] += len(rows)
+                continue
+            for index in range(0, len(rows), self.batch_size):
+                batch = rows[index : index + self.batch_size]
+                ids = [pk for pk, _ in batch]
+                counter[(appt_status, new_appt_status)] += self.model_cls.objects.filter(
+                    id__in=ids, appt_status=appt_status
+                ).update(appt_status=new_appt_status)
+                history_manager.bulk_history_create(
+                    self.model_cls.objects.filter(id__in=ids, appt_status=new_appt_status),
+                    update=True,
+                )
+                for subject_identifier in {
+                    subject_identifier for _, subject_identifier in batch
+                }:
+                    invalidate_timeline(subject_identifier)
+        return counter
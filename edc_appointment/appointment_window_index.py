@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+from bisect import bisect_right
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+from dateutil.relativedelta import relativedelta
+from django.apps import apps as django_apps
+from django.conf import settings
+from edc_utils import convert_php_dateformat, floor_secs, to_utc
+from edc_visit_schedule.schedule.window import enforce_window_period_enabled
+from edc_visit_schedule.utils import is_baseline
+
+from .constants import CANCELLED_APPT
+from .exceptions import AppointmentDateWindowPeriodGapError
+
+if TYPE_CHECKING:
+    from .models import Appointment
+
+__all__ = ["AppointmentWindowIndex", "get_window_bounds"]
+
+WINDOW = "window"
+GAP = "gap"
+
+
+def get_window_bounds(appointment: Appointment) -> tuple[datetime, datetime]:
+    """Returns the lower and upper datetime, to the minute, of the
+    window period of an appointment as checked by
+    `Schedule.datetime_in_window`.
+
+    The lower bound is adjusted for `add_window_gap_to_lower`. For an
+    unscheduled appointment, the bounds are those of its scheduled
+    appointment.
+    """
+    visit = appointment.visit
+    next_visit = appointment.schedule.visits.next(appointment.visit_code)
+    timepoint_datetime = to_utc(appointment.timepoint_datetime)
+    gap_days = 0
+    if visit.add_window_gap_to_lower and next_visit:
+        gap_days = abs(
+            (timepoint_datetime + visit.rupper) - (timepoint_datetime - next_visit.rlower)
+        ).days
+    visit.timepoint_datetime = timepoint_datetime
+    lower = floor_secs(to_utc(visit.dates.lower) - relativedelta(days=gap_days))
+    upper = floor_secs(to_utc(visit.dates.upper))
+    return lower, upper
+
+
+class AppointmentWindowIndex:
+    """An index of the window periods of a subject's scheduled
+    appointments (visit_code_sequence=0) for one schedule.
+
+    Built from one query. `get` returns the appointment for a
+    datetime using a binary search instead of checking each
+    appointment's window in turn. Uses the same rules as
+    `get_appointment_by_datetime`:
+
+    * cancelled appointments and baseline are skipped;
+    * a datetime in an appointment's window period (lower adjusted
+      for `add_window_gap_to_lower`) returns that appointment;
+    * a datetime in the gap between an appointment's upper and the
+      next appointment's lower raises AppointmentDateWindowPeriodGapError
+      if `raise_if_in_gap`. Otherwise, if the next visit has
+      `add_window_gap_to_lower`, returns the next appointment if in
+      its window adjusted for the gap (see
+      `get_max_window_gap_to_lower`) or None.
+
+    For example:
+
+        index = AppointmentWindowIndex(
+            subject_identifier, visit_schedule_name, schedule_name
+        )
+        appointment = index.get(suggested_appt_datetime)
+    """
+
+    def __init__(
+        self,
+        subject_identifier: str,
+        visit_schedule_name: str,
+        schedule_name: str,
+        appointments: list[Appointment] | None = None,
+    ):
+        self.subject_identifier = subject_identifier
+        self.visit_schedule_name = visit_schedule_name
+        self.schedule_name = schedule_name
+        if appointments is None:
+            appointments = (
+                django_apps.get_model("edc_appointment.appointment")
+                .objects.filter(
+                    subject_identifier=subject_identifier,
+                    visit_schedule_name=visit_schedule_name,
+                    schedule_name=schedule_name,
+                    visit_code_sequence=0,
+                )
+                .order_by("timepoint_datetime")
+            )
+        self.appointments: list[Appointment] = list(appointments)
+        self.next_appointments: list[Appointment | None] = self.get_next_appointments()
+        self.skipped: list[bool] = [
+            obj.appt_status == CANCELLED_APPT or is_baseline(obj) for obj in self.appointments
+        ]
+        # sorted by start: (start, end, position, kind)
+        self.intervals: list[tuple[datetime, datetime, int, str]] = sorted(
+            self.get_intervals(), key=lambda x: (x[0], x[2])
+        )
+        self.starts = [interval[0] for interval in self.intervals]
+        self.max_ends = []
+        for interval in self.intervals:
+            self.max_ends.append(
+                max(interval[1], self.max_ends[-1] if self.max_ends else interval[1])
+            )
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(subject_identifier={self.subject_identifier}, "
+            f"visit_schedule_name={self.visit_schedule_name}, "
+            f"schedule_name={self.schedule_name})"
+        )
+
+    def get_next_appointments(self) -> list[Appointment | None]:
+        """Returns a list of the next appointment by timepoint for
+        each appointment, as in `Appointment.next`.
+        """
+        by_timepoint = sorted(self.appointments, key=lambda obj: obj.timepoint)
+        timepoints = [obj.timepoint for obj in by_timepoint]
+        next_appointments = []
+        for obj in self.appointments:
+            index = bisect_right(timepoints, obj.timepoint)
+            next_appointments.append(
+                by_timepoint[index] if index < len(by_timepoint) else None
+            )
+        return next_appointments
+
+    def get_intervals(self) -> list[tuple[datetime, datetime, int, str]]:
+        """Returns a list of (start, end, position, kind) for the
+        window period and the gap after the window period of each
+        appointment that is not skipped.
+
+        A window period includes its start and excludes its end. A
+        gap excludes its start and end.
+        """
+        intervals = []
+        for position, appointment in enumerate(self.appointments):
+            if self.skipped[position]:
+                continue
+            intervals.append((*self.get_window_period(appointment), position, WINDOW))
+            next_appointment = self.next_appointments[position]
+            if next_appointment and self.get_window_gap_days(position) > 0:
+                upper = appointment.timepoint_datetime + appointment.visit.rupper
+                next_lower = (
+                    next_appointment.timepoint_datetime - next_appointment.visit.rlower
+                )
+                if upper < next_lower:
+                    intervals.append((upper, next_lower, position, GAP))
+        return intervals
+
+    @staticmethod
+    def get_window_period(appointment: Appointment) -> tuple[datetime, datetime]:
+        """Returns the window period for a scheduled appointment as
+        a half-open interval (see `get_window_bounds`).
+        """
+        lower, upper = get_window_bounds(appointment)
+        # compared to the minute, see `floor_secs`
+        return lower, upper + relativedelta(minutes=1)
+
+    def get_window_gap_days(self, position: int) -> int:
+        """See `get_window_gap_days` in utils."""
+        appointment = self.appointments[position]
+        next_appointment = self.next_appointments[position]
+        if not next_appointment:
+            return 0
+        return abs(
+            (appointment.timepoint_datetime + appointment.visit.rupper)
+            - (next_appointment.timepoint_datetime - next_appointment.visit.rlower)
+        ).days
+
+    def in_next_window_adjusted_for_gap(self, position: int, dt: datetime) -> bool:
+        """See `appt_datetime_in_next_window_adjusted_for_gap` in
+        utils.
+        """
+        from .utils import get_max_window_gap_to_lower
+
+        appointment = self.appointments[position]
+        next_appointment = self.next_appointments[position]
+        gap_days = min(
+            self.get_window_gap_days(position), get_max_window_gap_to_lower(appointment)
+        )
+        if gap_days > 0:
+            next_lower = (
+                next_appointment.timepoint_datetime
+                - next_appointment.visit.rlower
+                - relativedelta(days=gap_days)
+            )
+            next_upper = next_appointment.timepoint_datetime + next_appointment.visit.rupper
+            return next_lower <= dt <= next_upper
+        return False
+
+    def get_hits(self, dt: datetime) -> dict[int, set[str]]:
+        """Returns a dictionary of {position: {kind, ...}} for the
+        intervals that include `dt`.
+        """
+        hits = {}
+        index = bisect_right(self.starts, dt) - 1
+        while index >= 0 and self.max_ends[index] >= dt:
+            start, end, position, kind = self.intervals[index]
+            if (kind == WINDOW and start <= dt < end) or (kind == GAP and start < dt < end):
+                hits.setdefault(position, set()).add(kind)
+            index -= 1
+        return hits
+
+    @property
+    def fallthrough(self) -> Appointment | None:
+        """Returns the appointment returned if `dt` is not in any
+        window period or gap.
+        """
+        if not self.appointments:
+            return None
+        if self.skipped[-1]:
+            return self.appointments[-1]
+        return self.next_appointments[-1]
+
+    def get(self, dt: datetime, raise_if_in_gap: bool | None = None) -> Appointment | None:
+        """Returns the appointment where `dt` falls within the window
+        period, or None.
+
+        See also `get_appointment_by_datetime`.
+        """
+        raise_if_in_gap = True if raise_if_in_gap is None else raise_if_in_gap
+        if not enforce_window_period_enabled:
+            for position, appointment in enumerate(self.appointments):
+                if not self.skipped[position]:
+                    return appointment
+            return self.fallthrough
+        for position, kinds in sorted(self.get_hits(dt).items()):
+            appointment = self.appointments[position]
+            next_appointment = self.next_appointments[position]
+            if WINDOW in kinds:
+                return appointment
+            if raise_if_in_gap:
+                formatted_dt = dt.strftime(convert_php_dateformat(settings.SHORT_DATE_FORMAT))
+                raise AppointmentDateWindowPeriodGapError(
+                    f"Date falls in a `window period gap` between {appointment.visit_code} "
+                    f"and {next_appointment.visit_code}. Got {formatted_dt}."
+                )
+            if next_appointment.visit.add_window_gap_to_lower:
+                if self.in_next_window_adjusted_for_gap(position, dt):
+                    return next_appointment
+                return None
+        return self.fallthrough
@@ -12,4 +12,9 @@ class AppConfig(DjangoAppConfig):
     include_in_administration_section = True
 
     def ready(self):
+        from .models.signals import connect_sender_receivers
+        from .schedule_index import get_schedule_index
+
         register(context_processors_check)
+        connect_sender_receivers()
+        get_schedule_index()
@@ -15,8 +15,10 @@ from edc_visit_schedule.utils import is_baseline
 
 from ..constants import NEW_APPT, SCHEDULED_APPT
 from ..exceptions import AppointmentCreatorError
+from ..list_model_cache import get_list_model_cache
+from ..subject_lock import subject_lock
 from ..utils import (
-    get_appointment_type_model_cls,
+    get_appointment_type_model_name,
     get_appt_reason_default,
     get_appt_type_default,
     reset_visit_code_sequence_or_pass,
@@ -123,12 +125,13 @@ class AppointmentCreator:
     def appointment(self) -> Appointment:
         """Returns a newly created or updated appointment model instance."""
         if not self._appointment:
-            try:
-                self._appointment = self.appointment_model_cls.objects.get(**self.options)
-            except ObjectDoesNotExist:
-                self._appointment = self._create()
-            else:
-                self._appointment = self._update(appointment=self._appointment)
+            with subject_lock(self.subject_identifier):
+                try:
+                    self._appointment = self.appointment_model_cls.objects.get(**self.options)
+                except ObjectDoesNotExist:
+                    self._appointment = self._create()
+                else:
+                    self._appointment = self._update(appointment=self._appointment)
         return self._appointment
 
     @property
@@ -234,12 +237,9 @@ class AppointmentCreator:
         the default appointment type, e.g. 'clinic'.
         """
         if not self._default_appt_type:
-            try:
-                self._default_appt_type = get_appointment_type_model_cls().objects.get(
-                    name=get_appt_type_default()
-                )
-            except ObjectDoesNotExist:
-                self._default_appt_type = None
+            self._default_appt_type = get_list_model_cache(
+                get_appointment_type_model_name()
+            ).get_or_none(get_appt_type_default())
         return self._default_appt_type
 
     @property
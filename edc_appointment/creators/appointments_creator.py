@@ -1,23 +1,51 @@
 from __future__ import annotations
 
 from datetime import datetime
+from decimal import Decimal
 from typing import TYPE_CHECKING
+from uuid import uuid4
 from zoneinfo import ZoneInfo
 
 from django.apps import apps as django_apps
+from django.conf import settings
+from django.db import transaction
 from django.db.models.deletion import ProtectedError
+from django.db.models.signals import pre_save
+from django.db.utils import IntegrityError
+from django_audit_fields.models.audit_model_mixin import update_device_fields
 from edc_facility.exceptions import FacilityError
 from edc_facility.utils import get_facility
+from edc_sites.utils import valid_site_for_subject_or_raise
+from edc_timepoint.constants import OPEN_TIMEPOINT
+from edc_utils import formatted_datetime, get_utcnow
+from edc_visit_schedule.constants import ON_SCHEDULE
+from edc_visit_schedule.utils import is_baseline
+from simple_history.utils import bulk_create_with_history, bulk_update_with_history
 
-from ..exceptions import CreateAppointmentError
-from .appointment_creator import AppointmentCreator
+from ..appointment_deleter import AppointmentDeleter
+from ..constants import CANCELLED_APPT, NEW_APPT, SCHEDULED_APPT
+from ..exceptions import AppointmentDatetimeError, CreateAppointmentError
+from ..list_model_cache import get_list_model_cache
+from ..profiling import profiled
+from ..subject_appointment_timeline import invalidate_timeline
+from ..subject_lock import subject_locked
+from ..utils import (
+    get_appointment_type_model_name,
+    get_appt_reason_default,
+    get_appt_type_default,
+    raise_on_appt_datetime_not_in_window,
+    raise_on_appt_may_not_be_missed,
+)
+from .appointment_creator import AppointmentCreator, CreateAppointmentDateError
 
 if TYPE_CHECKING:
     from django.db.models import QuerySet
+    from edc_facility.facility import Facility
     from edc_visit_schedule.schedule import Schedule
+    from edc_visit_schedule.visit import Visit
     from edc_visit_schedule.visit_schedule import VisitSchedule
 
-    from ..models import Appointment
+    from ..models import Appointment, AppointmentType
 
 
 class AppointmentsCreator:
@@ -26,10 +54,31 @@ class AppointmentsCreator:
 
     See also: edc_visit_schedule SubjectSchedule
 
+    If `bulk` is True, or `settings.EDC_APPOINTMENT_BULK_CREATE` is
+    True, existing appointments are fetched in one query and new and
+    changed appointments are written with `bulk_create` and
+    `bulk_update` instead of one `AppointmentCreator` per visit.
     """
 
     appointment_creator_cls = AppointmentCreator
 
+    # fields changed when an existing appointment is moved, see also
+    # `prepare_bulk_appointments`
+    bulk_update_fields = [
+        "appt_datetime",
+        "timepoint_datetime",
+        "window_lower_datetime",
+        "window_upper_datetime",
+        "modified",
+        "user_modified",
+        "hostname_modified",
+        "device_modified",
+        "document_status",
+        "timepoint_status",
+        "timepoint_opened_datetime",
+        "timepoint_closed_datetime",
+    ]
+
     def __init__(
         self,
         subject_identifier: str | None = None,
@@ -39,6 +88,7 @@ class AppointmentsCreator:
         appointment_model: str = None,
         site_id: int | None = None,
         skip_baseline: bool | None = None,
+        bulk: bool | None = None,
     ):
         self.subject_identifier: str = subject_identifier
         self.visit_schedule: VisitSchedule = visit_schedule
@@ -47,11 +97,16 @@ class AppointmentsCreator:
         self.appointment_model: str = appointment_model
         self.site_id = site_id
         self.skip_baseline: bool | None = skip_baseline
+        self.bulk: bool = (
+            getattr(settings, "EDC_APPOINTMENT_BULK_CREATE", False) if bulk is None else bulk
+        )
 
     @property
     def appointment_model_cls(self) -> Appointment:
         return django_apps.get_model(self.appointment_model)
 
+    @profiled("appointments_creator.create_appointments")
+    @subject_locked()
     def create_appointments(
         self,
         base_appt_datetime=None,
@@ -74,21 +129,22 @@ class AppointmentsCreator:
             site_id=self.site_id,
         ).timepoint_dates(dt=base_appt_datetime)
 
-        for visit, timepoint_datetime in timepoint_dates.items():
-            try:
-                facility = get_facility(visit.facility_name)
-            except FacilityError as e:
-                raise CreateAppointmentError(
-                    f"{e} See {repr(visit)}. Got facility_name={visit.facility_name}"
-                )
-            appointment = self.update_or_create_appointment(
-                visit=visit,
+        if self.bulk:
+            self.bulk_update_or_create_appointments(
+                timepoint_dates=timepoint_dates,
                 taken_datetimes=taken_datetimes,
-                timepoint_datetime=timepoint_datetime,
-                facility=facility,
                 skip_get_current_site=skip_get_current_site,
             )
-            taken_datetimes.append(appointment.appt_datetime)
+        else:
+            for visit, timepoint_datetime in timepoint_dates.items():
+                appointment = self.update_or_create_appointment(
+                    visit=visit,
+                    taken_datetimes=taken_datetimes,
+                    timepoint_datetime=timepoint_datetime,
+                    facility=self.get_facility(visit),
+                    skip_get_current_site=skip_get_current_site,
+                )
+                taken_datetimes.append(appointment.appt_datetime)
 
         # check for existing appointment model instances after last timepoint
         try:
@@ -121,6 +177,363 @@ class AppointmentsCreator:
         appointment_creator = self.appointment_creator_cls(**opts)
         return appointment_creator.appointment
 
+    @staticmethod
+    def get_facility(visit: Visit) -> Facility:
+        try:
+            facility = get_facility(visit.facility_name)
+        except FacilityError as e:
+            raise CreateAppointmentError(
+                f"{e} See {repr(visit)}. Got facility_name={visit.facility_name}"
+            )
+        return facility
+
+    def bulk_update_or_create_appointments(
+        self,
+        timepoint_dates: dict[Visit, datetime] = None,
+        taken_datetimes: list[datetime] = None,
+        skip_get_current_site: bool | None = None,
+    ) -> None:
+        """Updates or creates the scheduled appointments for this
+        subject in bulk.
+
+        Follows the same rules as `AppointmentCreator`: appointment
+        datetimes are adjusted to the facility, existing appointments
+        are only updated if NEW and, if `skip_baseline`, the baseline
+        appointment is left as is.
+        """
+        site = valid_site_for_subject_or_raise(
+            self.subject_identifier, skip_get_current_site=skip_get_current_site
+        )
+        opts = dict(
+            subject_identifier=self.subject_identifier,
+            visit_schedule_name=self.visit_schedule.name,
+            schedule_name=self.schedule.name,
+        )
+        if site:
+            opts.update(site_id=site.id)
+        appointments = list(
+            self.appointment_model_cls.objects.filter(**opts).order_by(
+                "timepoint", "visit_code_sequence"
+            )
+        )
+        existing = {
+            (obj.visit_code, obj.timepoint): obj
+            for obj in appointments
+            if obj.visit_code_sequence == 0
+        }
+        facilities: dict[str, Facility] = {}
+        appt_type = self.default_appt_type
+        appt_reason = self.default_appt_reason
+        new_appointments: list[Appointment] = []
+        changed_appointments: list[Appointment] = []
+        for visit, timepoint_datetime in timepoint_dates.items():
+            timepoint = Decimal(str(visit.timepoint))
+            appointment = existing.get((visit.code, timepoint))
+            if appointment and (
+                (is_baseline(instance=appointment) and self.skip_baseline)
+                or appointment.appt_status != NEW_APPT
+            ):
+                pass
+            else:
+                if visit.facility_name not in facilities:
+                    facilities[visit.facility_name] = self.get_facility(visit)
+                facility = facilities[visit.facility_name]
+                appt_datetime = self.get_available_appt_datetime(
+                    facility, visit, timepoint_datetime, taken_datetimes, site
+                )
+                if appointment:
+                    if (
+                        appointment.appt_datetime != appt_datetime
+                        or appointment.timepoint_datetime != timepoint_datetime
+                    ):
+                        appointment.appt_datetime = appt_datetime
+                        appointment.timepoint_datetime = timepoint_datetime
+                        appointment.update_window_bounds()
+                        changed_appointments.append(appointment)
+                else:
+                    appointment = self.appointment_model_cls(
+                        **opts,
+                        visit_code=visit.code,
+                        visit_code_sequence=0,
+                        timepoint=timepoint,
+                        facility_name=facility.name,
+                        timepoint_datetime=timepoint_datetime,
+                        appt_datetime=appt_datetime,
+                        appt_type=appt_type,
+                        appt_reason=appt_reason,
+                        appt_status=NEW_APPT,
+                        ignore_window_period=False,
+                    )
+                    appointment.update_window_bounds()
+                    new_appointments.append(appointment)
+                    appointments.append(appointment)
+            taken_datetimes.append(appointment.appt_datetime)
+        self.validate_bulk_appointments(appointments, new_appointments + changed_appointments)
+        self.prepare_bulk_appointments(new_appointments, changed_appointments)
+        try:
+            with transaction.atomic():
+                if new_appointments:
+                    bulk_create_with_history(new_appointments, self.appointment_model_cls)
+                if changed_appointments:
+                    bulk_update_with_history(
+                        changed_appointments,
+                        self.appointment_model_cls,
+                        fields=self.bulk_update_fields,
+                        manager=self.appointment_model_cls.objects,
+                    )
+        except IntegrityError as e:
+            raise IntegrityError(
+                "An 'IntegrityError' was raised while trying to bulk create "
+                f"appointments for subject '{self.subject_identifier}'. "
+                f"Appointment create options were {opts}. Got {e}."
+            )
+        finally:
+            invalidate_timeline(self.subject_identifier)
+
+    @profiled("appointments_creator.retimepoint_appointments")
+    @subject_locked()
+    def retimepoint_appointments(
+        self,
+        base_appt_datetime: datetime,
+        skip_get_current_site: bool | None = None,
+    ) -> int | None:
+        """Moves the NEW scheduled appointments after baseline to
+        the timepoints relative to `base_appt_datetime` and returns
+        the number of appointments changed.
+
+        Called instead of `create_appointments` when the baseline
+        appointment moves. Does nothing if the subject is not
+        ON_SCHEDULE.
+
+        Timepoints are those of `visits_for_subject`. If the visits
+        are not those of the scheduled appointments (e.g. a consent
+        extension applies), `create_appointments` is called instead
+        to create or delete appointments and None is returned.
+
+        Otherwise, appointments are not resaved. Instead, changed
+        appointments are checked in memory (see
+        `validate_bulk_appointments`) and updated in one
+        `bulk_update`. Appointments that are not NEW are left as is.
+        """
+        base_appt_datetime = base_appt_datetime.astimezone(ZoneInfo("UTC"))
+        if not self.schedule.history_model_cls.objects.filter(
+            subject_identifier=self.subject_identifier,
+            visit_schedule_name=self.visit_schedule.name,
+            schedule_name=self.schedule.name,
+            schedule_status=ON_SCHEDULE,
+        ).exists():
+            return 0
+        site = valid_site_for_subject_or_raise(
+            self.subject_identifier, skip_get_current_site=skip_get_current_site
+        )
+        opts = dict(
+            subject_identifier=self.subject_identifier,
+            visit_schedule_name=self.visit_schedule.name,
+            schedule_name=self.schedule.name,
+            visit_code_sequence=0,
+        )
+        if site:
+            opts.update(site_id=site.id)
+        appointments = list(
+            self.appointment_model_cls.objects.filter(**opts).order_by("timepoint")
+        )
+        timepoint_dates = {
+            visit.code: (visit, timepoint_datetime)
+            for visit, timepoint_datetime in self.schedule.visits_for_subject(
+                subject_identifier=self.subject_identifier,
+                report_datetime=base_appt_datetime,
+                site_id=self.site_id,
+            )
+            .timepoint_dates(dt=base_appt_datetime)
+            .items()
+        }
+        if set(timepoint_dates) != {obj.visit_code for obj in appointments}:
+            self.create_appointments(
+                base_appt_datetime, skip_get_current_site=skip_get_current_site
+            )
+            return None
+        movable = [
+            obj
+            for obj in appointments
+            if obj.appt_status == NEW_APPT and not is_baseline(instance=obj)
+        ]
+        movable_ids = [obj.id for obj in movable]
+        taken_datetimes = [base_appt_datetime] + [
+            obj.appt_datetime for obj in appointments if obj.id not in movable_ids
+        ]
+        facilities: dict[str, Facility] = {}
+        changed_appointments: list[Appointment] = []
+        for appointment in movable:
+            visit, timepoint_datetime = timepoint_dates[appointment.visit_code]
+            if visit.facility_name not in facilities:
+                facilities[visit.facility_name] = self.get_facility(visit)
+            appt_datetime = self.get_available_appt_datetime(
+                facilities[visit.facility_name],
+                visit,
+                timepoint_datetime,
+                taken_datetimes,
+                site,
+            )
+            if (
+                appointment.appt_datetime != appt_datetime
+                or appointment.timepoint_datetime != timepoint_datetime
+            ):
+                appointment.appt_datetime = appt_datetime
+                appointment.timepoint_datetime = timepoint_datetime
+                appointment.update_window_bounds()
+                changed_appointments.append(appointment)
+            taken_datetimes.append(appointment.appt_datetime)
+        self.validate_bulk_appointments(appointments, changed_appointments)
+        self.prepare_bulk_appointments([], changed_appointments)
+        if changed_appointments:
+            with transaction.atomic():
+                bulk_update_with_history(
+                    changed_appointments,
+                    self.appointment_model_cls,
+                    fields=self.bulk_update_fields,
+                    manager=self.appointment_model_cls.objects,
+                )
+            invalidate_timeline(self.subject_identifier)
+        return len(changed_appointments)
+
+    @staticmethod
+    def get_available_appt_datetime(
+        facility: Facility,
+        visit: Visit,
+        timepoint_datetime: datetime,
+        taken_datetimes: list[datetime],
+        site,
+    ) -> datetime:
+        """Returns an available appointment datetime as in
+        `AppointmentCreator.appt_datetime`.
+        """
+        try:
+            arw = facility.available_arr(
+                suggested_datetime=timepoint_datetime,
+                forward_delta=visit.rupper,
+                reverse_delta=visit.rlower,
+                taken_datetimes=taken_datetimes,
+                site=site,
+            )
+        except FacilityError as e:
+            raise CreateAppointmentDateError(
+                f"{e} Visit={repr(visit)}. "
+                f"Try setting 'best_effort_available_datetime=True' on facility."
+            )
+        return arw.datetime
+
+    def prepare_bulk_appointments(
+        self, new_appointments: list[Appointment], changed_appointments: list[Appointment]
+    ) -> None:
+        """Sets the values and runs the checks of `Appointment.save`
+        for appointments written with `bulk_create` or `bulk_update`.
+
+        Audit, site, document status and timepoint values are set as
+        in `save`, and `pre_save` is sent for each appointment. The
+        offstudy check is run once, for the latest appointment.
+
+        Not repeated for new appointments:
+          * `raise_on_appt_may_not_be_missed` and `update_appt_status`:
+            in `save` a new appointment has no pk or related visit,
+            so the first is skipped and the second sets NEW;
+          * `validate_appt_datetime_not_after_next`: see
+            `validate_bulk_appointments`;
+          * `post_save`: `appointment_post_save` only acts on IN_PROGRESS,
+            missed or cancelled appointments, the history is written by
+            `bulk_create_with_history`, `update_timepoint` values are
+            set here and the timeline is invalidated once. The
+            `post_save` receivers of other apps are for other models.
+        """
+        model_cls = self.appointment_model_cls
+        timepoint = django_apps.get_app_config("edc_timepoint").timepoints.get(
+            model_cls._meta.label_lower
+        )
+        now = get_utcnow()
+        for appointment in new_appointments + changed_appointments:
+            if appointment.id:
+                raise_on_appt_may_not_be_missed(appointment=appointment)
+            else:
+                appointment.created = now
+                appointment.update_site_on_save()
+            appointment.modified = now
+            appointment.device_created, appointment.device_modified = update_device_fields(
+                appointment
+            )
+            appointment.update_document_status_on_save()
+            appointment.timepoint_open_or_raise(timepoint=timepoint)
+            appointment.timepoint_opened_datetime = getattr(
+                appointment, timepoint.datetime_field
+            )
+            appointment.timepoint_status = OPEN_TIMEPOINT
+            pre_save.send(
+                sender=model_cls,
+                instance=appointment,
+                raw=False,
+                using=model_cls.objects.db,
+                update_fields=None,
+            )
+            if appointment.id:
+                for field in ["user_modified", "hostname_modified"]:
+                    model_cls._meta.get_field(field).pre_save(appointment, add=False)
+            else:
+                # the UUIDAutoField pk is only set in pre_save. Set it
+                # here so bulk_create inserts the rows with their pk.
+                appointment.id = uuid4()
+        if new_appointments or changed_appointments:
+            max(
+                new_appointments + changed_appointments,
+                key=lambda obj: obj.appt_datetime,
+            ).raise_if_offstudy()
+
+    @staticmethod
+    def validate_bulk_appointments(
+        appointments: list[Appointment], changed_appointments: list[Appointment]
+    ) -> None:
+        """Raises if a new or changed appointment is not in its window
+        period or is on or after the next appointment.
+
+        Same checks as `Appointment.save` but done in memory.
+        """
+        appointments = sorted(
+            appointments, key=lambda obj: (obj.timepoint, obj.visit_code_sequence)
+        )
+        changed = [id(obj) for obj in changed_appointments]
+        for index, appointment in enumerate(appointments):
+            if id(appointment) not in changed:
+                continue
+            if not appointment.ignore_window_period:
+                raise_on_appt_datetime_not_in_window(
+                    appointment, baseline_timepoint_datetime=appointments[0].timepoint_datetime
+                )
+            try:
+                next_appointment = appointments[index + 1]
+            except IndexError:
+                continue
+            if (
+                appointment.appt_status != CANCELLED_APPT
+                and appointment.appt_datetime >= next_appointment.appt_datetime
+            ):
+                raise AppointmentDatetimeError(
+                    "Datetime cannot be on or after next appointment datetime. "
+                    f"Got {formatted_datetime(appointment.appt_datetime)} >= "
+                    f"{formatted_datetime(next_appointment.appt_datetime)}. "
+                    f"See appointment `{appointment}` and `{next_appointment}`."
+                )
+
+    @property
+    def default_appt_type(self) -> AppointmentType | None:
+        return get_list_model_cache(get_appointment_type_model_name()).get_or_none(
+            get_appt_type_default()
+        )
+
+    @property
+    def default_appt_reason(self) -> str:
+        try:
+            appt_reason = get_appt_reason_default()
+        except AttributeError:
+            appt_reason = SCHEDULED_APPT
+        return appt_reason
+
     def delete_unused_appointments(self) -> None:
         appointments = self.appointment_model.objects.filter(
             subject_identifier=self.subject_identifier,
@@ -139,14 +552,11 @@ class AppointmentsCreator:
         This is only relavent if the consent definition is extended
         by a consent definition extension.
         """
-        for appointment in self.appointment_model_cls.objects.filter(
+        appointments = self.appointment_model_cls.objects.filter(
             subject_identifier=self.subject_identifier,
             site_id=self.site_id,
             timepoint__gt=last_timepoint,
             visit_schedule_name=self.visit_schedule.name,
             schedule_name=self.schedule.name,
-        ):
-            try:
-                appointment.delete()
-            except ProtectedError:
-                pass
+        )
+        AppointmentDeleter(appointments).delete(raise_if_not_deletable=True)
@@ -7,7 +7,6 @@ from dateutil.relativedelta import relativedelta
 from django.core.exceptions import MultipleObjectsReturned, ObjectDoesNotExist
 from edc_utils import formatted_datetime, to_utc
 from edc_utils.date import to_local
-from edc_visit_schedule.site_visit_schedules import site_visit_schedules
 from edc_visit_schedule.utils import get_lower_datetime
 
 from ..constants import (
@@ -28,6 +27,10 @@ from ..exceptions import (
     UnscheduledAppointmentError,
     UnscheduledAppointmentNotAllowed,
 )
+from ..profiling import profiled
+from ..schedule_index import get_schedule_index
+from ..subject_appointment_timeline import SubjectAppointmentTimeline
+from ..subject_lock import subject_locked
 from .appointment_creator import AppointmentCreator
 
 if TYPE_CHECKING:
@@ -76,12 +79,15 @@ class UnscheduledAppointmentCreator:
                 "suggested visit code sequence cannot be less than 1"
             )
         self.facility = facility
-        self.visit_schedule = site_visit_schedules.get_visit_schedule(visit_schedule_name)
-        self.schedule = self.visit_schedule.schedules.get(schedule_name)
+        index = get_schedule_index()
+        self.visit_schedule = index.get_visit_schedule(visit_schedule_name)
+        self.schedule = index.get_schedule(visit_schedule_name, schedule_name)
         self.appointment_model_cls = self.schedule.appointment_model_cls
-        self.visit = self.visit_schedule.schedules.get(self.schedule_name).visits.get(
-            self.visit_code
+        self.timeline = SubjectAppointmentTimeline(
+            self.subject_identifier, appointment_model_cls=self.appointment_model_cls
         )
+        entry = index.get_visit(visit_schedule_name, schedule_name, self.visit_code)
+        self.visit = entry.visit if entry else None
         self.suggested_appt_datetime = suggested_appt_datetime
         self.has_perm_or_raise(request)
         self.create_or_raise()
@@ -106,6 +112,8 @@ class UnscheduledAppointmentCreator:
             )
         self._visit = value
 
+    @profiled("unscheduled_appointment_creator.create")
+    @subject_locked()
     def create_or_raise(self) -> None:
         """Create the unscheduled appointment.
 
@@ -216,7 +224,9 @@ class UnscheduledAppointmentCreator:
                 visit_code_sequence=self.visit_code_sequence - 1,
                 timepoint=self.parent_appointment.timepoint,
             )
-            self._calling_appointment = self.appointment_model_cls.objects.get(**opts)
+            self._calling_appointment = self.timeline.attach(
+                self.appointment_model_cls.objects.get(**opts)
+            )
         return self._calling_appointment
 
     @property
@@ -232,7 +242,9 @@ class UnscheduledAppointmentCreator:
                 visit_code=self.visit_code,
                 visit_code_sequence=0,
             )
-            self._parent_appointment = self.appointment_model_cls.objects.get(**options)
+            self._parent_appointment = self.timeline.attach(
+                self.appointment_model_cls.objects.get(**options)
+            )
             if not self._parent_appointment.related_visit:
                 raise InvalidParentAppointmentMissingVisitError(
                     "Unable to create unscheduled appointment. An unscheduled "
@@ -80,3 +80,11 @@ class CreateAppointmentError(Exception):
 
 class NextAppointmentModelError(Exception):
     pass
+
+
+class AppointmentDateWindowPeriodGapError(Exception):
+    pass
+
+
+class SubjectLockTimeout(Exception):
+    pass
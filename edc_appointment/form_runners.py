@@ -1,11 +1,158 @@
 from __future__ import annotations
 
+import csv
+import html
+import json
+from pathlib import Path
+from typing import Any
+
+from django.db.models import Model
+from django.utils.html import strip_tags
 from edc_form_runners.decorators import register
 from edc_form_runners.form_runner import FormRunner
 
+from .subject_appointment_timeline import SubjectAppointmentTimeline
+
+ISSUE_FIELDS = [
+    "subject_identifier",
+    "visit_schedule_name",
+    "schedule_name",
+    "visit_code",
+    "visit_code_sequence",
+    "field_name",
+    "message",
+]
+
 
 @register()
 class AppointmentFormRunner(FormRunner):
     model_name = "edc_appointment.appointment"
     extra_fieldnames = ["appt_datetime"]
     exclude_formfields = ["appt_close_datetime"]
+
+    def get_subject_identifiers(self) -> list[str]:
+        """Returns the subject identifiers of the appointments to
+        validate, in order.
+        """
+        return list(
+            self.src_qs.order_by("subject_identifier")
+            .values_list("subject_identifier", flat=True)
+            .distinct()
+        )
+
+    def get_errors(self, src_obj: Model) -> dict[str, Any]:
+        """Returns the form errors for an appointment, excluding
+        `exclude_formfields`.
+        """
+        form = self.modelform_cls(self.get_form_data(src_obj), instance=src_obj)
+        form.is_valid()
+        return {
+            k: v for k, v in form._errors.items() if k not in self.get_exclude_formfields()
+        }
+
+    def run_subjects(
+        self, subject_identifiers: list[str], write_issues: bool | None = None
+    ) -> tuple[int, list[dict]]:
+        """Validates the appointments of each subject and returns a
+        tuple of (number of appointments validated, list of issues).
+
+        Appointments are loaded in one query. The appointments of a
+        subject share one `SubjectAppointmentTimeline` so that
+        previous and next appointments are loaded once per subject
+        instead of once per appointment.
+
+        If `write_issues`, existing issues for these subjects are
+        deleted and new issues are written to the Issue model, as in
+        `run_all`.
+        """
+        fieldset_fields = self.fieldset_fields
+        if write_issues:
+            self.issue_model_cls.objects.filter(
+                label_lower=self.src_model_cls._meta.label_lower,
+                subject_identifier__in=subject_identifiers,
+            ).delete()
+        timelines: dict[str, SubjectAppointmentTimeline] = {}
+        count = 0
+        issues = []
+        for src_obj in self.src_qs.filter(subject_identifier__in=subject_identifiers).order_by(
+            "subject_identifier",
+            "visit_schedule_name",
+            "schedule_name",
+            "timepoint",
+            "visit_code_sequence",
+        ):
+            if src_obj.subject_identifier not in timelines:
+                timelines[src_obj.subject_identifier] = SubjectAppointmentTimeline(
+                    src_obj.subject_identifier, appointment_model_cls=self.src_model_cls
+                )
+            timelines[src_obj.subject_identifier].attach(src_obj)
+            count += 1
+            for fldname, errmsg in self.get_errors(src_obj).items():
+                if fldname not in fieldset_fields:
+                    continue
+                if write_issues:
+                    self.write_to_db(fldname, errmsg, src_obj)
+                issues.append(
+                    dict(
+                        subject_identifier=src_obj.subject_identifier,
+                        visit_schedule_name=src_obj.visit_schedule_name,
+                        schedule_name=src_obj.schedule_name,
+                        visit_code=src_obj.visit_code,
+                        visit_code_sequence=src_obj.visit_code_sequence,
+                        field_name=fldname,
+                        message=strip_tags(html.unescape(errmsg.as_text())),
+                    )
+                )
+        return count, issues
+
+
+def run_subjects(
+    subject_identifiers: list[str],
+    src_filter_options: dict[str, Any] | None = None,
+    write_issues: bool | None = None,
+) -> tuple[int, list[dict]]:
+    """Runs `AppointmentFormRunner.run_subjects` for a chunk of
+    subjects.
+
+    Importable at module level for `parallel.run_chunks`.
+    """
+    return AppointmentFormRunner(src_filter_options=src_filter_options).run_subjects(
+        subject_identifiers, write_issues=write_issues
+    )
+
+
+class IssueWriter:
+    """Writes issues to a file as they arrive.
+
+    Writes JSON lines if the path ends with .jsonl, otherwise CSV
+    with ISSUE_FIELDS.
+
+        with IssueWriter(path) as writer:
+            writer.write(issues)
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.file = None
+        self.writer = None
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(path={self.path})"
+
+    def __enter__(self) -> IssueWriter:
+        self.file = self.path.open("w", newline="")
+        if self.path.suffix != ".jsonl":
+            self.writer = csv.DictWriter(self.file, fieldnames=ISSUE_FIELDS)
+            self.writer.writeheader()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.file.close()
+
+    def write(self, issues: list[dict]) -> None:
+        if self.writer:
+            self.writer.writerows(issues)
+        else:
+            for issue in issues:
+                self.file.write(f"{json.dumps(issue)}\n")
+        self.file.flush()
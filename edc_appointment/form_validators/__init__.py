@@ -1,3 +1,4 @@
 from .appointment_form_validator import AppointmentFormValidator
+from .appointment_validation_context import AppointmentValidationContext
 from .next_appointment_crf_form_validator import NextAppointmentCrfFormValidator
 from .utils import validate_appt_datetime_unique
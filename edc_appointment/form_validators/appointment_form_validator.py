@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from functools import cached_property
 from logging import warning
 from typing import TYPE_CHECKING, Any
 
@@ -17,9 +18,7 @@ from edc_metadata.metadata_helper import MetadataHelperMixin
 from edc_sites.form_validator_mixin import SiteFormValidatorMixin
 from edc_utils import formatted_datetime, get_utcnow, to_utc
 from edc_utils.date import to_local
-from edc_visit_schedule.site_visit_schedules import site_visit_schedules
-from edc_visit_schedule.subject_schedule import NotOnScheduleError
-from edc_visit_schedule.utils import get_onschedule_model_instance, is_baseline
+from edc_visit_schedule.utils import is_baseline
 
 from ..appointment_reason_updater import AppointmentReasonUpdater
 from ..constants import (
@@ -50,11 +49,9 @@ from ..exceptions import (
     UnscheduledAppointmentError,
 )
 from ..form_validator_mixins import WindowPeriodFormValidatorMixin
-from ..utils import (
-    get_allow_skipped_appt_using,
-    get_previous_appointment,
-    raise_on_appt_may_not_be_missed,
-)
+from ..profiling import profiled
+from ..utils import get_allow_skipped_appt_using, raise_on_appt_may_not_be_missed
+from .appointment_validation_context import AppointmentValidationContext
 from .utils import validate_appt_datetime_unique
 
 if TYPE_CHECKING:
@@ -70,10 +67,15 @@ class AppointmentFormValidator(
 ):
     """Note, the appointment is only changed, never added,
     through the AppointmentForm.
+
+    Validators read the subject's appointments, related visits and
+    onschedule rows from `context` instead of querying for each
+    check (see `AppointmentValidationContext`).
     """
 
     appointment_model = "edc_appointment.appointment"
 
+    @profiled("appointment_form_validator.clean")
     def clean(self: Any):
         # TODO: do not allow a missed appt (in window) to be followed by an unscheduled appt
         #  that is also within window.
@@ -96,7 +98,7 @@ class AppointmentFormValidator(
             self.validate_appt_datetime_not_after_next_appt_datetime()
             self.validate_not_future_appt_datetime()
             self.validate_appt_datetime_in_window_period(
-                self.instance,
+                self.context.appointment,
                 self.cleaned_data.get("appt_datetime"),
                 "appt_datetime",
             )
@@ -120,6 +122,10 @@ class AppointmentFormValidator(
     def subject_identifier(self) -> str:
         return self.instance.subject_identifier
 
+    @cached_property
+    def context(self) -> AppointmentValidationContext:
+        return AppointmentValidationContext(self.instance)
+
     @property
     def required_additional_forms_exist(self) -> bool:
         """Returns True if any `additional` required forms are
@@ -134,12 +140,12 @@ class AppointmentFormValidator(
         if self.cleaned_data.get("appt_status") == IN_PROGRESS_APPT and getattr(
             self.instance, "id", None
         ):
-            previous_appt = get_previous_appointment(self.instance, include_interim=True)
+            previous_appt = self.context.relative_previous
             if previous_appt and previous_appt.appt_status not in [
                 CANCELLED_APPT,
                 SKIPPED_APPT,
             ]:
-                if not previous_appt.related_visit:
+                if not self.context.has_related_visit(previous_appt):
                     self.raise_validation_error(
                         message=(
                             "A previous appointment requires a visit report. "
@@ -162,18 +168,8 @@ class AppointmentFormValidator(
             INCOMPLETE_APPT,
             COMPLETE_APPT,
         ]:
-            if self.instance.previous:
-                if obj := (
-                    self.appointment_model_cls.objects.filter(
-                        subject_identifier=self.subject_identifier,
-                        visit_schedule_name=self.instance.visit_schedule_name,
-                        schedule_name=self.instance.schedule_name,
-                        appt_status=NEW_APPT,
-                        appt_datetime__lt=self.instance.appt_datetime,
-                    )
-                    .order_by("timepoint", "visit_code_sequence")
-                    .first()
-                ):
+            if self.context.previous:
+                if obj := self.context.first_new_before(self.instance.appt_datetime):
                     self.raise_validation_error(
                         {
                             "__all__": _(
@@ -187,11 +183,7 @@ class AppointmentFormValidator(
         return True
 
     def validate_timepoint(self: Any):
-        visit_schedule = site_visit_schedules.get_visit_schedule(
-            self.instance.visit_schedule_name
-        )
-        schedule = visit_schedule.schedules.get(self.instance.schedule_name)
-        visit = schedule.visits.get(self.instance.visit_code)
+        visit = self.context.visit
         if visit and self.instance.timepoint != visit.timepoint:
             self.raise_validation_error(
                 f"Invalid timepoint. Expected {visit.timepoint} "
@@ -292,16 +284,14 @@ class AppointmentFormValidator(
         appt_datetime = self.cleaned_data.get("appt_datetime")
         appt_status = self.cleaned_data.get("appt_status")
         if appt_datetime and appt_status and appt_status != NEW_APPT:
-            if self.instance.relative_previous:
-                if to_utc(appt_datetime) < self.instance.relative_previous.appt_datetime:
-                    formatted_date = formatted_datetime(
-                        self.instance.relative_previous.appt_datetime
-                    )
+            if relative_previous := self.context.relative_previous:
+                if to_utc(appt_datetime) < relative_previous.appt_datetime:
+                    formatted_date = formatted_datetime(relative_previous.appt_datetime)
                     self.raise_validation_error(
                         {
                             "appt_datetime": (
                                 "Cannot be before previous appointment. Previous appointment "
-                                f"is {self.instance.relative_previous.visit_label} "
+                                f"is {relative_previous.visit_label} "
                                 f"on {formatted_date}."
                             )
                         },
@@ -312,16 +302,14 @@ class AppointmentFormValidator(
         appt_datetime = self.cleaned_data.get("appt_datetime")
         appt_status = self.cleaned_data.get("appt_status")
         if appt_datetime and appt_status and appt_status != NEW_APPT:
-            if self.instance.relative_next:
-                if to_utc(appt_datetime) > self.instance.relative_next.appt_datetime:
-                    formatted_date = formatted_datetime(
-                        self.instance.relative_next.appt_datetime
-                    )
+            if relative_next := self.context.relative_next:
+                if to_utc(appt_datetime) > relative_next.appt_datetime:
+                    formatted_date = formatted_datetime(relative_next.appt_datetime)
                     self.raise_validation_error(
                         {
                             "appt_datetime": (
                                 "Cannot be after next appointment. Next appointment is "
-                                f"{self.instance.relative_next.visit_label} "
+                                f"{relative_next.visit_label} "
                                 f"on {formatted_date}."
                             )
                         },
@@ -468,20 +456,11 @@ class AppointmentFormValidator(
                 )
 
     @property
-    def appointment_in_progress_exists(self: Any) -> None:
+    def appointment_in_progress_exists(self: Any) -> bool:
         """Returns True if another appointment in this schedule
         is currently set to "in_progress".
         """
-        return (
-            self.appointment_model_cls.objects.filter(
-                subject_identifier=self.subject_identifier,
-                visit_schedule_name=self.instance.visit_schedule_name,
-                schedule_name=self.instance.schedule_name,
-                appt_status=IN_PROGRESS_APPT,
-            )
-            .exclude(id=self.instance.id)
-            .exists()
-        )
+        return self.context.appointment_in_progress_exists
 
     def validate_appt_status_if_skipped(self):
         """Raises validation error by default"""
@@ -555,15 +534,14 @@ class AppointmentFormValidator(
     def validate_scheduled_parent_not_missed(self):
         if (
             self.cleaned_data.get("appt_reason") == UNSCHEDULED_APPT
-            and get_previous_appointment(self.instance, include_interim=True)
-            and get_previous_appointment(self.instance, include_interim=True).appt_status
-            == MISSED_APPT
+            and self.context.relative_previous
+            and self.context.relative_previous.appt_status == MISSED_APPT
         ):
             self.raise_validation_error(
                 {
                     "__all__": "Please completed the scheduled appointment instead. "
-                    f"See {self.instance.previous.visit_code}."
-                    f"{self.instance.previous.visit_code_sequence}"
+                    f"See {self.context.previous.visit_code}."
+                    f"{self.context.previous.visit_code_sequence}"
                 },
                 INVALID_APPT_STATUS,
             )
@@ -579,29 +557,13 @@ class AppointmentFormValidator(
         return url
 
     def validate_subject_on_schedule(self: Any) -> None:
-        if self.cleaned_data.get("appt_datetime"):
-            appt_datetime = self.cleaned_data.get("appt_datetime")
-            subject_identifier = self.subject_identifier
-            onschedule_model = site_visit_schedules.get_onschedule_model(
-                visit_schedule_name=self.instance.visit_schedule_name,
-                schedule_name=self.instance.schedule_name,
-            )
-            qs = django_apps.get_model(onschedule_model).objects.filter(
-                subject_identifier=subject_identifier,
-            )
-
-            try:
-                get_onschedule_model_instance(
-                    subject_identifier=subject_identifier,
-                    visit_schedule_name=self.instance.visit_schedule_name,
-                    schedule_name=self.instance.schedule_name,
-                    reference_datetime=to_utc(appt_datetime),
-                )
-            except NotOnScheduleError:
+        if appt_datetime := self.cleaned_data.get("appt_datetime"):
+            if not self.context.get_onschedule_obj(appt_datetime):
+                expected = [str(obj) for obj in self.context.onschedule_objs]
                 self.raise_validation_error(
                     (
                         "Subject is not on a schedule for the given date and time. "
-                        f"Expected one of {[str(obj) for obj in qs.all()]}. "
+                        f"Expected one of {expected}. "
                         "Check the appointment date and/or time"
                     ),
                     INVALID_APPT_DATE,
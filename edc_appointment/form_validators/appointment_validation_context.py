@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+from datetime import datetime
+from functools import cached_property
+from typing import TYPE_CHECKING
+
+from dateutil.relativedelta import relativedelta
+from edc_utils import to_utc
+
+from ..constants import IN_PROGRESS_APPT, NEW_APPT
+from ..schedule_index import VisitEntry, get_schedule_index
+from ..subject_appointment_timeline import SubjectAppointmentTimeline, get_timeline
+from ..utils import get_next_appointment, get_previous_appointment
+
+if TYPE_CHECKING:
+    from edc_visit_schedule.model_mixins import OnScheduleModelMixin
+    from edc_visit_schedule.schedule import Schedule
+
+    from ..models import Appointment
+
+__all__ = ["AppointmentValidationContext"]
+
+
+class AppointmentValidationContext:
+    """Loads what the AppointmentFormValidator needs to validate an
+    appointment in a fixed number of queries:
+
+    * the subject's appointments (one query, see
+      `SubjectAppointmentTimeline`);
+    * the ids of the appointments in this schedule with a related
+      visit (one query);
+    * the subject's onschedule rows for this schedule (one query).
+
+    The appointment is attached to the timeline so that `next`,
+    `previous`, `relative_next`, etc. do not query the database.
+    If the appointment is already attached to a timeline, that
+    timeline is used (e.g. one timeline per subject when validating
+    in bulk, see `AppointmentFormRunner.run_subjects`).
+
+    Each value is loaded on first use and reused for the rest of
+    the request. For example:
+
+        context = AppointmentValidationContext(appointment)
+        context.relative_previous  # loads the timeline
+        context.has_related_visit(context.relative_previous)
+    """
+
+    def __init__(self, appointment: Appointment):
+        self.timeline = get_timeline(appointment) or SubjectAppointmentTimeline(
+            appointment.subject_identifier, appointment_model_cls=appointment.__class__
+        )
+        self.appointment = self.timeline.attach(appointment)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(appointment={self.appointment})"
+
+    @cached_property
+    def schedule(self) -> Schedule:
+        return get_schedule_index().get_schedule(
+            self.appointment.visit_schedule_name, self.appointment.schedule_name
+        )
+
+    @cached_property
+    def visit(self) -> VisitEntry | None:
+        return get_schedule_index().get_visit(
+            self.appointment.visit_schedule_name,
+            self.appointment.schedule_name,
+            self.appointment.visit_code,
+        )
+
+    @cached_property
+    def appointments(self) -> list[Appointment]:
+        """Returns the appointments in this schedule ordered by
+        timepoint and visit_code_sequence.
+        """
+        return self.timeline.appointments(
+            self.appointment.visit_schedule_name, self.appointment.schedule_name
+        )
+
+    @cached_property
+    def previous(self) -> Appointment | None:
+        return get_previous_appointment(self.appointment, include_interim=False)
+
+    @cached_property
+    def relative_previous(self) -> Appointment | None:
+        return get_previous_appointment(self.appointment, include_interim=True)
+
+    @cached_property
+    def relative_next(self) -> Appointment | None:
+        return get_next_appointment(self.appointment, include_interim=True)
+
+    @cached_property
+    def related_visit_ids(self) -> set:
+        """Returns the ids of the appointments in this schedule with
+        a related visit.
+        """
+        return set(
+            self.appointment.related_visit_model_cls()
+            .objects.filter(appointment_id__in=[obj.id for obj in self.appointments])
+            .values_list("appointment_id", flat=True)
+        )
+
+    def has_related_visit(self, appointment: Appointment) -> bool:
+        return appointment.id in self.related_visit_ids
+
+    def first_new_before(self, appt_datetime: datetime) -> Appointment | None:
+        """Returns the first NEW appointment in this schedule before
+        `appt_datetime`, or None.
+        """
+        for obj in self.appointments:
+            if obj.appt_status == NEW_APPT and obj.appt_datetime < appt_datetime:
+                return obj
+        return None
+
+    @cached_property
+    def appointment_in_progress_exists(self) -> bool:
+        """Returns True if another appointment in this schedule
+        is IN_PROGRESS.
+        """
+        return any(
+            obj.appt_status == IN_PROGRESS_APPT and obj.id != self.appointment.id
+            for obj in self.appointments
+        )
+
+    @cached_property
+    def onschedule_objs(self) -> list[OnScheduleModelMixin]:
+        return list(
+            self.schedule.onschedule_model_cls.objects.filter(
+                subject_identifier=self.appointment.subject_identifier
+            )
+        )
+
+    def get_onschedule_obj(self, reference_datetime: datetime) -> OnScheduleModelMixin | None:
+        """Returns the onschedule model instance on or before
+        `reference_datetime`, or None.
+
+        Same rule as `edc_visit_schedule.utils.get_onschedule_model_instance`.
+        """
+        reference_datetime = to_utc(reference_datetime) + relativedelta(seconds=1)
+        for obj in self.onschedule_objs:
+            if obj.onschedule_datetime <= reference_datetime:
+                return obj
+        return None
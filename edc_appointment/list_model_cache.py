@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING, Any
+
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ObjectDoesNotExist
+
+if TYPE_CHECKING:
+    from edc_list_data.model_mixins import ListModelMixin
+
+__all__ = [
+    "ListModelCache",
+    "get_list_model_cache",
+    "invalidate_list_model_cache",
+]
+
+_lock = threading.Lock()
+_caches: dict[str, ListModelCache] = {}
+
+
+def get_shared_cache():
+    """Returns the Django cache set in
+    `settings.EDC_APPOINTMENT_LIST_MODEL_CACHE` or None.
+
+    If set, a version number kept in the shared cache tells each
+    process when to reload. Default is None (process-local only).
+    """
+    if alias := getattr(settings, "EDC_APPOINTMENT_LIST_MODEL_CACHE", None):
+        return caches[alias]
+    return None
+
+
+class ListModelCache:
+    """A process-local cache of the rows of a list model, e.g.
+    AppointmentType.
+
+    Rows are loaded in one query on first use and reloaded after
+    `invalidate` is called. `invalidate` is called from the
+    post_save and post_delete signals of the cached list models.
+
+    For example:
+
+        appt_type = get_list_model_cache(
+            "edc_appointment.appointmenttype"
+        ).get(name=CLINIC)
+    """
+
+    def __init__(self, model: str):
+        self.model = model.lower()
+        # (version, {name: obj}, {pk: obj}) or None if not loaded
+        self._data: tuple[int | None, dict, dict] | None = None
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(model={self.model})"
+
+    @property
+    def model_cls(self) -> type[ListModelMixin]:
+        return django_apps.get_model(self.model)
+
+    @property
+    def version_key(self) -> str:
+        return f"edc_appointment.list_model_cache.{self.model}.version"
+
+    def get_shared_version(self) -> int | None:
+        if shared_cache := get_shared_cache():
+            return shared_cache.get_or_set(self.version_key, 1, timeout=None)
+        return None
+
+    def load(self) -> tuple[int | None, dict, dict]:
+        version = self.get_shared_version()
+        objs = list(self.model_cls.objects.all().order_by("display_index", "name"))
+        self._data = (
+            version,
+            {obj.name: obj for obj in objs},
+            {obj.pk: obj for obj in objs},
+        )
+        return self._data
+
+    def invalidate(self) -> None:
+        """Clears the rows in this process and, if a shared cache is
+        set, in other processes.
+        """
+        self._data = None
+        if shared_cache := get_shared_cache():
+            try:
+                shared_cache.incr(self.version_key)
+            except ValueError:
+                shared_cache.set(self.version_key, 1, timeout=None)
+
+    @property
+    def data(self) -> tuple[int | None, dict, dict]:
+        data = self._data
+        if data is None or data[0] != self.get_shared_version():
+            data = self.load()
+        return data
+
+    @property
+    def by_name(self) -> dict[str, ListModelMixin]:
+        return self.data[1]
+
+    @property
+    def by_pk(self) -> dict[Any, ListModelMixin]:
+        return self.data[2]
+
+    def all(self) -> list[ListModelMixin]:
+        """Returns a list of instances ordered by display_index."""
+        return list(self.by_name.values())
+
+    def get(self, name: str | None = None, pk: Any | None = None) -> ListModelMixin:
+        """Returns the instance for `name` or `pk`.
+
+        Reloads once if not found. Raises the model's DoesNotExist
+        if still not found.
+        """
+        index, key = (1, name) if pk is None else (2, pk)
+        obj = self.data[index].get(key)
+        if obj is None:
+            obj = self.load()[index].get(key)
+        if obj is None:
+            raise self.model_cls.DoesNotExist(
+                f"{self.model_cls._meta.verbose_name} matching query does not exist. "
+                f"Got {'name' if pk is None else 'pk'}={key}."
+            )
+        return obj
+
+    def get_display_name(self, pk: Any) -> str:
+        """Returns the display_name for `pk`."""
+        return self.get(pk=pk).display_name
+
+    def get_or_none(self, name: str) -> ListModelMixin | None:
+        try:
+            return self.get(name=name)
+        except ObjectDoesNotExist:
+            return None
+
+
+def get_list_model_cache(model: str) -> ListModelCache:
+    """Returns the cache for a list model, e.g.
+    "edc_appointment.appointmenttype".
+    """
+    model = model.lower()
+    if model not in _caches:
+        with _lock:
+            _caches.setdefault(model, ListModelCache(model))
+    return _caches[model]
+
+
+def invalidate_list_model_cache(model: str) -> None:
+    get_list_model_cache(model).invalidate()
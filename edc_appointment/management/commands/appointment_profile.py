@@ -0,0 +1,77 @@
+import argparse
+import json
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from edc_appointment.profiling import (
+    get_profile_stats,
+    get_shared_profile_stats,
+    reset_profile_stats,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a management command with appointment profiling enabled and report "
+        "the calls, queries and durations per appointment operation. "
+        "For example: appointment_profile update_appointment_status --dry-run. "
+        "Or, with --from-cache, report the stats written to "
+        "settings.EDC_APPOINTMENT_PROFILE_CACHE by the web and worker processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--json",
+            dest="as_json",
+            action="store_true",
+            default=False,
+            help="Write the report as JSON",
+        )
+        parser.add_argument(
+            "--from-cache",
+            dest="from_cache",
+            action="store_true",
+            default=False,
+            help=(
+                "Report the stats of all processes from "
+                "settings.EDC_APPOINTMENT_PROFILE_CACHE instead of running a command"
+            ),
+        )
+        parser.add_argument("command", nargs="?", help="Name of the management command to run")
+        parser.add_argument("args", nargs=argparse.REMAINDER)
+
+    def handle(self, *args, **options) -> None:
+        if options["from_cache"]:
+            if not getattr(settings, "EDC_APPOINTMENT_PROFILE_CACHE", None):
+                raise CommandError("settings.EDC_APPOINTMENT_PROFILE_CACHE is not set.")
+            profile_stats = get_shared_profile_stats()
+        elif options["command"]:
+            reset_profile_stats()
+            with override_settings(
+                EDC_APPOINTMENT_PROFILE=True, EDC_APPOINTMENT_PROFILE_CACHE=None
+            ):
+                call_command(options["command"], *args)
+            profile_stats = get_profile_stats()
+        else:
+            raise CommandError("Expected a command name or --from-cache.")
+        stats = sorted(
+            (obj.as_dict() for obj in profile_stats.values()),
+            key=lambda x: x["queries"],
+            reverse=True,
+        )
+        if options["as_json"]:
+            self.stdout.write(json.dumps(stats, indent=2))
+            return
+        self.stdout.write(
+            f"{'operation':<70} {'calls':>8} {'queries':>9} {'q/call':>8} "
+            f"{'p50':>8} {'p95':>8} {'p99':>8}"
+        )
+        for row in stats:
+            self.stdout.write(
+                f"{row['name']:<70} {row['calls']:>8} {row['queries']:>9} "
+                f"{row['queries_per_call']:>8.1f} {row['p50']:>8.3f} "
+                f"{row['p95']:>8.3f} {row['p99']:>8.3f}"
+            )
@@ -0,0 +1,85 @@
+import sys
+
+from django.core.management.base import BaseCommand
+from tqdm import tqdm
+
+from edc_appointment.models import Appointment
+from edc_appointment.parallel import chunked
+
+WINDOW_FIELDS = ["window_lower_datetime", "window_upper_datetime"]
+
+
+def backfill_chunk(pks: list) -> tuple[int, list[str]]:
+    """Sets the window period bounds for the appointments in a chunk
+    with one bulk update.
+
+    Returns the number updated and a list of appointments skipped
+    because the visit is no longer in the schedule.
+    """
+    appointments = []
+    skipped = []
+    for appointment in Appointment.objects.filter(pk__in=pks).only(
+        "subject_identifier",
+        "visit_schedule_name",
+        "schedule_name",
+        "visit_code",
+        "visit_code_sequence",
+        "timepoint_datetime",
+        *WINDOW_FIELDS,
+    ):
+        try:
+            appointment.update_window_bounds()
+        except AttributeError:
+            skipped.append(str(appointment))
+        else:
+            appointments.append(appointment)
+    # bounds are derived from timepoint_datetime, no history is kept
+    Appointment.objects.bulk_update(appointments, fields=WINDOW_FIELDS)
+    return len(appointments), skipped
+
+
+class Command(BaseCommand):
+    help = "Set the persisted window period bounds of appointments"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            dest="all",
+            action="store_true",
+            default=False,
+            help="Update all appointments, not only those without window bounds",
+        )
+        parser.add_argument(
+            "--site",
+            dest="site_ids",
+            default="",
+            help="Site id. If more than one separate by comma",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            dest="chunk_size",
+            type=int,
+            default=1000,
+            help="Number of appointments per bulk update. (Default: 1000)",
+        )
+
+    def handle(self, *args, **options):
+        site_ids = [int(x) for x in options["site_ids"].split(",") if x.strip()]
+        qs = Appointment.objects.filter(timepoint_datetime__isnull=False)
+        if not options["all"]:
+            qs = qs.filter(window_lower_datetime__isnull=True)
+        if site_ids:
+            qs = qs.filter(site_id__in=site_ids)
+        pks = list(qs.values_list("pk", flat=True).order_by("pk"))
+        sys.stdout.write(f"Setting window period bounds for {len(pks)} appointments ...\n")
+        updated = 0
+        skipped = []
+        with tqdm(total=len(pks)) as progress:
+            for chunk in chunked(pks, options["chunk_size"]):
+                count, chunk_skipped = backfill_chunk(chunk)
+                updated += count
+                skipped.extend(chunk_skipped)
+                progress.update(len(chunk))
+        for appointment in skipped:
+            sys.stdout.write(f"     - Skipped {appointment}. Visit not in schedule.\n")
+        sys.stdout.write(f"Done. Updated {updated} appointments.\n")
@@ -1,56 +1,116 @@
-from django.core.management.base import BaseCommand
-from edc_metadata.models import CrfMetadata
+from __future__ import annotations
 
+from collections import Counter
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+from django.core.management.base import BaseCommand, CommandError
+
+from edc_appointment.appointment_status_updater import BulkAppointmentStatusUpdater
 from edc_appointment.constants import COMPLETE_APPT, INCOMPLETE_APPT
-from edc_appointment.forms import AppointmentForm
 from edc_appointment.models import Appointment
 
 
-def close_appointments():
-    for obj in Appointment.objects.filter(appt_status=INCOMPLETE_APPT).order_by(
-        "subject_identifier", "visit_code", "visit_code_sequence"
-    ):
-        data = obj.__dict__
-        data.update(appt_status=COMPLETE_APPT, appt_close_datetime=obj.modified)
-        form = AppointmentForm(data=data, instance=obj)
-        form.is_valid()
-        try:
-            form.save(commit=False)
-        except ValueError:
-            obj.refresh_from_db()
-            print(
-                obj.subject_identifier,
-                obj.visit_code,
-                obj.visit_code_sequence,
-                obj.appt_status,
-            )
-        else:
-            obj.refresh_from_db()
-            obj.appt_status = COMPLETE_APPT
-            obj.save()
-
-    for obj in Appointment.objects.filter(appt_status=COMPLETE_APPT).order_by(
-        "subject_identifier", "visit_code", "visit_code_sequence"
-    ):
-        data = obj.__dict__
-        data.update(appt_status=INCOMPLETE_APPT, appt_close_datetime=obj.modified)
-        form = AppointmentForm(data=data, instance=obj)
-        form.is_valid()
-        try:
-            form.save(commit=False)
-        except ValueError:
-            pass
+def get_appointments(site_ids: list[int] | None = None, since: date | None = None):
+    """Returns a queryset of INCOMPLETE and COMPLETE appointments,
+    optionally for `site_ids` and modified on or after `since`.
+    """
+    appointments = Appointment.objects.filter(appt_status__in=[INCOMPLETE_APPT, COMPLETE_APPT])
+    if site_ids:
+        appointments = appointments.filter(site_id__in=site_ids)
+    if since:
+        appointments = appointments.filter(
+            modified__gte=datetime(since.year, since.month, since.day, tzinfo=ZoneInfo("UTC"))
+        )
+    return appointments
+
+
+def close_appointments(
+    site_ids: list[int] | None = None,
+    since: date | None = None,
+    dry_run: bool | None = None,
+) -> tuple[Counter, dict[Appointment, str]]:
+    """Moves appointments between INCOMPLETE and COMPLETE in bulk.
+
+    The new status of each appointment is decided from its related
+    visit and REQUIRED metadata (see `BulkAppointmentStatusUpdater`)
+    and written with one UPDATE per transition and batch with
+    history.
+
+    Appointments that would change to any other status (e.g. NEW
+    because there is no related visit) are ambiguous. These are not
+    changed and are returned for review.
+
+    Returns a Counter of {(from_status, to_status): count} and a
+    dictionary of {appointment: computed status} for the ambiguous
+    appointments.
+    """
+    updater = BulkAppointmentStatusUpdater(get_appointments(site_ids, since), dry_run=dry_run)
+    transitions = {}
+    ambiguous_statuses = {}
+    for (appt_status, new_appt_status), rows in updater.get_transitions().items():
+        if new_appt_status in [INCOMPLETE_APPT, COMPLETE_APPT]:
+            transitions[(appt_status, new_appt_status)] = rows
         else:
-            obj.refresh_from_db()
-            print(
-                obj.subject_identifier,
-                obj.visit_code,
-                obj.visit_code_sequence,
-                obj.appt_status,
-                CrfMetadata,
-            )
+            ambiguous_statuses.update({pk: new_appt_status for pk, _ in rows})
+    counter = updater.update(transitions=transitions)
+    ambiguous = {
+        obj: ambiguous_statuses[obj.id]
+        for obj in Appointment.objects.filter(id__in=list(ambiguous_statuses)).order_by(
+            "subject_identifier", "visit_code", "visit_code_sequence"
+        )
+    }
+    return counter, ambiguous
 
 
 class Command(BaseCommand):
+    help = "Move appointments between INCOMPLETE and COMPLETE based on the metadata"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            dest="dry_run",
+            action="store_true",
+            default=False,
+            help="Report the changes but do not update any data",
+        )
+        parser.add_argument(
+            "--site",
+            dest="site_ids",
+            default="",
+            help="Site id. If more than one separate by comma",
+        )
+        parser.add_argument(
+            "--since",
+            dest="since",
+            default=None,
+            help=(
+                "Only appointments where `modified` is on or after this date "
+                "(YYYY-MM-DD, UTC)"
+            ),
+        )
+
     def handle(self, *args, **options):
-        close_appointments()
+        site_ids = [int(x) for x in options["site_ids"].split(",") if x.strip()]
+        try:
+            since = date.fromisoformat(options["since"]) if options["since"] else None
+        except ValueError:
+            raise CommandError(f"Invalid date for --since. Got {options['since']}.")
+        dry_run = options["dry_run"]
+        transitions, ambiguous = close_appointments(
+            site_ids=site_ids, since=since, dry_run=dry_run
+        )
+        for (appt_status, new_appt_status), count in sorted(transitions.items()):
+            self.stdout.write(f"  {appt_status} -> {new_appt_status}: {count}")
+        if ambiguous:
+            self.stdout.write("\nSkipped. Review these appointments:")
+        for obj, new_appt_status in ambiguous.items():
+            self.stdout.write(
+                f"  {obj.subject_identifier} {obj.visit_code}.{obj.visit_code_sequence} "
+                f"{obj.appt_status} (computed {new_appt_status})"
+            )
+        self.stdout.write(
+            f"\n\nDone. {'Would update' if dry_run else 'Updated'} "
+            f"{sum(transitions.values())} appointments. "
+            f"Skipped {len(ambiguous)} ambiguous appointments."
+        )
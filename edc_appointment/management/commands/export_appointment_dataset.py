@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from edc_appointment.analytics.export_appointment_dataset import (
+    ExportAppointmentDatasetError,
+    compact_appointment_dataset,
+    export_appointment_dataset,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Export appointments, with baseline, endline and next visit columns, "
+        "to a Parquet dataset partitioned by site and visit schedule"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Root folder of the Parquet dataset")
+        parser.add_argument(
+            "--incremental",
+            dest="incremental",
+            action="store_true",
+            default=False,
+            help=(
+                "Only export subjects with appointments modified since the last export "
+                "of the site. Writes new part files. Deleted appointments are not removed"
+            ),
+        )
+        parser.add_argument(
+            "--compact",
+            dest="compact",
+            action="store_true",
+            default=False,
+            help="Merge the part files in each partition after exporting",
+        )
+        parser.add_argument(
+            "--site",
+            dest="site_id",
+            type=int,
+            default=None,
+            help="Site id",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            dest="chunk_size",
+            type=int,
+            default=5000,
+            help="Number of appointments read per query. (Default: 5000)",
+        )
+
+    def handle(self, *args, **options) -> None:
+        try:
+            count = export_appointment_dataset(
+                options["path"],
+                incremental=options["incremental"],
+                site_id=options["site_id"],
+                chunk_size=options["chunk_size"],
+            )
+            self.stdout.write(f"Exported {count} appointments to {options['path']}.")
+            if options["compact"]:
+                partitions = compact_appointment_dataset(options["path"])
+                self.stdout.write(f"Compacted {partitions} partitions.")
+        except ExportAppointmentDatasetError as e:
+            raise CommandError(e)
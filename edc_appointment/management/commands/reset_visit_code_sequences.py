@@ -1,34 +1,132 @@
 import sys
 
 from django.core.management.base import BaseCommand
-from edc_registration.models import RegisteredSubject
 from tqdm import tqdm
 
 from edc_appointment.models import Appointment
+from edc_appointment.parallel import Checkpoint, chunked, run_chunks
 from edc_appointment.utils import reset_visit_code_sequence_or_pass
 
 
+def get_groups(site_ids: list[int] | None = None) -> list[tuple[str, str, str, str]]:
+    """Returns a list of (subject_identifier, visit_schedule_name,
+    schedule_name, visit_code) for visit codes with unscheduled
+    appointments.
+    """
+    qs = Appointment.objects.exclude(visit_code_sequence=0)
+    if site_ids:
+        qs = qs.filter(site_id__in=site_ids)
+    return list(
+        qs.values_list(
+            "subject_identifier", "visit_schedule_name", "schedule_name", "visit_code"
+        )
+        .order_by("subject_identifier", "visit_schedule_name", "schedule_name", "visit_code")
+        .distinct()
+    )
+
+
+def reset_chunk(groups: list[tuple[str, str, str, str]], dry_run: bool | None = None) -> list:
+    """Returns the groups where visit code sequences are (or were) out
+    of order relative to appt_datetime.
+
+    Resets the visit code sequences unless `dry_run`.
+    """
+    out_of_order = []
+    for subject_identifier, visit_schedule_name, schedule_name, visit_code in groups:
+        opts = dict(
+            subject_identifier=subject_identifier,
+            visit_schedule_name=visit_schedule_name,
+            schedule_name=schedule_name,
+            visit_code=visit_code,
+        )
+        actual = list(
+            Appointment.objects.filter(**opts)
+            .order_by("appt_datetime")
+            .values_list("visit_code_sequence", flat=True)
+        )
+        if actual != list(range(0, len(actual))):
+            out_of_order.append(
+                (subject_identifier, visit_schedule_name, schedule_name, visit_code)
+            )
+            if not dry_run:
+                reset_visit_code_sequence_or_pass(**opts)
+    return out_of_order
+
+
 class Command(BaseCommand):
     help = (
         "Validate appointment visit code sequences relative to appt_datetime "
         "and reset if needed."
     )
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            dest="dry_run",
+            action="store_true",
+            default=False,
+            help="List visit codes that would be reset but do not change any data",
+        )
+        parser.add_argument(
+            "--site",
+            dest="site_ids",
+            default="",
+            help="Site id. If more than one separate by comma",
+        )
+        parser.add_argument(
+            "--processes",
+            dest="processes",
+            type=int,
+            default=1,
+            help="Number of processes. (Default: 1)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            dest="chunk_size",
+            type=int,
+            default=500,
+            help="Number of subject visit codes per chunk. (Default: 500)",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            dest="checkpoint",
+            default=None,
+            help=(
+                "Path to a checkpoint file. Visit codes already listed in the "
+                "file are skipped and completed visit codes are added to it"
+            ),
+        )
+
     def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        site_ids = [int(x) for x in options["site_ids"].split(",") if x.strip()]
+        checkpoint = Checkpoint(options["checkpoint"])
         sys.stdout.write(
             "Validating (and resetting, if needed) appointment visit code sequences ...\n"
         )
-        qs_rs = RegisteredSubject.objects.all().order_by("subject_identifier")
-        for obj in tqdm(qs_rs, total=qs_rs.count()):
-            qs = Appointment.objects.filter(
-                subject_identifier=obj.subject_identifier,
-                visit_code_sequence=0,
-            ).order_by("subject_identifier", "visit_code")
-            for appointment in qs:
-                reset_visit_code_sequence_or_pass(
-                    subject_identifier=appointment.subject_identifier,
-                    visit_schedule_name=appointment.visit_schedule_name,
-                    schedule_name=appointment.schedule_name,
-                    visit_code=appointment.visit_code,
-                    write_stdout=True,
-                )
+        groups = [group for group in get_groups(site_ids) if group not in checkpoint]
+        sys.stdout.write(
+            f"  Found {len(groups)} subject visit codes with unscheduled appointments "
+            f"({len(checkpoint)} already done).\n"
+        )
+        out_of_order = []
+        with tqdm(total=len(groups)) as progress:
+            for chunk, result in run_chunks(
+                reset_chunk,
+                chunked(groups, options["chunk_size"]),
+                processes=options["processes"],
+                dry_run=dry_run,
+            ):
+                out_of_order.extend(result)
+                if not dry_run:
+                    checkpoint.add(chunk)
+                progress.update(len(chunk))
+        for subject_identifier, _, schedule_name, visit_code in out_of_order:
+            sys.stdout.write(
+                f"     - {'Would reset' if dry_run else 'Reset'} for "
+                f"{subject_identifier} {schedule_name} {visit_code}\n"
+            )
+        sys.stdout.write(
+            f"Done. {'Found' if dry_run else 'Reset'} {len(out_of_order)} "
+            "out of order visit codes.\n"
+        )
@@ -0,0 +1,95 @@
+import sys
+import time
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+from tqdm import tqdm
+
+from edc_appointment.form_runners import (
+    AppointmentFormRunner,
+    IssueWriter,
+    run_subjects,
+)
+from edc_appointment.parallel import chunked, run_chunks
+
+
+class Command(BaseCommand):
+    help = (
+        "Validate appointments with the AppointmentForm in bulk, partitioned by "
+        "subject, and stream the issues to a file and/or the Issue model"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            dest="output",
+            default=None,
+            help="Path to write issues to as CSV, or JSON lines if the path ends with .jsonl",
+        )
+        parser.add_argument(
+            "--write-issues",
+            dest="write_issues",
+            action="store_true",
+            default=False,
+            help="Replace the subjects' appointment issues in the Issue model",
+        )
+        parser.add_argument(
+            "--site",
+            dest="site_ids",
+            default="",
+            help="Site id. If more than one separate by comma",
+        )
+        parser.add_argument(
+            "--processes",
+            dest="processes",
+            type=int,
+            default=1,
+            help="Number of processes. (Default: 1)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            dest="chunk_size",
+            type=int,
+            default=50,
+            help="Number of subjects per chunk. (Default: 50)",
+        )
+
+    def handle(self, *args, **options) -> None:
+        if not options["output"] and not options["write_issues"]:
+            raise CommandError("Nothing to do. Specify --output and/or --write-issues.")
+        site_ids = [int(x) for x in options["site_ids"].split(",") if x.strip()]
+        src_filter_options = dict(site_id__in=site_ids) if site_ids else None
+        subject_identifiers = AppointmentFormRunner(
+            src_filter_options=src_filter_options
+        ).get_subject_identifiers()
+        sys.stdout.write(
+            f"Validating appointments for {len(subject_identifiers)} subjects ...\n"
+        )
+        appointments = 0
+        issues = 0
+        start = time.monotonic()
+        writer = IssueWriter(options["output"]) if options["output"] else nullcontext()
+        with writer, tqdm(total=len(subject_identifiers), unit="subject") as progress:
+            for chunk, (count, chunk_issues) in run_chunks(
+                run_subjects,
+                chunked(subject_identifiers, options["chunk_size"]),
+                processes=options["processes"],
+                src_filter_options=src_filter_options,
+                write_issues=options["write_issues"],
+            ):
+                if options["output"]:
+                    writer.write(chunk_issues)
+                appointments += count
+                issues += len(chunk_issues)
+                progress.update(len(chunk))
+                progress.set_postfix(
+                    appointments=appointments,
+                    issues=issues,
+                    rate=f"{appointments / max(time.monotonic() - start, 1e-6):.1f}/s",
+                )
+        elapsed = time.monotonic() - start
+        sys.stdout.write(
+            f"Done. Validated {appointments} appointments in {elapsed:.1f}s "
+            f"({appointments / max(elapsed, 1e-6):.1f} appointments/s). "
+            f"Found {issues} issues.\n"
+        )
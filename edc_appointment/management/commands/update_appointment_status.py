@@ -1,16 +1,46 @@
 from django.core.management import BaseCommand
-from tqdm import tqdm
 
+from edc_appointment.appointment_status_updater import BulkAppointmentStatusUpdater
 from edc_appointment.models import Appointment
-from edc_appointment.utils import update_appt_status
 
 
 class Command(BaseCommand):
     help = "Update appointment status for all appointments"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            dest="dry_run",
+            action="store_true",
+            default=False,
+            help="Report the changes but do not update any data",
+        )
+        parser.add_argument(
+            "--site",
+            dest="site_ids",
+            default="",
+            help="Site id. If more than one separate by comma",
+        )
+        parser.add_argument(
+            "--batch-size",
+            dest="batch_size",
+            type=int,
+            default=1000,
+            help="Number of appointments per UPDATE statement. (Default: 1000)",
+        )
+
     def handle(self, *args, **options) -> None:
-        appointments = Appointment.objects.all().order_by("subject_identifier")
-        total = appointments.count()
-        for appointment in tqdm(appointments, total=total):
-            update_appt_status(appointment, save=True)
-        print("\n\nDone")
+        site_ids = [int(x) for x in options["site_ids"].split(",") if x.strip()]
+        appointments = Appointment.objects.all()
+        if site_ids:
+            appointments = appointments.filter(site_id__in=site_ids)
+        updater = BulkAppointmentStatusUpdater(
+            appointments, batch_size=options["batch_size"], dry_run=options["dry_run"]
+        )
+        transitions = updater.update()
+        for (appt_status, new_appt_status), count in sorted(transitions.items()):
+            print(f"  {appt_status} -> {new_appt_status}: {count}")
+        print(
+            f"\n\nDone. {'Would update' if options['dry_run'] else 'Updated'} "
+            f"{sum(transitions.values())} appointments."
+        )
@@ -1,56 +1,202 @@
+import csv
+import json
+import sys
+from pathlib import Path
+
 from django.apps import apps as django_apps
-from django.core.exceptions import ObjectDoesNotExist
 from django.core.management.base import BaseCommand
-from django.core.management.color import color_style
-from edc_registration.models import RegisteredSubject
+from django.db import IntegrityError
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 from tqdm import tqdm
 
+from edc_appointment.exceptions import SubjectLockTimeout
+from edc_appointment.parallel import Checkpoint, chunked, run_chunks
 from edc_appointment.skip_appointments import (
     SkipAppointments,
+    SkipAppointmentsError,
+    SkipAppointmentsFieldError,
     SkipAppointmentsValueError,
 )
 from edc_appointment.utils import get_allow_skipped_appt_using
 
-style = color_style()
+REPORT_FIELDS = [
+    "model",
+    "subject_identifier",
+    "visit_schedule_name",
+    "schedule_name",
+    "visit_code",
+    "error",
+]
+
+
+def get_latest_crfs(model: str) -> list[tuple[str, str, str, str, str]]:
+    """Returns a list of (model, pk, subject_identifier,
+    visit_schedule_name, schedule_name) for the CRF of the last
+    scheduled related visit (by report_datetime) per subject
+    schedule.
+
+    One query per model.
+    """
+    crf_model_cls = django_apps.get_model(model)
+    attr = crf_model_cls.related_visit_model_attr()
+    partition_by = [
+        F(f"{attr}__subject_identifier"),
+        F(f"{attr}__visit_schedule_name"),
+        F(f"{attr}__schedule_name"),
+    ]
+    qs = (
+        crf_model_cls.objects.filter(**{f"{attr}__visit_code_sequence": 0})
+        .annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=partition_by,
+                order_by=[F(f"{attr}__report_datetime").desc(), F("pk").desc()],
+            )
+        )
+        .filter(row_number=1)
+        .values_list(
+            "pk",
+            f"{attr}__subject_identifier",
+            f"{attr}__visit_schedule_name",
+            f"{attr}__schedule_name",
+        )
+        .order_by(f"{attr}__subject_identifier")
+    )
+    return [(model, str(pk), *values) for pk, *values in qs]
+
+
+def update_chunk(
+    crfs: list[tuple[str, str, str, str, str]], dry_run: bool | None = None
+) -> list[dict]:
+    """Updates skipped appointments using each CRF and returns a
+    list of errors.
+
+    Each subject schedule is updated in its own transaction. An error
+    (e.g. an IntegrityError) is reported and the next subject
+    schedule is updated.
+
+    Only plans the changes if `dry_run`.
+    """
+    errors = []
+    for model, pk, subject_identifier, visit_schedule_name, schedule_name in crfs:
+        crf_obj = django_apps.get_model(model).objects.get(pk=pk)
+        try:
+            skip_appointments = SkipAppointments(crf_obj)
+            if dry_run:
+                skip_appointments.get_plan()
+            else:
+                skip_appointments.update()
+        except (
+            SkipAppointmentsError,
+            SkipAppointmentsValueError,
+            SkipAppointmentsFieldError,
+            SubjectLockTimeout,
+            IntegrityError,
+        ) as e:
+            errors.append(
+                dict(
+                    model=model,
+                    subject_identifier=subject_identifier,
+                    visit_schedule_name=visit_schedule_name,
+                    schedule_name=schedule_name,
+                    visit_code=crf_obj.related_visit.visit_code,
+                    error=str(e),
+                )
+            )
+    return errors
+
+
+def write_report(path: str, errors: list[dict]) -> None:
+    """Writes errors to `path` as JSON if the suffix is .json,
+    otherwise as CSV.
+    """
+    path = Path(path)
+    if path.suffix == ".json":
+        path.write_text(json.dumps(errors, indent=2))
+    else:
+        with path.open("w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(errors)
 
 
 class Command(BaseCommand):
-    help = "Update skipped appointments"
+    help = (
+        "Update skipped appointments using the last CRF per subject schedule "
+        "for each model in settings.EDC_APPOINTMENT_ALLOW_SKIPPED_APPT_USING"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            dest="dry_run",
+            action="store_true",
+            default=False,
+            help="Report errors but do not change any data",
+        )
+        parser.add_argument(
+            "--processes",
+            dest="processes",
+            type=int,
+            default=1,
+            help="Number of processes. (Default: 1)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            dest="chunk_size",
+            type=int,
+            default=100,
+            help="Number of subject schedules per chunk. (Default: 100)",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            dest="checkpoint",
+            default=None,
+            help=(
+                "Path to a checkpoint file. Subject schedules already listed in the "
+                "file are skipped and completed subject schedules are added to it"
+            ),
+        )
+        parser.add_argument(
+            "--report",
+            dest="report",
+            default=None,
+            help="Path to write errors to as CSV, or JSON if the path ends with .json",
+        )
 
     def handle(self, *args, **options) -> None:
-        errors: dict[str, list[str]] = {}
-        for model, _ in get_allow_skipped_appt_using().items():
-            crf_model_cls = django_apps.get_model(model)
-            qs = RegisteredSubject.objects.all().order_by("subject_identifier")
-            total = qs.count()
-            for subject_identifier in tqdm(qs, total=total):
-                for subject_visit in (
-                    crf_model_cls.related_visit_model_cls()
-                    .objects.filter(
-                        subject_identifier=subject_identifier, visit_code_sequence=0
-                    )
-                    .order_by("report_datetime")
-                ):
-                    try:
-                        crf_obj = crf_model_cls.objects.get(subject_visit=subject_visit)
-                    except ObjectDoesNotExist:
-                        pass
-                    else:
-                        try:
-                            SkipAppointments(crf_obj).update()
-                        except SkipAppointmentsValueError as e:
-                            msg = (
-                                f"{e}. See {subject_visit.subject_identifier}"
-                                f"@{subject_visit.visit_code}."
-                            )
-                            try:
-                                errors[subject_visit.subject_identifier].append(msg)
-                            except KeyError:
-                                errors.update({subject_visit.subject_identifier: [msg]})
-                            print(msg)
-        print("\nERRORS\n")
-        for k, v in errors.items():
-            print(f"{k} ---------------")
-            for msg in v:
-                print(msg)
-        print("\n\nDone")
+        dry_run = options["dry_run"]
+        checkpoint = Checkpoint(options["checkpoint"])
+        crfs = [
+            crf
+            for model in get_allow_skipped_appt_using()
+            for crf in get_latest_crfs(model)
+            if (crf[0], *crf[2:]) not in checkpoint
+        ]
+        sys.stdout.write(
+            f"Updating skipped appointments for {len(crfs)} subject schedules "
+            f"({len(checkpoint)} already done) ...\n"
+        )
+        errors = []
+        with tqdm(total=len(crfs)) as progress:
+            for chunk, result in run_chunks(
+                update_chunk,
+                chunked(crfs, options["chunk_size"]),
+                processes=options["processes"],
+                dry_run=dry_run,
+            ):
+                errors.extend(result)
+                if not dry_run:
+                    checkpoint.add([(crf[0], *crf[2:]) for crf in chunk])
+                progress.update(len(chunk))
+        if options["report"]:
+            write_report(options["report"], errors)
+            sys.stdout.write(f"Wrote {len(errors)} errors to {options['report']}.\n")
+        else:
+            for error in errors:
+                sys.stdout.write(
+                    f"     - {error['subject_identifier']}@{error['visit_code']}: "
+                    f"{error['error']}\n"
+                )
+        sys.stdout.write(f"Done. {len(errors)} errors.\n")
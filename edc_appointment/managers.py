@@ -1,10 +1,14 @@
 from __future__ import annotations
 
+from datetime import datetime
 from typing import TYPE_CHECKING, Any, Dict
 
-from django.db import models, transaction
-from django.db.models.deletion import ProtectedError
-from edc_visit_schedule.site_visit_schedules import site_visit_schedules
+from django.db import models
+from django.db.models import Exists, F, OuterRef, Window
+from django.db.models.functions import FirstValue, Lag, Lead
+from edc_utils import floor_secs
+
+from .schedule_index import get_schedule_index
 
 if TYPE_CHECKING:
     from .models import Appointment
@@ -22,7 +26,90 @@ class SubjectOnScheduleError(Exception):
     pass
 
 
-class AppointmentManager(models.Manager):
+class AppointmentQuerySet(models.QuerySet):
+    def with_neighbours(self, include_interim: bool | None = None) -> AppointmentQuerySet:
+        """Returns the appointments annotated with the previous and next
+        appointment in the schedule using LAG/LEAD window functions:
+        `prev_appt_datetime`, `prev_appt_status`, `next_appt_datetime`
+        and `next_visit_code`.
+
+        Keywords:
+            * include_interim: include interim appointments
+              (e.g. those where visit_code_sequence != 0). Default:
+              True, as in `relative_previous` and `relative_next`.
+              If False, as in `previous` and `next`, only
+              appointments where visit_code_sequence=0 are returned.
+
+        Neighbours are taken from all of the subject's appointments
+        in the schedule, not only those selected by this queryset.
+        Filter the queryset before calling `with_neighbours`.
+
+        For example:
+
+            for appointment in Appointment.objects.filter(
+                appt_status=NEW_APPT
+            ).with_neighbours():
+                appointment.prev_appt_datetime
+        """
+        include_interim = True if include_interim is None else include_interim
+        queryset = self.model.objects.using(self.db).filter(
+            subject_identifier__in=self.values("subject_identifier")
+        )
+        if not include_interim:
+            queryset = queryset.filter(visit_code_sequence=0)
+        window = dict(
+            partition_by=[
+                F("subject_identifier"),
+                F("visit_schedule_name"),
+                F("schedule_name"),
+            ],
+            order_by=[F("timepoint").asc(), F("visit_code_sequence").asc()],
+        )
+        # `selected` is a window function so that filtering on it is
+        # applied after LAG/LEAD are evaluated over all of the
+        # subject's appointments (QUALIFY, Django>=4.2).
+        selected = Exists(self.filter(pk=OuterRef("pk")))
+        queryset = queryset.annotate(
+            prev_appt_datetime=Window(Lag("appt_datetime"), **window),
+            prev_appt_status=Window(Lag("appt_status"), **window),
+            next_appt_datetime=Window(Lead("appt_datetime"), **window),
+            next_visit_code=Window(Lead("visit_code"), **window),
+            selected=Window(FirstValue(selected), partition_by=[F("pk")]),
+        ).filter(selected=True)
+        if self.query.order_by:
+            queryset = queryset.order_by(*self.query.order_by)
+        return queryset
+
+    def in_window_at(self, dt: datetime) -> AppointmentQuerySet:
+        """Returns appointments where `dt` falls within the window
+        period.
+
+        Uses the persisted window bounds, see
+        `WindowPeriodModelMixin.update_window_bounds`. Compared to
+        the minute as in `Schedule.datetime_in_window`.
+
+        For example, the appointments open today:
+
+            Appointment.objects.in_window_at(get_utcnow()).filter(
+                appt_status=NEW_APPT
+            )
+        """
+        dt = floor_secs(dt)
+        return self.filter(window_lower_datetime__lte=dt, window_upper_datetime__gte=dt)
+
+    def window_closing_between(
+        self, lower_datetime: datetime, upper_datetime: datetime
+    ) -> AppointmentQuerySet:
+        """Returns appointments where the window period closes
+        between `lower_datetime` and `upper_datetime`, inclusive.
+        """
+        return self.filter(
+            window_upper_datetime__gte=floor_secs(lower_datetime),
+            window_upper_datetime__lte=upper_datetime,
+        )
+
+
+class AppointmentManager(models.Manager.from_queryset(AppointmentQuerySet)):
     use_in_migrations = True
 
     def get_by_natural_key(
@@ -80,9 +167,9 @@ class AppointmentManager(models.Manager):
         return options
 
     @staticmethod
-    def get_visit_code(action, schedule, **kwargs) -> str | None:
-        """Updates the options dictionary with the next or previous
-        visit code in the schedule.
+    def get_visit_code(action, options: dict, **kwargs) -> str | None:
+        """Returns the next or previous visit code in the schedule
+        named in `options` using the schedule index.
 
         if both visit_code and appointment are in kwargs visit_code
         takes precedence over apppointment.visit_code
@@ -90,23 +177,20 @@ class AppointmentManager(models.Manager):
         visit_code = kwargs.get("visit_code")
         if not visit_code:
             try:
-                appointment = kwargs.get("appointment")
-                visit_code = appointment.visit_code
+                visit_code = kwargs.get("appointment").visit_code
             except AttributeError:
                 pass
+        index = get_schedule_index()
+        # raises if the visit schedule is not registered
+        index.get_schedule(options.get("visit_schedule_name"), options.get("schedule_name"))
+        args = (options.get("visit_schedule_name"), options.get("schedule_name"), visit_code)
         if action == "next":
-            visit = schedule.visits.next(visit_code)
+            return index.next_visit_code(*args)
         elif action == "previous":
-            visit = schedule.visits.previous(visit_code)
-        else:
-            raise AppointmentManagerError(
-                f"Unknown action. Expected one of [next, previous]. Got '{action}'."
-            )
-        try:
-            visit_code = visit.code
-        except AttributeError:
-            visit_code = None
-        return visit_code
+            return index.previous_visit_code(*args)
+        raise AppointmentManagerError(
+            f"Unknown action. Expected one of [next, previous]. Got '{action}'."
+        )
 
     def first_appointment(self, **kwargs) -> Appointment | None:
         """Returns the first appointment instance for the given criteria.
@@ -168,10 +252,7 @@ class AppointmentManager(models.Manager):
                 schedule_name=schedule_name)
         """
         options = self.get_query_options(**kwargs)
-        schedule = site_visit_schedules.get_visit_schedule(
-            options.get("visit_schedule_name")
-        ).schedules.get(options.get("schedule_name"))
-        options.update(visit_code=self.get_visit_code("next", schedule, **kwargs))
+        options.update(visit_code=self.get_visit_code("next", options, **kwargs))
         try:
             next_appointment = self.filter(**options).order_by(
                 "timepoint", "visit_code_sequence"
@@ -187,10 +268,7 @@ class AppointmentManager(models.Manager):
         For visit_code_sequence=0.
         """
         options = self.get_query_options(**kwargs)
-        schedule = site_visit_schedules.get_visit_schedule(
-            options.get("visit_schedule_name")
-        ).schedules.get(options.get("schedule_name"))
-        options.update(visit_code=self.get_visit_code("previous", schedule, **kwargs))
+        options.update(visit_code=self.get_visit_code("previous", options, **kwargs))
         try:
             previous_appointment = (
                 self.filter(**options)
@@ -244,15 +322,7 @@ class AppointmentManager(models.Manager):
 
         # delete future appointments until the first with a
         # visit report
-        deleted = 0
-        appointments = self.filter(**options).order_by("timepoint", "visit_code_sequence")
-        for appointment in appointments.reverse():
-            try:
-                with transaction.atomic():
-                    appointment.delete()
-                    deleted += 1
-            except ProtectedError:
-                break
-            except AppointmentDeleteError:
-                pass
-        return deleted
+        from .appointment_deleter import AppointmentDeleter
+
+        appointments = self.filter(**options).order_by("-timepoint", "-visit_code_sequence")
+        return AppointmentDeleter(appointments).delete(stop_if_protected=True)
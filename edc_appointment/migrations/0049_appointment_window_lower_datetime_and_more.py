@@ -0,0 +1,61 @@
+# Generated by Django 5.0 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("edc_appointment", "0048_alter_appointment_site_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="appointment",
+            name="window_lower_datetime",
+            field=models.DateTimeField(
+                editable=False,
+                help_text="Lower bound of the window period. Updated with timepoint_datetime",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="appointment",
+            name="window_upper_datetime",
+            field=models.DateTimeField(
+                editable=False,
+                help_text="Upper bound of the window period. Updated with timepoint_datetime",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="historicalappointment",
+            name="window_lower_datetime",
+            field=models.DateTimeField(
+                editable=False,
+                help_text="Lower bound of the window period. Updated with timepoint_datetime",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="historicalappointment",
+            name="window_upper_datetime",
+            field=models.DateTimeField(
+                editable=False,
+                help_text="Upper bound of the window period. Updated with timepoint_datetime",
+                null=True,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["window_lower_datetime", "window_upper_datetime"],
+                name="edc_appoint_window__3248cf_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["window_upper_datetime"], name="edc_appoint_window__69f28e_idx"
+            ),
+        ),
+    ]
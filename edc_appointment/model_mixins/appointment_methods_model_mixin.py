@@ -8,8 +8,10 @@ from edc_facility.facility import Facility
 from edc_facility.utils import get_facility
 from edc_visit_tracking.model_mixins import get_related_visit_model_attr
 
+from ..list_model_cache import get_list_model_cache
+from ..subject_appointment_timeline import get_timeline
 from ..utils import (
-    get_appointment_type_model_cls,
+    get_appointment_type_model_name,
     get_next_appointment,
     get_previous_appointment,
 )
@@ -30,7 +32,9 @@ class AppointmentMethodsModelMixin(models.Model):
     """Mixin of methods for the appointment model only"""
 
     def get_appt_type_display(self: Appointment) -> str:
-        return get_appointment_type_model_cls().objects.get(id=self.appt_type_id).display_name
+        return get_list_model_cache(get_appointment_type_model_name()).get_display_name(
+            self.appt_type_id
+        )
 
     @property
     def facility(self: Appointment) -> Facility:
@@ -55,6 +59,8 @@ class AppointmentMethodsModelMixin(models.Model):
         """Returns the next appointment or None of all appointments
         for this subject for visit_code_sequence=0.
         """
+        if timeline := get_timeline(self):
+            return timeline.next_by_timepoint(self)
         return (
             self.__class__.objects.filter(
                 timepoint__gt=self.timepoint,
@@ -73,6 +79,8 @@ class AppointmentMethodsModelMixin(models.Model):
 
         A sequence would be 1000.0, 1000.1, 1000.2, ...
         """
+        if timeline := get_timeline(self):
+            return timeline.last_visit_code_sequence(self)
         obj = (
             self.__class__.objects.filter(
                 subject_identifier=self.subject_identifier,
@@ -104,6 +112,8 @@ class AppointmentMethodsModelMixin(models.Model):
         """Returns the previous appointment or None by timepoint
         for visit_code_sequence=0.
         """
+        if timeline := get_timeline(self):
+            return timeline.previous_by_timepoint(self)
         return (
             self.__class__.objects.filter(
                 timepoint__lt=self.timepoint,
@@ -119,6 +129,8 @@ class AppointmentMethodsModelMixin(models.Model):
         """Returns the first appointment for this timepoint."""
         if self.visit_code_sequence == 0:
             return self
+        if timeline := get_timeline(self):
+            return timeline.first(self)
         return self.__class__.objects.get(
             subject_identifier=self.subject_identifier,
             visit_schedule_name=self.visit_schedule_name,
@@ -18,13 +18,14 @@ from edc_offstudy.model_mixins import OffstudyNonCrfModelMixin
 from edc_timepoint.model_mixins import TimepointModelMixin
 from edc_utils import formatted_datetime, to_utc
 from edc_visit_schedule.model_mixins import VisitScheduleModelMixin
-from edc_visit_schedule.site_visit_schedules import site_visit_schedules
 from edc_visit_schedule.subject_schedule import NotOnScheduleError
 from edc_visit_schedule.utils import is_baseline
 
 from ..constants import CANCELLED_APPT, IN_PROGRESS_APPT
+from ..creators import AppointmentsCreator
 from ..exceptions import AppointmentDatetimeError, UnknownVisitCode
 from ..managers import AppointmentManager
+from ..schedule_index import get_schedule_index
 from ..utils import raise_on_appt_may_not_be_missed, update_appt_status
 from .appointment_fields_model_mixin import AppointmentFieldsModelMixin
 from .appointment_methods_model_mixin import AppointmentMethodsModelMixin
@@ -68,10 +69,9 @@ class AppointmentModelMixin(
     def save(self: Appointment, *args, **kwargs):
         if not kwargs.get("update_fields", None):
             if self.id and is_baseline(instance=self):
-                visit_schedule = site_visit_schedules.get_visit_schedule(
-                    self.visit_schedule_name
+                schedule: Schedule = get_schedule_index().get_schedule(
+                    self.visit_schedule_name, self.schedule_name
                 )
-                schedule: Schedule = visit_schedule.schedules.get(self.schedule_name)
                 try:
                     onschedule_obj = django_apps.get_model(
                         schedule.onschedule_model
@@ -88,12 +88,18 @@ class AppointmentModelMixin(
                         f"Got {e}"
                     )
                 if self.appt_datetime > onschedule_obj.onschedule_datetime:
-                    # update appointment timepoints
-                    schedule.put_on_schedule(
+                    # move the NEW appointments after baseline
+                    AppointmentsCreator(
                         subject_identifier=self.subject_identifier,
-                        onschedule_datetime=to_utc(self.appt_datetime),
+                        visit_schedule=get_schedule_index().get_visit_schedule(
+                            self.visit_schedule_name
+                        ),
+                        schedule=schedule,
+                        report_datetime=to_utc(self.appt_datetime),
+                        appointment_model=self._meta.label_lower,
+                        site_id=self.site_id,
                         skip_baseline=True,
-                    )
+                    ).retimepoint_appointments(to_utc(self.appt_datetime))
             else:
                 # self.validate_appt_datetime_not_before_previous()
                 self.validate_appt_datetime_not_after_next()
@@ -138,20 +144,24 @@ class AppointmentModelMixin(
                 )
 
     def validate_appt_datetime_not_after_next(self) -> None:
-        if self.appt_status != CANCELLED_APPT and self.appt_datetime and self.relative_next:
-            if self.appt_datetime >= self.relative_next.appt_datetime:
+        if self.appt_status != CANCELLED_APPT and self.appt_datetime:
+            relative_next = self.relative_next
+            if relative_next and self.appt_datetime >= relative_next.appt_datetime:
                 appt_datetime = formatted_datetime(self.appt_datetime)
-                next_appt_datetime = formatted_datetime(self.relative_next.appt_datetime)
+                next_appt_datetime = formatted_datetime(relative_next.appt_datetime)
                 raise AppointmentDatetimeError(
                     "Datetime cannot be on or after next appointment datetime. "
                     f"Got {appt_datetime} >= {next_appt_datetime}. "
                     f"See appointment `{self}` and "
-                    f"`{self.relative_next}`."
+                    f"`{relative_next}`."
                 )
 
     @property
     def title(self: Appointment) -> str:
-        if not self.schedule.visits.get(self.visit_code):
+        entry = get_schedule_index().get_visit(
+            self.visit_schedule_name, self.schedule_name, self.visit_code
+        )
+        if not entry:
             valid_visit_codes = [v for v in self.schedule.visits]
             raise UnknownVisitCode(
                 "Unknown visit code specified for existing apointment instance. "
@@ -159,7 +169,7 @@ class AppointmentModelMixin(
                 f"{valid_visit_codes}. Got {self.visit_code}. "
                 f"See {self}."
             )
-        title = self.schedule.visits.get(self.visit_code).title
+        title = entry.visit.title
         if self.visit_code_sequence > 0:
             title = f"{title}.{self.visit_code_sequence}"
         return title
@@ -211,4 +221,6 @@ class AppointmentModelMixin(
                     "visit_code_sequence",
                 ]
             ),
+            models.Index(fields=["window_lower_datetime", "window_upper_datetime"]),
+            models.Index(fields=["window_upper_datetime"]),
         ]
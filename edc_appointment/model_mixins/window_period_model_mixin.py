@@ -4,6 +4,7 @@ from typing import TYPE_CHECKING, Any
 
 from django.db import models
 
+from ..appointment_window_index import get_window_bounds
 from ..constants import CANCELLED_APPT
 from ..exceptions import AppointmentWindowError
 from ..utils import raise_on_appt_datetime_not_in_window
@@ -19,11 +20,43 @@ class WindowPeriodModelMixin(models.Model):
 
     window_period_checks_enabled: bool = True
 
+    window_lower_datetime = models.DateTimeField(
+        null=True,
+        editable=False,
+        help_text="Lower bound of the window period. Updated with timepoint_datetime",
+    )
+
+    window_upper_datetime = models.DateTimeField(
+        null=True,
+        editable=False,
+        help_text="Upper bound of the window period. Updated with timepoint_datetime",
+    )
+
     def save(self: Any, *args, **kwargs) -> None:
-        if not kwargs.get("update_fields", None):
+        update_fields = kwargs.get("update_fields", None)
+        if not update_fields:
             self.raise_on_appt_datetime_not_in_window()
+            self.update_window_bounds()
+        elif "timepoint_datetime" in update_fields:
+            self.update_window_bounds()
+            kwargs.update(
+                update_fields=list(
+                    {*update_fields, "window_lower_datetime", "window_upper_datetime"}
+                )
+            )
         super().save(*args, **kwargs)
 
+    def update_window_bounds(self: Appointment) -> None:
+        """Sets the window period bounds from `timepoint_datetime`.
+
+        Called on save. Call directly before a bulk create or
+        bulk update that changes `timepoint_datetime`.
+        """
+        if self.timepoint_datetime:
+            self.window_lower_datetime, self.window_upper_datetime = get_window_bounds(self)
+        else:
+            self.window_lower_datetime, self.window_upper_datetime = None, None
+
     def raise_on_appt_datetime_not_in_window(self: Appointment) -> None:
         if (
             self.id
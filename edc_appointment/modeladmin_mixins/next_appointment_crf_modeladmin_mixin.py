@@ -13,6 +13,7 @@ from edc_visit_schedule.models import VisitSchedule
 from edc_visit_tracking.utils import get_related_visit_model_cls
 
 from ..choices import APPT_DATE_INFO_SOURCES
+from ..list_model_cache import get_list_model_cache
 
 if TYPE_CHECKING:
     from edc_facility.models import HealthFacility
@@ -103,4 +104,4 @@ class NextAppointmentCrfModelAdminMixin(admin.ModelAdmin):
         )
 
     def get_default_info_source(self, request):
-        return django_apps.get_model("edc_appointment.infosources").objects.get(name=PATIENT)
+        return get_list_model_cache("edc_appointment.infosources").get(name=PATIENT)
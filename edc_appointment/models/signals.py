@@ -1,20 +1,29 @@
-from django.core.exceptions import ObjectDoesNotExist
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Type
+
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core.signals import setting_changed
 from django.db.models.signals import post_delete, post_save, pre_delete
-from django.dispatch import receiver
+from django.dispatch import Signal, receiver
 from edc_constants.constants import NO
-from edc_utils import formatted_datetime, get_utcnow
-from edc_visit_schedule.site_visit_schedules import site_visit_schedules
+from edc_visit_tracking.exceptions import RelatedVisitModelError
 from edc_visit_tracking.utils import get_related_visit_model_cls
 
+from ..appointment_deleter import get_appointment_delete_error, in_bulk_delete
 from ..appointment_status_updater import (
     AppointmentStatusUpdater,
     AppointmentStatusUpdaterError,
 )
 from ..constants import IN_PROGRESS_APPT, NEW_APPT
 from ..creators import create_next_appointment_as_interim
+from ..list_model_cache import invalidate_list_model_cache
 from ..managers import AppointmentDeleteError
 from ..model_mixins import NextAppointmentCrfModelMixin
+from ..profiling import profiled
 from ..skip_appointments import SkipAppointments
+from ..subject_appointment_timeline import invalidate_timeline
 from ..utils import (
     cancelled_appointment,
     get_allow_skipped_appt_using,
@@ -23,9 +32,15 @@ from ..utils import (
     reset_visit_code_sequence_or_pass,
 )
 from .appointment import Appointment
+from .appointment_type import AppointmentType
+from .list_models import InfoSources
+
+if TYPE_CHECKING:
+    from django.db.models import Model
 
 
 @receiver(post_save, sender=Appointment, weak=False, dispatch_uid="appointment_post_save")
+@profiled()
 def appointment_post_save(sender, instance, raw, update_fields, **kwargs):
     if not raw and not update_fields:
         # use the AppointmentStatusUpdater to set all
@@ -51,7 +66,52 @@ def appointment_post_save(sender, instance, raw, update_fields, **kwargs):
     cancelled_appointment(instance)
 
 
-@receiver(post_save, weak=False, dispatch_uid="create_appointments_on_post_save")
+@receiver(
+    post_save, sender=Appointment, weak=False, dispatch_uid="invalidate_timeline_on_post_save"
+)
+def invalidate_timeline_on_post_save(sender, instance, raw, **kwargs):
+    invalidate_timeline(instance.subject_identifier)
+
+
+@receiver(
+    post_delete,
+    sender=Appointment,
+    weak=False,
+    dispatch_uid="invalidate_timeline_on_post_delete",
+)
+def invalidate_timeline_on_post_delete(sender, instance, using, **kwargs):
+    invalidate_timeline(instance.subject_identifier)
+
+
+@receiver(
+    post_save,
+    sender=AppointmentType,
+    weak=False,
+    dispatch_uid="invalidate_list_model_cache_on_appointmenttype_post_save",
+)
+@receiver(
+    post_delete,
+    sender=AppointmentType,
+    weak=False,
+    dispatch_uid="invalidate_list_model_cache_on_appointmenttype_post_delete",
+)
+@receiver(
+    post_save,
+    sender=InfoSources,
+    weak=False,
+    dispatch_uid="invalidate_list_model_cache_on_infosources_post_save",
+)
+@receiver(
+    post_delete,
+    sender=InfoSources,
+    weak=False,
+    dispatch_uid="invalidate_list_model_cache_on_infosources_post_delete",
+)
+def invalidate_list_model_cache_on_post_save_or_delete(sender, instance, **kwargs):
+    invalidate_list_model_cache(sender._meta.label_lower)
+
+
+@profiled()
 def create_appointments_on_post_save(sender, instance, raw, created, using, **kwargs):
     """Method `Model.create_appointments` is not typically used.
 
@@ -65,7 +125,7 @@ def create_appointments_on_post_save(sender, instance, raw, created, using, **kw
                 raise
 
 
-@receiver(post_save, weak=False, dispatch_uid="update_appt_status_on_related_visit_post_save")
+@profiled()
 def update_appt_status_on_related_visit_post_save(
     sender, instance, created, raw, update_fields, **kwargs
 ):
@@ -84,9 +144,7 @@ def update_appt_status_on_related_visit_post_save(
                 pass
 
 
-@receiver(
-    post_delete, weak=False, dispatch_uid="update_appt_status_on_related_visit_post_delete"
-)
+@profiled()
 def update_appt_status_on_related_visit_post_delete(sender, instance, using, **kwargs):
     if isinstance(instance, (get_related_visit_model_cls(),)):
         try:
@@ -102,56 +160,21 @@ def update_appt_status_on_related_visit_post_delete(sender, instance, using, **k
 @receiver(
     pre_delete, sender=Appointment, weak=False, dispatch_uid="appointments_on_pre_delete"
 )
+@profiled()
 def appointments_on_pre_delete(sender, instance, using, **kwargs):
-    if instance.visit_code_sequence == 0:
-        schedule = site_visit_schedules.get_visit_schedule(
-            instance.visit_schedule_name
-        ).schedules.get(instance.schedule_name)
-        onschedule_datetime = schedule.onschedule_model_cls.objects.get(
-            subject_identifier=instance.subject_identifier
-        ).onschedule_datetime
-        # get visits for this consent/consent ext
-        visits = schedule.visits_for_subject(
-            subject_identifier=instance.subject_identifier,
-            report_datetime=onschedule_datetime,
-            site_id=instance.site_id,
-        )
-        if instance.visit_code in [visit for visit in visits]:
-            try:
-                offschedule_datetime = schedule.offschedule_model_cls.objects.get(
-                    subject_identifier=instance.subject_identifier
-                ).offschedule_datetime
-            except ObjectDoesNotExist:
-                raise AppointmentDeleteError(
-                    f"Appointment may not be deleted. "
-                    f"Subject {instance.subject_identifier} is on schedule "
-                    f"'{instance.visit_schedule.verbose_name}.{instance.schedule_name}' "
-                    f"as of '{formatted_datetime(onschedule_datetime)}'. "
-                    f"Got appointment {instance.visit_code}.{instance.visit_code_sequence} "
-                    f"datetime {formatted_datetime(instance.appt_datetime)}. "
-                    f"Perhaps complete off schedule model "
-                    f"'{instance.schedule.offschedule_model_cls().verbose_name.title()}' "
-                    f"first."
-                )
-            else:
-                if onschedule_datetime <= instance.appt_datetime <= offschedule_datetime:
-                    raise AppointmentDeleteError(
-                        f"Appointment may not be deleted. "
-                        f"Subject {instance.subject_identifier} is on schedule "
-                        f"'{instance.visit_schedule.verbose_name}.{instance.schedule_name}' "
-                        f"as of '{formatted_datetime(onschedule_datetime)}' "
-                        f"until '{formatted_datetime(get_utcnow())}'. "
-                        f"Got appointment datetime "
-                        f"{formatted_datetime(instance.appt_datetime)}. "
-                    )
+    if not in_bulk_delete():
+        if error := get_appointment_delete_error(instance):
+            raise AppointmentDeleteError(error)
 
 
 @receiver(
     post_delete, sender=Appointment, weak=False, dispatch_uid="appointments_on_post_delete"
 )
+@profiled()
 def appointments_on_post_delete(sender, instance, using, **kwargs):
     if (
         not kwargs.get("update_fields")
+        and not in_bulk_delete()
         and sender._meta.label_lower == get_appointment_model_name()
     ):
         reset_visit_code_sequence_or_pass(
@@ -162,11 +185,7 @@ def appointments_on_post_delete(sender, instance, using, **kwargs):
         )
 
 
-@receiver(
-    post_save,
-    weak=False,
-    dispatch_uid="update_appointments_to_next_on_post_save",
-)
+@profiled()
 def update_appointments_to_next_on_post_save(sender, instance, raw, created, using, **kwargs):
     if not raw and not kwargs.get("update_fields"):
         if get_allow_skipped_appt_using().get(instance._meta.label_lower):
@@ -180,17 +199,13 @@ def update_appointments_to_next_on_post_save(sender, instance, raw, created, usi
                 )
 
 
-@receiver(post_delete, weak=False, dispatch_uid="update_appointments_to_next_on_post_delete")
+@profiled()
 def update_appointments_to_next_on_post_delete(sender, instance, using, **kwargs):
     if get_allow_skipped_appt_using().get(instance._meta.label_lower):
         SkipAppointments(instance).reset_appointments()
 
 
-@receiver(
-    post_save,
-    weak=False,
-    dispatch_uid="update_appointment_from_nextappointment_post_save",
-)
+@profiled()
 def update_appointment_from_nextappointment_post_save(
     sender, instance, raw, created, using, **kwargs
 ):
@@ -202,3 +217,84 @@ def update_appointment_from_nextappointment_post_save(
                 )
                 appointment.appt_datetime = instance.appt_datetime
                 appointment.save()
+
+
+def is_related_visit_model(model_cls: Type[Model]) -> bool:
+    try:
+        return issubclass(model_cls, get_related_visit_model_cls())
+    except (LookupError, RelatedVisitModelError):
+        return False
+
+
+def creates_appointments(model_cls: Type[Model]) -> bool:
+    return callable(getattr(model_cls, "create_appointments", None))
+
+
+def allows_skipped_appt(model_cls: Type[Model]) -> bool:
+    """Reads the setting directly instead of calling
+    `get_allow_skipped_appt_using` so that an invalid setting does
+    not raise here, when connecting receivers, but when the
+    receiver runs.
+    """
+    return model_cls._meta.label_lower in getattr(
+        settings, "EDC_APPOINTMENT_ALLOW_SKIPPED_APPT_USING", {}
+    )
+
+
+def is_next_appointment_crf(model_cls: Type[Model]) -> bool:
+    return issubclass(model_cls, NextAppointmentCrfModelMixin)
+
+
+# (signal, receiver, test) for receivers connected per sender
+# instead of for all senders.
+sender_receivers = [
+    (post_save, create_appointments_on_post_save, creates_appointments),
+    (post_save, update_appt_status_on_related_visit_post_save, is_related_visit_model),
+    (post_delete, update_appt_status_on_related_visit_post_delete, is_related_visit_model),
+    (post_save, update_appointments_to_next_on_post_save, allows_skipped_appt),
+    (post_delete, update_appointments_to_next_on_post_delete, allows_skipped_appt),
+    (post_save, update_appointment_from_nextappointment_post_save, is_next_appointment_crf),
+]
+
+_connected: list[tuple[Signal, Type[Model], str]] = []
+
+
+def get_senders() -> dict[str, list[Type[Model]]]:
+    """Returns a dictionary of {receiver name: [model_cls, ...]} for
+    the receivers in `sender_receivers`.
+    """
+    models = [
+        model_cls for model_cls in django_apps.get_models() if not model_cls._meta.abstract
+    ]
+    return {
+        receiver_func.__name__: [model_cls for model_cls in models if test(model_cls)]
+        for _, receiver_func, test in sender_receivers
+    }
+
+
+def connect_sender_receivers(**kwargs) -> None:
+    """Connects each receiver in `sender_receivers` only for the
+    models it applies to.
+
+    Called from `AppConfig.ready` and again if a setting the
+    senders depend on changes.
+    """
+    while _connected:
+        signal, sender, dispatch_uid = _connected.pop()
+        signal.disconnect(sender=sender, dispatch_uid=dispatch_uid)
+    senders = get_senders()
+    for signal, receiver_func, _ in sender_receivers:
+        for model_cls in senders[receiver_func.__name__]:
+            dispatch_uid = f"{receiver_func.__name__}.{model_cls._meta.label_lower}"
+            signal.connect(
+                receiver_func, sender=model_cls, weak=False, dispatch_uid=dispatch_uid
+            )
+            _connected.append((signal, model_cls, dispatch_uid))
+
+
+@receiver(
+    setting_changed, weak=False, dispatch_uid="connect_sender_receivers_on_setting_changed"
+)
+def connect_sender_receivers_on_setting_changed(setting, **kwargs):
+    if setting in ["EDC_APPOINTMENT_ALLOW_SKIPPED_APPT_USING", "SUBJECT_VISIT_MODEL"]:
+        connect_sender_receivers()
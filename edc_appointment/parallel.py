@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
+
+from django.db import connections
+
+__all__ = ["Checkpoint", "chunked", "run_chunks"]
+
+
+def chunked(items: list, chunk_size: int) -> Iterator[list]:
+    """Yields successive lists of `chunk_size` items."""
+    for index in range(0, len(items), chunk_size):
+        yield items[index : index + chunk_size]
+
+
+def _init_worker() -> None:
+    """Closes connections inherited from the parent process so that
+    each worker opens its own DB connection.
+    """
+    connections.close_all()
+
+
+def run_chunks(
+    func: Callable[..., Any],
+    chunks: Iterable[list],
+    processes: int | None = None,
+    **kwargs,
+) -> Iterator[tuple[list, Any]]:
+    """Yields a tuple of (chunk, result) for `func(chunk, **kwargs)`
+    as each chunk completes.
+
+    If `processes` is greater than 1, chunks are run across a pool
+    of forked processes, each with its own DB connection. Otherwise
+    chunks are run in this process.
+
+    `func` must be importable at module level.
+    """
+    if not processes or processes <= 1:
+        for chunk in chunks:
+            yield chunk, func(chunk, **kwargs)
+    else:
+        # don't share the parent's connection with the workers
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_worker,
+        ) as executor:
+            futures = {executor.submit(func, chunk, **kwargs): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+
+class Checkpoint:
+    """A JSON-lines file of keys already processed.
+
+    Used by management commands to resume after a crash or
+    interruption without starting from zero. Keys are tuples of
+    JSON serializable values. If `path` is None, nothing is
+    read or written.
+    """
+
+    def __init__(self, path: str | Path | None = None):
+        self.path = Path(path) if path else None
+        self.keys: set[tuple] = set()
+        if self.path and self.path.exists():
+            with self.path.open() as f:
+                for line in f:
+                    if line.strip():
+                        self.keys.add(tuple(json.loads(line)))
+
+    def __contains__(self, key: tuple) -> bool:
+        return tuple(key) in self.keys
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, keys: Iterable[tuple]) -> None:
+        keys = [tuple(key) for key in keys]
+        self.keys.update(keys)
+        if self.path:
+            with self.path.open("a") as f:
+                for key in keys:
+                    f.write(f"{json.dumps(list(key), default=str)}\n")
@@ -0,0 +1,301 @@
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import connection
+from django.utils.module_loading import import_string
+
+__all__ = [
+    "OperationStats",
+    "flush_profile_stats",
+    "get_profile_stats",
+    "get_shared_profile_stats",
+    "is_profiling_enabled",
+    "profile",
+    "profiled",
+    "register_exporter",
+    "reset_profile_stats",
+]
+
+# number of durations kept per operation for the percentiles
+MAX_SAMPLES = 10000
+# seconds the stats of a process are kept in the shared cache
+SHARED_STATS_TIMEOUT = 86400
+PROCESSES_KEY = "edc_appointment.profiling.processes"
+
+_lock = threading.Lock()
+_stats: dict[str, OperationStats] = {}
+_exporters: list[Callable[[str, float, int], None]] = []
+# exporters imported from settings, resolved on first use
+_setting_exporters: list[Callable[[str, float, int], None]] | None = None
+_local = threading.local()
+_last_flush: float | None = None
+
+logger = logging.getLogger(__name__)
+
+
+def is_profiling_enabled() -> bool:
+    """Returns True if `settings.EDC_APPOINTMENT_PROFILE` is True.
+
+    Default is False.
+    """
+    return getattr(settings, "EDC_APPOINTMENT_PROFILE", False)
+
+
+def get_shared_cache():
+    """Returns the Django cache set in
+    `settings.EDC_APPOINTMENT_PROFILE_CACHE` or None.
+
+    If set, each process writes its stats to the shared cache when
+    an operation completes and at least
+    `settings.EDC_APPOINTMENT_PROFILE_FLUSH_INTERVAL` seconds
+    (default 60) have passed since the last write. The stats of web
+    and worker processes may then be read elsewhere, see
+    `get_shared_profile_stats`. Default is None (in process only).
+    """
+    if alias := getattr(settings, "EDC_APPOINTMENT_PROFILE_CACHE", None):
+        return caches[alias]
+    return None
+
+
+def get_flush_interval() -> float:
+    return getattr(settings, "EDC_APPOINTMENT_PROFILE_FLUSH_INTERVAL", 60)
+
+
+def get_process_key() -> str:
+    return f"edc_appointment.profiling.{socket.gethostname()}.{os.getpid()}"
+
+
+class OperationStats:
+    """Counts, durations and query counts for one operation."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.queries = 0
+        self.seconds = 0.0
+        self.samples: deque[float] = deque(maxlen=MAX_SAMPLES)
+
+    def add(self, seconds: float, queries: int) -> None:
+        self.calls += 1
+        self.queries += queries
+        self.seconds += seconds
+        self.samples.append(seconds)
+
+    def percentile(self, percent: int) -> float:
+        """Returns the duration, in seconds, at `percent` of the
+        recent samples.
+        """
+        if not self.samples:
+            return 0.0
+        samples = sorted(self.samples)
+        index = min(len(samples) - 1, round(percent / 100 * (len(samples) - 1)))
+        return samples[index]
+
+    def merge(self, other: OperationStats) -> None:
+        """Adds the counts and samples of `other` to this instance."""
+        self.calls += other.calls
+        self.queries += other.queries
+        self.seconds += other.seconds
+        self.samples.extend(other.samples)
+
+    def to_cache(self) -> dict:
+        return dict(
+            calls=self.calls,
+            queries=self.queries,
+            seconds=self.seconds,
+            samples=list(self.samples),
+        )
+
+    @classmethod
+    def from_cache(cls, name: str, data: dict) -> OperationStats:
+        obj = cls(name)
+        obj.calls = data["calls"]
+        obj.queries = data["queries"]
+        obj.seconds = data["seconds"]
+        obj.samples.extend(data["samples"])
+        return obj
+
+    def as_dict(self) -> dict:
+        return dict(
+            name=self.name,
+            calls=self.calls,
+            queries=self.queries,
+            queries_per_call=self.queries / self.calls if self.calls else 0.0,
+            seconds=self.seconds,
+            p50=self.percentile(50),
+            p95=self.percentile(95),
+            p99=self.percentile(99),
+        )
+
+
+def register_exporter(exporter: Callable[[str, float, int], None]) -> None:
+    """Registers a callable that is called with (name, seconds,
+    queries) each time a profiled operation completes.
+
+    Exporters may also be listed as dotted paths in
+    `settings.EDC_APPOINTMENT_PROFILE_EXPORTERS`.
+    """
+    if exporter not in _exporters:
+        _exporters.append(exporter)
+
+
+def get_exporters() -> list[Callable[[str, float, int], None]]:
+    """Returns the registered exporters followed by those listed in
+    `settings.EDC_APPOINTMENT_PROFILE_EXPORTERS`.
+
+    The dotted paths are imported once and reset if the setting
+    changes.
+    """
+    global _setting_exporters
+    if _setting_exporters is None:
+        _setting_exporters = [
+            import_string(path)
+            for path in getattr(settings, "EDC_APPOINTMENT_PROFILE_EXPORTERS", [])
+        ]
+    return _exporters + _setting_exporters
+
+
+def reset_exporters_on_setting_changed(setting, **kwargs):
+    global _setting_exporters
+    if setting == "EDC_APPOINTMENT_PROFILE_EXPORTERS":
+        _setting_exporters = None
+
+
+setting_changed.connect(
+    reset_exporters_on_setting_changed,
+    weak=False,
+    dispatch_uid="edc_appointment_reset_profile_exporters_on_setting_changed",
+)
+
+
+def get_profile_stats() -> dict[str, OperationStats]:
+    """Returns a copy of the stats collected in this process."""
+    with _lock:
+        return dict(_stats)
+
+
+def reset_profile_stats() -> None:
+    with _lock:
+        _stats.clear()
+
+
+def flush_profile_stats() -> None:
+    """Writes the stats collected in this process to the shared
+    cache, if set (see `get_shared_cache`).
+
+    Called by `profile` once every flush interval.
+    """
+    global _last_flush
+    _last_flush = time.monotonic()
+    if not (shared_cache := get_shared_cache()):
+        return
+    process_key = get_process_key()
+    with _lock:
+        data = {name: obj.to_cache() for name, obj in _stats.items()}
+    shared_cache.set(process_key, data, timeout=SHARED_STATS_TIMEOUT)
+    # not atomic. A process dropped by a concurrent write adds
+    # itself again on its next flush.
+    process_keys = shared_cache.get(PROCESSES_KEY) or []
+    if process_key not in process_keys:
+        shared_cache.set(PROCESSES_KEY, process_keys + [process_key], timeout=None)
+
+
+def get_shared_profile_stats() -> dict[str, OperationStats]:
+    """Returns the stats written to the shared cache by all
+    processes, merged by operation.
+    """
+    stats: dict[str, OperationStats] = {}
+    if shared_cache := get_shared_cache():
+        process_keys = shared_cache.get(PROCESSES_KEY) or []
+        for data in shared_cache.get_many(process_keys).values():
+            for name, values in data.items():
+                obj = OperationStats.from_cache(name, values)
+                if name in stats:
+                    stats[name].merge(obj)
+                else:
+                    stats[name] = obj
+    return stats
+
+
+def _count_queries(execute, sql, params, many, context):
+    for counter in getattr(_local, "counters", []):
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+@contextmanager
+def profile(name: str):
+    """Records the duration and number of queries of the block as
+    operation `name`, if profiling is enabled.
+
+    Queries of nested operations are also counted in the outer
+    operation.
+    """
+    if not is_profiling_enabled():
+        yield
+        return
+    counter = [0]
+    counters = getattr(_local, "counters", None)
+    if counters is None:
+        counters = _local.counters = []
+    counters.append(counter)
+    start = time.perf_counter()
+    try:
+        if len(counters) == 1:
+            with connection.execute_wrapper(_count_queries):
+                yield
+        else:
+            yield
+    finally:
+        seconds = time.perf_counter() - start
+        counters.pop()
+        with _lock:
+            _stats.setdefault(name, OperationStats(name)).add(seconds, counter[0])
+        for exporter in get_exporters():
+            # an exporter must not break the operation being profiled
+            try:
+                exporter(name, seconds, counter[0])
+            except Exception:
+                logger.exception(f"Profile exporter {exporter!r} failed for {name}.")
+        # not while an outer operation is counting queries
+        if not counters and (
+            _last_flush is None or time.monotonic() - _last_flush >= get_flush_interval()
+        ):
+            flush_profile_stats()
+
+
+def profiled(name: str | None = None):
+    """Decorator to profile a function or method as operation `name`.
+
+    For example:
+
+        @profiled("skip_appointments.update")
+        def update(self):
+            ...
+    """
+
+    def decorator(func):
+        operation = name or f"{func.__module__}.{func.__qualname__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not is_profiling_enabled():
+                return func(*args, **kwargs)
+            with profile(operation):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
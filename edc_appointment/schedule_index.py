@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from functools import cached_property
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Mapping
+
+from edc_visit_schedule.exceptions import SiteVisitScheduleError
+from edc_visit_schedule.site_visit_schedules import site_visit_schedules
+
+if TYPE_CHECKING:
+    from dateutil.relativedelta import relativedelta
+    from edc_facility import Facility
+    from edc_visit_schedule.schedule import Schedule
+    from edc_visit_schedule.visit import Visit
+    from edc_visit_schedule.visit_schedule import VisitSchedule
+
+__all__ = [
+    "ScheduleIndex",
+    "VisitEntry",
+    "get_schedule_index",
+    "invalidate_schedule_index",
+]
+
+_lock = threading.Lock()
+_index: ScheduleIndex | None = None
+
+
+@dataclass(frozen=True)
+class VisitEntry:
+    """A visit in a schedule with its neighbouring visit codes."""
+
+    visit_schedule_name: str
+    schedule_name: str
+    visit_code: str
+    visit: Visit
+    schedule: Schedule
+    visit_schedule: VisitSchedule
+    next_visit_code: str | None
+    previous_visit_code: str | None
+
+    @property
+    def timepoint(self):
+        return self.visit.timepoint
+
+    @property
+    def rlower(self) -> relativedelta:
+        return self.visit.rlower
+
+    @property
+    def rupper(self) -> relativedelta:
+        return self.visit.rupper
+
+    @property
+    def allow_unscheduled(self) -> bool:
+        return self.visit.allow_unscheduled
+
+    @property
+    def facility_name(self) -> str:
+        return self.visit.facility_name
+
+    @cached_property
+    def facility(self) -> Facility | None:
+        return self.visit.facility
+
+
+class ScheduleIndex:
+    """A read-only index of the registered visit schedules, schedules
+    and visits.
+
+    Built once (see `get_schedule_index`) so that lookups by
+    (visit_schedule_name, schedule_name, visit_code) are a dictionary
+    lookup instead of a walk through `site_visit_schedules` and the
+    schedule's visit collection.
+
+    The index is not updated if a schedule or visit is added to a
+    visit schedule after the index is built. Lookups not found in
+    the index fall back to `site_visit_schedules`.
+    """
+
+    def __init__(self, registry: dict[str, VisitSchedule]):
+        # the registry this index was built from, see `get_schedule_index`
+        self.registry = registry
+        self.registry_size = len(registry)
+        visit_schedules = {}
+        schedules = {}
+        visits = {}
+        for visit_schedule_name, visit_schedule in registry.items():
+            visit_schedules[visit_schedule_name] = visit_schedule
+            for schedule_name, schedule in visit_schedule.schedules.items():
+                schedules[(visit_schedule_name, schedule_name)] = schedule
+                visit_codes = list(schedule.visits.keys())
+                for position, visit_code in enumerate(visit_codes):
+                    visits[(visit_schedule_name, schedule_name, visit_code)] = VisitEntry(
+                        visit_schedule_name=visit_schedule_name,
+                        schedule_name=schedule_name,
+                        visit_code=visit_code,
+                        visit=schedule.visits[visit_code],
+                        schedule=schedule,
+                        visit_schedule=visit_schedule,
+                        next_visit_code=(
+                            visit_codes[position + 1]
+                            if position + 1 < len(visit_codes)
+                            else None
+                        ),
+                        previous_visit_code=visit_codes[position - 1] if position else None,
+                    )
+        self.visit_schedules: Mapping[str, VisitSchedule] = MappingProxyType(visit_schedules)
+        self.schedules: Mapping[tuple[str, str], Schedule] = MappingProxyType(schedules)
+        self.visits: Mapping[tuple[str, str, str], VisitEntry] = MappingProxyType(visits)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(visit_schedules={list(self.visit_schedules)})"
+
+    def get_visit_schedule(self, visit_schedule_name: str) -> VisitSchedule:
+        """Returns the visit schedule or raises as
+        `site_visit_schedules.get_visit_schedule`.
+        """
+        try:
+            return self.visit_schedules[visit_schedule_name]
+        except KeyError:
+            return site_visit_schedules.get_visit_schedule(visit_schedule_name)
+
+    def get_schedule(self, visit_schedule_name: str, schedule_name: str) -> Schedule | None:
+        """Returns the schedule or None."""
+        try:
+            return self.schedules[(visit_schedule_name, schedule_name)]
+        except KeyError:
+            return self.get_visit_schedule(visit_schedule_name).schedules.get(schedule_name)
+
+    def get_visit(
+        self, visit_schedule_name: str, schedule_name: str, visit_code: str
+    ) -> VisitEntry | None:
+        """Returns the VisitEntry or None.
+
+        Looks up the visit in `site_visit_schedules` if not in the
+        index.
+        """
+        try:
+            return self.visits[(visit_schedule_name, schedule_name, visit_code)]
+        except KeyError:
+            return self.get_visit_from_site(visit_schedule_name, schedule_name, visit_code)
+
+    def get_visit_from_site(
+        self, visit_schedule_name: str, schedule_name: str, visit_code: str
+    ) -> VisitEntry | None:
+        """Returns a VisitEntry from `site_visit_schedules` or None."""
+        try:
+            schedule = self.get_schedule(visit_schedule_name, schedule_name)
+        except SiteVisitScheduleError:
+            return None
+        if not schedule or visit_code not in schedule.visits:
+            return None
+        return VisitEntry(
+            visit_schedule_name=visit_schedule_name,
+            schedule_name=schedule_name,
+            visit_code=visit_code,
+            visit=schedule.visits.get(visit_code),
+            schedule=schedule,
+            visit_schedule=self.get_visit_schedule(visit_schedule_name),
+            next_visit_code=getattr(schedule.visits.next(visit_code), "code", None),
+            previous_visit_code=getattr(schedule.visits.previous(visit_code), "code", None),
+        )
+
+    def next_visit_code(
+        self, visit_schedule_name: str, schedule_name: str, visit_code: str
+    ) -> str | None:
+        if entry := self.get_visit(visit_schedule_name, schedule_name, visit_code):
+            return entry.next_visit_code
+        return None
+
+    def previous_visit_code(
+        self, visit_schedule_name: str, schedule_name: str, visit_code: str
+    ) -> str | None:
+        if entry := self.get_visit(visit_schedule_name, schedule_name, visit_code):
+            return entry.previous_visit_code
+        return None
+
+
+def get_schedule_index() -> ScheduleIndex:
+    """Returns the ScheduleIndex for the registered visit schedules.
+
+    Built at app ready and rebuilt if a visit schedule is registered
+    or the registry is replaced afterwards (e.g. in tests). If a
+    schedule or visit is added to a visit schedule that is already
+    registered, lookups fall back to `site_visit_schedules` until
+    `invalidate_schedule_index` is called.
+    """
+    global _index
+    registry = site_visit_schedules._registry
+    index = _index
+    if index is None or index.registry is not registry or index.registry_size != len(registry):
+        with _lock:
+            index = _index = ScheduleIndex(registry)
+    return index
+
+
+def invalidate_schedule_index() -> None:
+    """Rebuilds the ScheduleIndex on the next call to
+    `get_schedule_index`.
+    """
+    global _index
+    with _lock:
+        _index = None
@@ -1,24 +1,40 @@
 from __future__ import annotations
 
+from dataclasses import dataclass, field
 from datetime import date, datetime
 from typing import TYPE_CHECKING, Any
 from zoneinfo import ZoneInfo
 
 from django.apps import apps as django_apps
 from django.core.exceptions import FieldError
-from django.db import IntegrityError
-from edc_metadata.utils import has_keyed_metadata
+from django.db import IntegrityError, transaction
+from edc_constants.constants import NOT_APPLICABLE
+from edc_metadata.constants import KEYED
+from edc_metadata.utils import (
+    get_crf_metadata_model_cls,
+    get_requisition_metadata_model_cls,
+)
+from simple_history.utils import bulk_update_with_history
 
+from .appointment_deleter import AppointmentDeleter
+from .appointment_window_index import AppointmentWindowIndex
 from .constants import MISSED_APPT, NEW_APPT, SKIPPED_APPT
 from .exceptions import AppointmentWindowError
+from .list_model_cache import get_list_model_cache
 from .models import Appointment
+from .profiling import profiled
+from .subject_appointment_timeline import (
+    SubjectAppointmentTimeline,
+    invalidate_timeline,
+)
+from .subject_lock import subject_locked
 from .utils import (
     AppointmentAlreadyStarted,
     get_allow_skipped_appt_using,
     get_appointment_by_datetime,
+    get_appointment_type_model_name,
     raise_on_appt_datetime_not_in_window,
     reset_appointment,
-    skip_appointment,
 )
 
 if TYPE_CHECKING:
@@ -41,6 +57,54 @@ class SkipAppointmentsFieldError(Exception):
     pass
 
 
+# fields set by `reset_appointment` and `skip_appointment`
+UPDATE_FIELDS = [
+    "appt_status",
+    "appt_timing",
+    "appt_type",
+    "appt_type_other",
+    "appt_datetime",
+    "comment",
+]
+
+
+def get_update_values(appointment: Appointment) -> tuple:
+    return tuple(
+        getattr(appointment, appointment._meta.get_field(f).attname) for f in UPDATE_FIELDS
+    )
+
+
+@dataclass
+class SkipAppointmentsPlan:
+    """The changes `SkipAppointments` will make.
+
+    Appointments in `reset`, `skipped` and `next_appointment` hold
+    their new values, not yet saved. An appointment reset and then
+    skipped is only in `skipped`.
+    """
+
+    reset: list[Appointment] = field(default_factory=list)
+    skipped: list[Appointment] = field(default_factory=list)
+    next_appointment: Appointment | None = None
+    deleted: list[Appointment] = field(default_factory=list)
+    # {id: values of UPDATE_FIELDS before the plan}
+    initial: dict[Any, tuple] = field(default_factory=dict)
+
+    @property
+    def next_scheduled_appointment_updated(self) -> bool:
+        return self.next_appointment is not None
+
+    @property
+    def changed(self) -> list[Appointment]:
+        """Returns the appointments with new values."""
+        appointments = self.reset + self.skipped
+        if self.next_appointment:
+            appointments.append(self.next_appointment)
+        return [
+            obj for obj in appointments if get_update_values(obj) != self.initial.get(obj.id)
+        ]
+
+
 class SkipAppointments:
     """Using a future date from a CRF, update the `appt_datetime` of
     the appointment that falls within the window period of the date
@@ -52,6 +116,10 @@ class SkipAppointments:
       within the window period of the date.
     * You should validate the next visit code and the date before
       calling (e.g. on the form).
+
+    `update` computes the changes in memory (see `get_plan`) and
+    writes them with one bulk update and one bulk delete. Call
+    `get_plan` without `apply_plan` for a dry run.
     """
 
     def __init__(self, crf_obj: AnyCRF):
@@ -80,14 +148,154 @@ class SkipAppointments:
         self.visit_schedule_name: str = self.appointment.visit_schedule_name
         self.schedule_name: str = self.appointment.schedule_name
 
+    @profiled("skip_appointments.update")
+    @subject_locked()
     def update(self) -> bool:
         """Reset appointments and set any as skipped up to the
         date provided from the CRF.
 
         Return True if next scheduled appointment is updated.
         """
-        self.reset_appointments()
-        return self.update_appointments()
+        return self.apply_plan(self.get_plan())
+
+    def get_started_keys(self) -> set[tuple[str, int]]:
+        """Returns a set of (visit_code, visit_code_sequence) for the
+        appointments in this schedule with a related visit or KEYED
+        metadata.
+        """
+        opts = dict(
+            subject_identifier=self.subject_identifier,
+            visit_schedule_name=self.visit_schedule_name,
+            schedule_name=self.schedule_name,
+        )
+        started = set(
+            Appointment.related_visit_model_cls()
+            .objects.filter(**{f"appointment__{k}": v for k, v in opts.items()})
+            .values_list("appointment__visit_code", "appointment__visit_code_sequence")
+        )
+        for model_cls in [get_crf_metadata_model_cls(), get_requisition_metadata_model_cls()]:
+            started.update(
+                model_cls.objects.filter(entry_status=KEYED, **opts).values_list(
+                    "visit_code", "visit_code_sequence"
+                )
+            )
+        return started
+
+    def get_plan(self) -> SkipAppointmentsPlan:
+        """Returns the changes `update` will make without saving
+        anything.
+
+        Appointments after this one are reset as in
+        `reset_appointments`. Then, walking forward from this
+        appointment, interim NEW appointments are deleted, scheduled
+        appointments are skipped and the next scheduled appointment
+        is set to the date from the CRF. Appointments with a related
+        visit or KEYED metadata are not changed. The subject's
+        appointments, related visits and KEYED metadata are loaded
+        once up front.
+
+        Raises SkipAppointmentsValueError if the next appointment
+        datetime is not valid.
+        """
+        plan = SkipAppointmentsPlan()
+        appointments = SubjectAppointmentTimeline(self.subject_identifier).appointments(
+            self.visit_schedule_name, self.schedule_name
+        )
+        started = self.get_started_keys()
+        plan.initial = {obj.id: get_update_values(obj) for obj in appointments}
+
+        def is_started(obj: Appointment) -> bool:
+            return (obj.visit_code, obj.visit_code_sequence) in started
+
+        # reset, see `reset_appointments`
+        for appointment in sorted(
+            [obj for obj in appointments if obj.visit_code_sequence == 0],
+            key=lambda obj: obj.timepoint_datetime,
+        ):
+            auto_missed = (
+                appointment.appt_type_id is None
+                and appointment.appt_timing == MISSED_APPT
+                and appointment.appt_status not in [SKIPPED_APPT, NEW_APPT]
+            )
+            if (
+                auto_missed or appointment.appt_datetime > self.appointment.appt_datetime
+            ) and not is_started(appointment):
+                self.set_reset_values(appointment)
+                plan.reset.append(appointment)
+
+        # walk forward from this appointment up to the next scheduled appointment
+        skip_comment = (
+            f"based on date reported at {self.last_crf_obj.related_visit.visit_code}"
+        )
+        appt_type_not_applicable = get_list_model_cache(
+            get_appointment_type_model_name()
+        ).get_or_none(NOT_APPLICABLE)
+        ids = [obj.id for obj in appointments]
+        start = ids.index(self.appointment.id) if self.appointment.id in ids else len(ids)
+        for appointment in appointments[start:]:
+            if appointment.visit_code_sequence > 0:
+                if appointment.appt_status == NEW_APPT:
+                    plan.deleted.append(appointment)
+            elif self.is_next_scheduled(appointment):
+                if not is_started(appointment):
+                    appointment.appt_status = NEW_APPT
+                    appointment.appt_datetime = self.next_appt_datetime
+                    appointment.comment = ""
+                    # against the planned values, not those in the DB
+                    self.validate_appointment_as_next(
+                        appointment,
+                        appointments=[
+                            obj for obj in appointments if obj.visit_code_sequence == 0
+                        ],
+                    )
+                    if appointment in plan.reset:
+                        plan.reset.remove(appointment)
+                    plan.next_appointment = appointment
+                break
+            elif not is_started(appointment):
+                self.set_reset_values(
+                    appointment,
+                    appt_status=SKIPPED_APPT,
+                    appt_timing=NOT_APPLICABLE,
+                    appt_type=appt_type_not_applicable,
+                    comment=skip_comment,
+                )
+                if appointment in plan.reset:
+                    plan.reset.remove(appointment)
+                plan.skipped.append(appointment)
+        return plan
+
+    @staticmethod
+    def set_reset_values(appointment: Appointment, **kwargs) -> None:
+        """Sets the values in memory as `reset_appointment`."""
+        values = dict(
+            appt_status=appointment._meta.get_field("appt_status").default,
+            appt_timing=appointment._meta.get_field("appt_timing").default,
+            appt_type=None,
+            appt_type_other=None,
+            appt_datetime=appointment.timepoint_datetime,
+            comment="",
+        )
+        values.update(**kwargs)
+        for k, v in values.items():
+            setattr(appointment, k, v)
+
+    def apply_plan(self, plan: SkipAppointmentsPlan) -> bool:
+        """Saves the changes in the plan and returns True if the
+        next scheduled appointment is updated.
+        """
+        with transaction.atomic():
+            if changed := plan.changed:
+                bulk_update_with_history(
+                    changed,
+                    Appointment,
+                    fields=UPDATE_FIELDS,
+                    manager=Appointment.objects,
+                )
+            if plan.deleted:
+                AppointmentDeleter(plan.deleted).delete()
+        invalidate_timeline(self.subject_identifier)
+        return plan.next_scheduled_appointment_updated
 
     def reset_appointments(self):
         """Reset any Appointments previously where `appt_status`
@@ -118,71 +326,12 @@ class SkipAppointments:
             except AppointmentAlreadyStarted:
                 pass
 
-    def update_appointments(self) -> bool:
-        """Return True if next scheduled appointment is updated.
-
-        Update Appointments up the next apointment date.
-
-        Set `appt_status` = SKIPPED_APPT up the appointment BEFORE
-        the date from the CRF.
-
-        Only set the `appt_datetime` for the appointment where the  date
-        from the CRF lands in the window period. Leave status as NEW_APPT.
-
-        Stop if any appointment has keyed data.
-        """
-        next_scheduled_appointment_updated = False
-        skip_comment = (
-            f"based on date reported at {self.last_crf_obj.related_visit.visit_code}"
-        )
-
-        cancelled_appointments = []
-        appointment = self.appointment
-        while appointment:
-            if appointment.visit_code_sequence > 0:
-                if appointment.appt_status == NEW_APPT:
-                    cancelled_appointments.append(appointment)
-            elif self.is_next_scheduled(appointment):
-                try:
-                    self.update_appointment_as_next_scheduled(appointment)
-                except AppointmentAlreadyStarted:
-                    pass
-                else:
-                    next_scheduled_appointment_updated = True
-                break
-            else:
-                try:
-                    skip_appointment(appointment, comment=skip_comment)
-                except AppointmentAlreadyStarted:
-                    pass
-            appointment = appointment.relative_next
-        for appointment in cancelled_appointments:
-            appointment.delete()
-        return next_scheduled_appointment_updated
-
     def is_next_scheduled(self, appointment):
         return (
             appointment.visit_code == self.next_visit_code
             and appointment.visit_code_sequence == 0
         )
 
-    def update_appointment_as_next_scheduled(self, appointment: Appointment) -> None:
-        """Return True if this is the "next" appointment (the last
-        appointment in the sequence).
-
-        If "next", try to update if CRfs not yet submitted/KEYED.
-        """
-        if has_keyed_metadata(appointment) or appointment.related_visit:
-            raise AppointmentAlreadyStarted(
-                f"Unable update as next. Appointment already started. Got {appointment}."
-            )
-        else:
-            appointment.appt_status = NEW_APPT
-            appointment.appt_datetime = self.next_appt_datetime
-            appointment.comment = ""
-            self.validate_appointment_as_next(appointment)
-            appointment.save(update_fields=["appt_status", "appt_datetime", "comment"])
-
     @property
     def last_crf_obj(self):
         """Return the CRF instance for the last timepoint /
@@ -281,7 +430,15 @@ class SkipAppointments:
                 )
         return self._next_visit_code
 
-    def validate_appointment_as_next(self, appointment):
+    def validate_appointment_as_next(
+        self, appointment: Appointment, appointments: list[Appointment] | None = None
+    ):
+        """Raises if the next appointment datetime is not valid for
+        `appointment`.
+
+        If `appointments`, the scheduled appointments are looked up
+        by datetime in the list instead of the DB (see `get_plan`).
+        """
         try:
             raise_on_appt_datetime_not_in_window(appointment)
         except AppointmentWindowError as e:
@@ -293,6 +450,16 @@ class SkipAppointments:
             appointment.visit_schedule_name,
             appointment.schedule_name,
             raise_if_in_gap=False,
+            window_index=(
+                None
+                if appointments is None
+                else AppointmentWindowIndex(
+                    appointment.subject_identifier,
+                    appointment.visit_schedule_name,
+                    appointment.schedule_name,
+                    appointments=sorted(appointments, key=lambda obj: obj.timepoint_datetime),
+                )
+            ),
         )
         if next_appt.visit_code != self.next_visit_code:
             raise SkipAppointmentsValueError(
@@ -301,14 +468,7 @@ class SkipAppointments:
                 f"The appointment datetime matches with {next_appt.visit_code}."
             )
 
-        next_appointment = get_appointment_by_datetime(
-            self.next_appt_datetime,
-            appointment.subject_identifier,
-            appointment.visit_schedule_name,
-            appointment.schedule_name,
-            raise_if_in_gap=False,
-        )
-        return self.appointment == next_appointment
+        return self.appointment == next_appt
 
         # and getattr(
         #     self.crf_obj, "allow_create_interim", None
@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, defaultdict
+from decimal import Decimal
+from itertools import count
+from typing import TYPE_CHECKING, Type
+from uuid import UUID
+
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core.cache import caches
+
+if TYPE_CHECKING:
+    from .models import Appointment
+
+__all__ = [
+    "SubjectAppointmentTimeline",
+    "SubjectAppointmentTimelineError",
+    "get_timeline",
+    "get_timeline_version",
+    "invalidate_timeline",
+]
+
+# the most recently invalidated subjects kept in this process
+MAX_VERSIONS = 10000
+
+# a new version is set for a subject each time an appointment is
+# saved or deleted. A timeline loaded before then reloads itself.
+_versions: OrderedDict[str, int] = OrderedDict()
+_counter = count(1)
+# the highest version dropped from _versions, returned for subjects
+# not in _versions so that no timeline loaded before a drop matches
+_dropped_version = 0
+_lock = threading.Lock()
+
+
+class SubjectAppointmentTimelineError(Exception):
+    pass
+
+
+def get_shared_cache():
+    """Returns the Django cache set in
+    `settings.EDC_APPOINTMENT_TIMELINE_CACHE` or None.
+
+    If set, timeline versions are kept in the shared cache so that
+    saving an appointment in one process marks the subject's
+    timelines stale in all processes. Default is None (process-local
+    only).
+    """
+    if alias := getattr(settings, "EDC_APPOINTMENT_TIMELINE_CACHE", None):
+        return caches[alias]
+    return None
+
+
+def get_version_key(subject_identifier: str) -> str:
+    return f"edc_appointment.timeline.{subject_identifier}.version"
+
+
+def get_timeline_version(subject_identifier: str) -> int:
+    """Returns the current timeline version for this subject."""
+    if shared_cache := get_shared_cache():
+        # a new version if the key was evicted, see `invalidate_timeline`
+        return shared_cache.get_or_set(
+            get_version_key(subject_identifier), time.time_ns, timeout=None
+        )
+    with _lock:
+        return _versions.get(subject_identifier, _dropped_version)
+
+
+def invalidate_timeline(subject_identifier: str) -> None:
+    """Marks any loaded timeline for this subject as stale.
+
+    Called from the post_save and post_delete signals of the
+    Appointment model. Call directly after writing appointments in
+    a way that does not send signals (e.g. `QuerySet.update`).
+
+    Versions are kept for the last `MAX_VERSIONS` subjects in
+    this process, or in the shared cache, see `get_shared_cache`.
+    """
+    global _dropped_version
+    if shared_cache := get_shared_cache():
+        try:
+            shared_cache.incr(get_version_key(subject_identifier))
+        except ValueError:
+            shared_cache.set(get_version_key(subject_identifier), time.time_ns(), timeout=None)
+        return
+    with _lock:
+        _versions[subject_identifier] = next(_counter)
+        _versions.move_to_end(subject_identifier)
+        while len(_versions) > MAX_VERSIONS:
+            _, version = _versions.popitem(last=False)
+            _dropped_version = max(_dropped_version, version)
+
+
+def get_timeline(appointment: Appointment) -> SubjectAppointmentTimeline | None:
+    """Returns the timeline attached to this appointment, or None."""
+    return getattr(appointment, "_timeline", None)
+
+
+class SubjectAppointmentTimeline:
+    """An in-memory, ordered timeline of a subject's appointments.
+
+    Loads all appointments for the subject in one query, ordered by
+    (timepoint, visit_code_sequence) per visit schedule/schedule.
+
+    Navigation methods use the same rules as the queries in
+    `get_next_appointment`, `get_previous_appointment` and
+    `AppointmentMethodsModelMixin`.
+
+    Attach an appointment to use the timeline when accessing
+    `next`, `previous`, `relative_next`, `relative_previous`,
+    `first`, `next_by_timepoint`, `previous_by_timepoint` and
+    `last_visit_code_sequence`:
+
+        timeline = SubjectAppointmentTimeline(subject_identifier)
+        appointment = timeline.attach(appointment)
+        appointment.relative_next  # no query
+
+    Appointments returned by the timeline are attached to it.
+
+    The timeline reloads if an appointment for the subject is saved
+    or deleted (see `invalidate_timeline`).
+    """
+
+    def __init__(
+        self,
+        subject_identifier: str,
+        appointment_model_cls: Type[Appointment] | None = None,
+    ):
+        self.subject_identifier = subject_identifier
+        self.appointment_model_cls = appointment_model_cls or django_apps.get_model(
+            "edc_appointment.appointment"
+        )
+        self.version: int | None = None
+        self._schedules: dict[tuple[str, str], list[Appointment]] = {}
+        self._keys: dict[tuple[str, str], list[tuple[Decimal, int]]] = {}
+        self._positions: dict[UUID, tuple[tuple[str, str], int]] = {}
+        self._scheduled: list[Appointment] = []
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(subject_identifier={self.subject_identifier})"
+
+    def load(self) -> None:
+        """Loads (or reloads) the subject's appointments."""
+        self._schedules = defaultdict(list)
+        self._keys = defaultdict(list)
+        self._positions = {}
+        self.version = get_timeline_version(self.subject_identifier)
+        appointments = self.appointment_model_cls.objects.filter(
+            subject_identifier=self.subject_identifier
+        ).order_by("visit_schedule_name", "schedule_name", "timepoint", "visit_code_sequence")
+        for appointment in appointments:
+            appointment._timeline = self
+            schedule = (appointment.visit_schedule_name, appointment.schedule_name)
+            self._positions[appointment.id] = (schedule, len(self._schedules[schedule]))
+            self._schedules[schedule].append(appointment)
+            self._keys[schedule].append(
+                (appointment.timepoint, appointment.visit_code_sequence)
+            )
+        self._scheduled = sorted(
+            [
+                obj
+                for objs in self._schedules.values()
+                for obj in objs
+                if obj.visit_code_sequence == 0
+            ],
+            key=lambda obj: obj.timepoint,
+        )
+
+    @property
+    def stale(self) -> bool:
+        return self.version is None or self.version != get_timeline_version(
+            self.subject_identifier
+        )
+
+    def refresh_if_stale(self) -> None:
+        if self.stale:
+            self.load()
+
+    def attach(self, appointment: Appointment) -> Appointment:
+        """Attaches an appointment instance to this timeline and
+        returns the instance.
+        """
+        if appointment.subject_identifier != self.subject_identifier:
+            raise SubjectAppointmentTimelineError(
+                f"Appointment is for another subject. Expected {self.subject_identifier}. "
+                f"Got {appointment}."
+            )
+        appointment._timeline = self
+        return appointment
+
+    @staticmethod
+    def detach(appointment: Appointment) -> Appointment:
+        appointment.__dict__.pop("_timeline", None)
+        return appointment
+
+    def appointments(self, visit_schedule_name: str, schedule_name: str) -> list[Appointment]:
+        """Returns the ordered list of appointments for a schedule."""
+        self.refresh_if_stale()
+        return list(self._schedules.get((visit_schedule_name, schedule_name), []))
+
+    def _get_schedule(self, appointment: Appointment) -> tuple[list, list]:
+        self.refresh_if_stale()
+        schedule = (appointment.visit_schedule_name, appointment.schedule_name)
+        return self._schedules.get(schedule, []), self._keys.get(schedule, [])
+
+    def next(self, appointment: Appointment, include_interim: bool | None = None):
+        """Returns the next appointment or None.
+
+        If `include_interim`, the appointment following this one in
+        (timepoint, visit_code_sequence) order, otherwise the next
+        appointment where visit_code_sequence=0.
+        """
+        appointments, keys = self._get_schedule(appointment)
+        if include_interim:
+            schedule, position = self._positions.get(appointment.id, (None, None))
+            if schedule != (
+                appointment.visit_schedule_name,
+                appointment.schedule_name,
+            ) or position + 1 >= len(appointments):
+                return None
+            return appointments[position + 1]
+        index = bisect_right(keys, (appointment.timepoint, float("inf")))
+        for obj in appointments[index:]:
+            if obj.visit_code_sequence == 0 and obj.id != appointment.id:
+                return obj
+        return None
+
+    def previous(self, appointment: Appointment, include_interim: bool | None = None):
+        """Returns the previous appointment or None.
+
+        If `include_interim`, the appointment before this one in
+        (timepoint, visit_code_sequence) order, otherwise the previous
+        appointment where visit_code_sequence=0.
+        """
+        appointments, keys = self._get_schedule(appointment)
+        index = bisect_left(keys, (appointment.timepoint, float("-inf")))
+        if include_interim and appointment.visit_code_sequence != 0:
+            candidates = [
+                obj
+                for obj in appointments[
+                    : bisect_right(keys, (appointment.timepoint, float("inf")))
+                ]
+                if obj.visit_code_sequence < appointment.visit_code_sequence
+            ]
+        elif include_interim:
+            candidates = appointments[:index]
+        else:
+            candidates = [obj for obj in appointments[:index] if obj.visit_code_sequence == 0]
+        for obj in reversed(candidates):
+            if obj.id != appointment.id:
+                return obj
+        return None
+
+    def first(self, appointment: Appointment) -> Appointment:
+        """Returns the appointment at this timepoint where
+        visit_code_sequence=0 or raises DoesNotExist.
+        """
+        if appointment.visit_code_sequence == 0:
+            return appointment
+        appointments, keys = self._get_schedule(appointment)
+        index = bisect_left(keys, (appointment.timepoint, 0))
+        if index < len(keys) and keys[index] == (appointment.timepoint, 0):
+            return appointments[index]
+        raise self.appointment_model_cls.DoesNotExist(
+            f"{self.appointment_model_cls._meta.object_name} matching query does not exist."
+        )
+
+    def last_visit_code_sequence(self, appointment: Appointment) -> int | None:
+        """Returns the largest visit_code_sequence greater than that of
+        this appointment for this visit code, or None.
+        """
+        appointments, _ = self._get_schedule(appointment)
+        sequences = [
+            obj.visit_code_sequence
+            for obj in appointments
+            if obj.visit_code == appointment.visit_code
+            and obj.visit_code_sequence > appointment.visit_code_sequence
+        ]
+        return max(sequences) if sequences else None
+
+    def next_by_timepoint(self, appointment: Appointment) -> Appointment | None:
+        """Returns the next appointment by timepoint, where
+        visit_code_sequence=0, from any of the subject's schedules.
+        """
+        self.refresh_if_stale()
+        for obj in self._scheduled:
+            if obj.timepoint > appointment.timepoint:
+                return obj
+        return None
+
+    def previous_by_timepoint(self, appointment: Appointment) -> Appointment | None:
+        """Returns the previous appointment by timepoint, where
+        visit_code_sequence=0, from any of the subject's schedules.
+        """
+        self.refresh_if_stale()
+        for obj in reversed(self._scheduled):
+            if obj.timepoint < appointment.timepoint:
+                return obj
+        return None
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from operator import attrgetter
+
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+
+from .exceptions import SubjectLockTimeout
+
+__all__ = [
+    "is_subject_locking_enabled",
+    "subject_lock",
+    "subject_locked",
+]
+
+# seconds between attempts, doubled after each attempt up to MAX_RETRY_INTERVAL
+RETRY_INTERVAL = 0.05
+MAX_RETRY_INTERVAL = 1.0
+
+_local = threading.local()
+
+logger = logging.getLogger(__name__)
+
+
+def is_subject_locking_enabled() -> bool:
+    """Returns True if `settings.EDC_APPOINTMENT_SUBJECT_LOCKING` is
+    True.
+
+    Default is True.
+    """
+    return getattr(settings, "EDC_APPOINTMENT_SUBJECT_LOCKING", True)
+
+
+def get_subject_lock_timeout() -> float:
+    """Returns the seconds to wait for a subject lock from
+    `settings.EDC_APPOINTMENT_SUBJECT_LOCK_TIMEOUT`.
+
+    Default is 10.
+    """
+    return getattr(settings, "EDC_APPOINTMENT_SUBJECT_LOCK_TIMEOUT", 10)
+
+
+def get_held() -> Counter:
+    """Returns a Counter of {(using, subject_identifier): depth} for
+    the locks held by this thread.
+    """
+    if not hasattr(_local, "held"):
+        _local.held = Counter()
+    return _local.held
+
+
+def get_lock_key(subject_identifier: str) -> int:
+    """Returns a signed 64-bit key for pg_advisory_xact_lock."""
+    digest = hashlib.md5(
+        f"edc_appointment.subject.{subject_identifier}".encode(), usedforsecurity=False
+    ).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+
+def acquire_subject_lock(subject_identifier: str, using: str) -> bool:
+    """Tries once to lock the subject and returns True if locked.
+
+    Must be called in a transaction. The lock is held until the
+    outermost transaction commits or rolls back:
+
+    * PostgreSQL: a transaction-level advisory lock;
+    * otherwise (e.g. MySQL): `select_for_update` on the subject's
+      RegisteredSubject row. If there is no RegisteredSubject row,
+      nothing is locked and a warning is logged;
+    * databases without `select_for_update` (e.g. SQLite) never lock.
+      Returns True.
+
+    MySQL named locks (GET_LOCK) are not used because they belong to
+    the connection, not the transaction, and would be released before
+    an outer transaction commits.
+    """
+    connection = connections[using]
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_try_advisory_xact_lock(%s)", [get_lock_key(subject_identifier)]
+            )
+            return bool(cursor.fetchone()[0])
+    if not connection.features.has_select_for_update:
+        return True
+    registered_subject_model_cls = django_apps.get_model("edc_registration.registeredsubject")
+    try:
+        with transaction.atomic(using=using):
+            locked = list(
+                registered_subject_model_cls.objects.using(using)
+                .select_for_update(nowait=connection.features.has_select_for_update_nowait)
+                .filter(subject_identifier=subject_identifier)
+                .values_list("id", flat=True)
+            )
+    except DatabaseError:
+        return False
+    if not locked:
+        logger.warning(
+            f"Subject {subject_identifier} not locked. "
+            "RegisteredSubject instance does not exist."
+        )
+    return True
+
+
+@contextmanager
+def subject_lock(
+    subject_identifier: str | None,
+    using: str | None = None,
+    timeout: float | None = None,
+):
+    """Runs the block in a transaction holding a lock on the subject.
+
+    Writes to a subject's appointments from concurrent requests (e.g.
+    two browser tabs or a form save and a signal) wait for each other
+    instead of failing on the unique constraints.
+
+    If called in a transaction, the lock is held until that
+    transaction commits or rolls back. The lock is reentrant in the
+    same thread. Waits up to `timeout`
+    seconds (see `get_subject_lock_timeout`), retrying with backoff,
+    then raises SubjectLockTimeout. Does nothing if
+    `settings.EDC_APPOINTMENT_SUBJECT_LOCKING` is False.
+
+    For example:
+
+        with subject_lock(subject_identifier):
+            ...
+    """
+    using = using or DEFAULT_DB_ALIAS
+    key = (using, subject_identifier)
+    held = get_held()
+    if not subject_identifier or not is_subject_locking_enabled() or held[key]:
+        held[key] += 1
+        try:
+            yield
+        finally:
+            held[key] -= 1
+            if not held[key]:
+                del held[key]
+        return
+    timeout = get_subject_lock_timeout() if timeout is None else timeout
+    with transaction.atomic(using=using):
+        deadline = time.monotonic() + timeout
+        interval = RETRY_INTERVAL
+        while not acquire_subject_lock(subject_identifier, using):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise SubjectLockTimeout(
+                    f"Unable to lock subject {subject_identifier}. "
+                    f"Timed out after {timeout}s."
+                )
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 2, MAX_RETRY_INTERVAL)
+        held[key] = 1
+        try:
+            yield
+        finally:
+            del held[key]
+
+
+def subject_locked(attr: str | None = None):
+    """Decorator to run a method in `subject_lock`.
+
+    The subject_identifier is read from `self.<attr>` (dotted paths
+    allowed). Default `attr` is "subject_identifier".
+
+    For example:
+
+        @subject_locked()
+        def create_appointments(self, ...):
+            ...
+    """
+    getter = attrgetter(attr or "subject_identifier")
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with subject_lock(getter(self)):
+                return func(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
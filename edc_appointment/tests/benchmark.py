@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.contrib.sites.models import Site
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+BASELINE_PATH = Path(__file__).parent / "benchmark_baseline.json"
+
+# number of queries in the reference operation, see `Benchmark.reference_seconds`
+REFERENCE_QUERIES = 500
+
+
+class Benchmark:
+    """Records wall time and query counts per named operation and
+    compares them to a stored baseline.
+
+    Wall time is stored as a ratio to the wall time of a reference
+    operation timed on the same machine (see `reference_seconds`),
+    not in seconds, so a baseline saved on one machine may be
+    compared on another.
+
+    Environment variables:
+        * EDC_APPOINTMENT_BENCHMARK_BASELINE: path to the baseline
+          JSON file. Default: tests/benchmark_baseline.json
+        * EDC_APPOINTMENT_BENCHMARK_THRESHOLD: allowed increase
+          relative to the baseline. Default: 0.25 (25%)
+        * EDC_APPOINTMENT_BENCHMARK_MIN_SECONDS: increases in wall
+          time of less than this many seconds (on this machine) are
+          ignored. Default: 0.5
+        * EDC_APPOINTMENT_BENCHMARK_SAVE: if set, results are written
+          to the baseline file instead of compared. Otherwise an
+          operation missing from the baseline fails.
+    """
+
+    def __init__(
+        self, baseline_path: str | Path | None = None, threshold: float | None = None
+    ):
+        self.baseline_path = Path(
+            baseline_path
+            or os.environ.get("EDC_APPOINTMENT_BENCHMARK_BASELINE", BASELINE_PATH)
+        )
+        self.threshold = (
+            float(os.environ.get("EDC_APPOINTMENT_BENCHMARK_THRESHOLD", 0.25))
+            if threshold is None
+            else threshold
+        )
+        self.min_seconds = float(os.environ.get("EDC_APPOINTMENT_BENCHMARK_MIN_SECONDS", 0.5))
+        self.save_baseline = bool(os.environ.get("EDC_APPOINTMENT_BENCHMARK_SAVE"))
+        self.results: dict[str, dict] = {}
+        self._reference_seconds: float | None = None
+
+    @property
+    def reference_seconds(self) -> float:
+        """Returns the wall time of the reference operation,
+        `REFERENCE_QUERIES` lookups of a Site by pk.
+
+        Timed once, the best of three runs.
+        """
+        if self._reference_seconds is None:
+            timings = []
+            for _ in range(0, 3):
+                start = time.perf_counter()
+                for _ in range(0, REFERENCE_QUERIES):
+                    Site.objects.filter(pk=1).exists()
+                timings.append(time.perf_counter() - start)
+            self._reference_seconds = min(timings)
+        return self._reference_seconds
+
+    @contextmanager
+    def measure(self, name: str):
+        """Adds the wall time and number of queries of the block to
+        the totals for `name`.
+        """
+        result = self.results.setdefault(name, dict(calls=0, queries=0, seconds=0.0))
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            yield
+            result["seconds"] += time.perf_counter() - start
+        result["queries"] += len(context.captured_queries)
+        result["calls"] += 1
+
+    def load_baseline(self) -> dict[str, dict]:
+        try:
+            return json.loads(self.baseline_path.read_text())
+        except FileNotFoundError:
+            return {}
+
+    def get_ratio(self, result: dict) -> float:
+        """Returns the wall time of the result relative to the
+        reference operation.
+        """
+        return result["seconds"] / self.reference_seconds
+
+    def regressions(self) -> list[str]:
+        """Returns a list of messages, one for each operation where
+        the query count or the wall time ratio exceeds the baseline
+        by more than the threshold or that is not in the baseline.
+        """
+        messages = []
+        baseline = self.load_baseline()
+        for name, result in self.results.items():
+            if name not in baseline:
+                messages.append(
+                    f"{name}: not in baseline {self.baseline_path}. "
+                    "Set EDC_APPOINTMENT_BENCHMARK_SAVE=1 to save it."
+                )
+                continue
+            values = dict(queries=result["queries"], ratio=self.get_ratio(result))
+            for key, value in values.items():
+                limit = baseline[name][key] * (1 + self.threshold)
+                if key == "ratio":
+                    limit = max(
+                        limit, baseline[name][key] + self.min_seconds / self.reference_seconds
+                    )
+                if value > limit:
+                    messages.append(
+                        f"{name}: {key} {value:.3f} > {limit:.3f} "
+                        f"(baseline {baseline[name][key]:.3f})"
+                    )
+        return messages
+
+    def save(self) -> None:
+        """Writes the calls, queries and wall time ratio of each
+        result to the baseline file.
+        """
+        baseline = self.load_baseline()
+        for name, result in self.results.items():
+            baseline[name] = dict(
+                calls=result["calls"],
+                queries=result["queries"],
+                ratio=round(self.get_ratio(result), 3),
+            )
+        self.baseline_path.write_text(json.dumps(baseline, indent=2, sort_keys=True))
+
+    def report(self) -> str:
+        return "\n".join(
+            f"{name}: {result['calls']} calls, {result['queries']} queries, "
+            f"{result['seconds']:.3f}s ({self.get_ratio(result):.3f} x reference)"
+            for name, result in sorted(self.results.items())
+        )
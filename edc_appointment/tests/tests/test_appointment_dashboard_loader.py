@@ -0,0 +1,142 @@
+import datetime as dt
+from zoneinfo import ZoneInfo
+
+import time_machine
+from django.contrib.auth.models import User
+from django.contrib.sites.models import Site
+from django.db import connection
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.views.generic.base import ContextMixin, View
+from edc_facility.import_holidays import import_holidays
+from edc_metadata.constants import REQUIRED
+from edc_metadata.utils import get_crf_metadata_model_cls, has_keyed_metadata
+
+from edc_appointment.appointment_deleter import bulk_delete
+from edc_appointment.models import Appointment
+from edc_appointment.view_mixins import AppointmentViewMixin
+from edc_appointment.view_utils import AppointmentDashboardLoader, AppointmentRow
+from edc_appointment_app.tests.appointment_app_test_case_mixin import (
+    AppointmentAppTestCaseMixin,
+)
+
+from ..helper import Helper
+
+utc_tz = ZoneInfo("UTC")
+
+appointments_template = """{% load edc_subject_dashboard_extras %}
+{% for appointment in appointments %}
+  {% render_appointment_status_icon appt_status=appointment.appt_status %}
+  {{ appointment.visit_code }}.{{ appointment.visit_code_sequence }}
+  {% render_appointment_button appointment %}
+  {{ appointment.title }} {{ appointment.related_visit.reason }}
+  {{ appointment.related_visit.report_datetime|default:appointment.appt_datetime }}
+  {{ appointment.relative_next.appt_datetime }} {{ appointment.site.id }}
+  {{ appointment.has_required_metadata }} {{ appointment.has_keyed_metadata }}
+{% endfor %}"""
+
+
+class DashboardView(AppointmentViewMixin, ContextMixin, View):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.subject_identifier = None
+
+    def get_context_data(self, **kwargs):
+        self.subject_identifier = self.kwargs.get("subject_identifier")
+        return super().get_context_data(**kwargs)
+
+
+test_datetime = dt.datetime(2019, 6, 11, 8, 00, tzinfo=utc_tz)
+
+
+@override_settings(SITE_ID=10)
+@time_machine.travel(test_datetime)
+class TestAppointmentDashboardLoader(AppointmentAppTestCaseMixin, TestCase):
+    helper_cls = Helper
+
+    @classmethod
+    def setUpTestData(cls):
+        import_holidays()
+
+    def test_rows(self):
+        appointments = Appointment.objects.filter(
+            subject_identifier=self.subject_identifier
+        ).order_by("timepoint", "visit_code_sequence")
+        loader = AppointmentDashboardLoader(self.subject_identifier)
+        self.assertEqual([row.appointment for row in loader.rows], list(appointments))
+        for row, appointment in zip(loader.rows, appointments):
+            with self.subTest(appointment=appointment):
+                self.assertEqual(row.visit_code, appointment.visit_code)
+                self.assertEqual(row.related_visit, appointment.related_visit)
+                self.assertEqual(row.has_keyed_metadata, has_keyed_metadata(appointment))
+                self.assertEqual(
+                    row.crf_required,
+                    get_crf_metadata_model_cls()
+                    .objects.filter(
+                        subject_identifier=appointment.subject_identifier,
+                        visit_schedule_name=appointment.visit_schedule_name,
+                        schedule_name=appointment.schedule_name,
+                        visit_code=appointment.visit_code,
+                        visit_code_sequence=appointment.visit_code_sequence,
+                        entry_status=REQUIRED,
+                    )
+                    .exists(),
+                )
+
+    def test_num_queries(self):
+        loader = AppointmentDashboardLoader(self.subject_identifier)
+        with self.assertNumQueries(3):
+            for row in loader.rows:
+                row.related_visit
+                row.appt_type
+                row.has_required_metadata
+
+    @staticmethod
+    def create_user() -> User:
+        user = User.objects.create_superuser("user_login", "u@example.com", "pass")
+        user.userprofile.sites.add(Site.objects.get(id=10))
+        return user
+
+    def render_dashboard(self) -> str:
+        request = RequestFactory().get("/")
+        request.user = self.user
+        request.site = Site.objects.get(id=10)
+        view = DashboardView()
+        view.setup(request, subject_identifier=self.subject_identifier)
+        context = view.get_context_data()
+        return Template(appointments_template).render(
+            Context(dict(request=request, user=self.user, **context))
+        )
+
+    def test_dashboard_view_appointments_are_rows(self):
+        self.user = self.create_user()
+        request = RequestFactory().get("/")
+        request.user = self.user
+        request.site = Site.objects.get(id=10)
+        view = DashboardView()
+        view.setup(request, subject_identifier=self.subject_identifier)
+        context = view.get_context_data()
+        self.assertTrue(context["appointments"])
+        for row in context["appointments"]:
+            self.assertIsInstance(row, AppointmentRow)
+            self.assertEqual(row.__class__, Appointment)
+            self.assertEqual(row.relative_next, row.appointment.relative_next)
+
+    def test_dashboard_view_num_queries(self):
+        """Assert queries to render the appointments do not grow with
+        the number of appointments.
+        """
+        self.user = self.create_user()
+        with bulk_delete():
+            Appointment.objects.filter(visit_code_sequence__gt=0).delete()
+        self.render_dashboard()
+        with CaptureQueriesContext(connection) as context:
+            self.render_dashboard()
+        num_queries = len(context.captured_queries)
+
+        self.create_unscheduled_appointments(Appointment.objects.get(timepoint=0))
+        self.assertEqual(Appointment.objects.count(), 7)
+        with CaptureQueriesContext(connection) as context:
+            self.render_dashboard()
+        self.assertEqual(len(context.captured_queries), num_queries)
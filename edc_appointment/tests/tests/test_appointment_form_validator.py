@@ -112,6 +112,43 @@ class TestAppointmentFormValidator(AppointmentTestCaseMixin, TestCase):
         )
         self.assertEqual(appointments[3], get_previous_appointment(appointments[4]))
 
+    def test_validation_context(self):
+        """Asserts the validation context loads appointments, related
+        visits and onschedule rows once.
+        """
+        schedule_name = self.visit_schedule1.schedules.get("schedule1").name
+        self.helper.consent_and_put_on_schedule(
+            visit_schedule_name=self.visit_schedule1.name, schedule_name=schedule_name
+        )
+        appointments = Appointment.objects.all().order_by("timepoint", "visit_code_sequence")
+        SubjectVisit.objects.create(
+            appointment=appointments[0],
+            report_datetime=appointments[0].appt_datetime,
+            reason=SCHEDULED,
+        )
+        # the visit sets appointments[0] to IN_PROGRESS
+        appointments = list(appointments)
+        self.assertEqual(appointments[0].appt_status, IN_PROGRESS_APPT)
+        form_validator = AppointmentFormValidator(
+            cleaned_data=dict(appt_status=IN_PROGRESS_APPT), instance=appointments[1]
+        )
+        context = form_validator.context
+        with self.assertNumQueries(3):
+            self.assertEqual(context.previous, appointments[0])
+            self.assertEqual(context.relative_previous, appointments[0])
+            self.assertEqual(context.relative_next, appointments[2])
+            self.assertTrue(context.has_related_visit(appointments[0]))
+            self.assertFalse(context.has_related_visit(appointments[2]))
+            self.assertTrue(context.appointment_in_progress_exists)
+            self.assertIsNotNone(context.get_onschedule_obj(appointments[1].appt_datetime))
+        with self.assertNumQueries(0):
+            form_validator.validate_visit_report_sequence()
+            form_validator.validate_appt_datetime_not_before_previous_appt_datetime()
+            form_validator.validate_appt_datetime_not_after_next_appt_datetime()
+            form_validator.validate_scheduled_parent_not_missed()
+            form_validator.validate_timepoint()
+            self.assertTrue(form_validator.appointment_in_progress_exists)
+
     def test_(self):
         try:
             AppointmentFormValidator(cleaned_data={})
@@ -0,0 +1,78 @@
+import datetime as dt
+from zoneinfo import ZoneInfo
+
+import time_machine
+from django.test import TestCase, override_settings
+from edc_facility.import_holidays import import_holidays
+
+from edc_appointment.constants import NEW_APPT
+from edc_appointment.models import Appointment
+from edc_appointment_app.tests.appointment_app_test_case_mixin import (
+    AppointmentAppTestCaseMixin,
+)
+
+from ..helper import Helper
+
+utc_tz = ZoneInfo("UTC")
+
+test_datetime = dt.datetime(2019, 6, 11, 8, 00, tzinfo=utc_tz)
+
+
+@override_settings(SITE_ID=10)
+@time_machine.travel(test_datetime)
+class TestAppointmentQuerySet(AppointmentAppTestCaseMixin, TestCase):
+    helper_cls = Helper
+
+    @classmethod
+    def setUpTestData(cls):
+        import_holidays()
+
+    def assert_neighbours(self, appointment, previous, next_):
+        self.assertEqual(
+            appointment.prev_appt_datetime, previous.appt_datetime if previous else None
+        )
+        self.assertEqual(
+            appointment.prev_appt_status, previous.appt_status if previous else None
+        )
+        self.assertEqual(
+            appointment.next_appt_datetime, next_.appt_datetime if next_ else None
+        )
+        self.assertEqual(appointment.next_visit_code, next_.visit_code if next_ else None)
+
+    def test_with_neighbours_include_interim(self):
+        appointments = Appointment.objects.filter(
+            subject_identifier=self.subject_identifier
+        ).order_by("timepoint", "visit_code_sequence")
+        with self.assertNumQueries(1):
+            annotated = list(appointments.with_neighbours())
+        self.assertEqual(len(annotated), appointments.count())
+        for appointment in annotated:
+            with self.subTest(appointment=appointment):
+                self.assert_neighbours(
+                    appointment, appointment.relative_previous, appointment.relative_next
+                )
+
+    def test_with_neighbours_scheduled_only(self):
+        appointments = Appointment.objects.filter(
+            subject_identifier=self.subject_identifier
+        ).order_by("timepoint", "visit_code_sequence")
+        annotated = list(appointments.with_neighbours(include_interim=False))
+        self.assertEqual(len(annotated), appointments.filter(visit_code_sequence=0).count())
+        for appointment in annotated:
+            with self.subTest(appointment=appointment):
+                self.assert_neighbours(appointment, appointment.previous, appointment.next)
+
+    def test_with_neighbours_not_limited_to_filtered(self):
+        """Asserts neighbours are not limited to the appointments
+        selected by the queryset.
+        """
+        appointments = Appointment.objects.filter(
+            subject_identifier=self.subject_identifier, appt_status=NEW_APPT
+        ).order_by("timepoint", "visit_code_sequence")
+        annotated = list(appointments.with_neighbours())
+        self.assertEqual(annotated, list(appointments))
+        for appointment in annotated:
+            with self.subTest(appointment=appointment):
+                self.assert_neighbours(
+                    appointment, appointment.relative_previous, appointment.relative_next
+                )
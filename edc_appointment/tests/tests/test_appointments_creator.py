@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import datetime as dt
+from unittest.mock import patch
+from zoneinfo import ZoneInfo
+
+import time_machine
+from dateutil.relativedelta import relativedelta
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from edc_consent import site_consents
+from edc_facility.import_holidays import import_holidays
+from edc_protocol.research_protocol_config import ResearchProtocolConfig
+from edc_visit_schedule.constants import OFF_SCHEDULE
+from edc_visit_schedule.models import SubjectScheduleHistory
+from edc_visit_schedule.site_visit_schedules import site_visit_schedules
+
+from edc_appointment.appointment_deleter import bulk_delete
+from edc_appointment.constants import INCOMPLETE_APPT
+from edc_appointment.creators import AppointmentsCreator
+from edc_appointment.exceptions import AppointmentDatetimeError
+from edc_appointment.models import Appointment
+from edc_appointment_app.consents import consent_v1
+from edc_appointment_app.visit_schedule import get_visit_schedule1
+
+from ..helper import Helper
+
+utc_tz = ZoneInfo("UTC")
+
+test_datetime = dt.datetime(2019, 6, 11, 8, 00, tzinfo=utc_tz)
+
+
+@override_settings(SITE_ID=10)
+@time_machine.travel(test_datetime)
+class TestAppointmentsCreator(TestCase):
+    helper_cls = Helper
+
+    @classmethod
+    def setUpTestData(cls):
+        import_holidays()
+
+    def setUp(self):
+        site_consents.registry = {}
+        site_consents.register(consent_v1)
+        site_visit_schedules._registry = {}
+        self.visit_schedule = get_visit_schedule1()
+        site_visit_schedules.register(self.visit_schedule)
+        self.schedule = self.visit_schedule.schedules.get("schedule1")
+        self.now = ResearchProtocolConfig().study_open_datetime
+
+    def put_on_schedule(self, subject_identifier: str, bulk: bool) -> None:
+        helper = self.helper_cls(subject_identifier=subject_identifier, now=self.now)
+        with override_settings(EDC_APPOINTMENT_BULK_CREATE=bulk):
+            helper.consent_and_put_on_schedule(
+                visit_schedule_name=self.visit_schedule.name, schedule_name="schedule1"
+            )
+
+    @staticmethod
+    def get_values(subject_identifier: str) -> list[tuple]:
+        return list(
+            Appointment.objects.filter(subject_identifier=subject_identifier)
+            .order_by("timepoint", "visit_code_sequence")
+            .values_list(
+                "visit_code",
+                "visit_code_sequence",
+                "timepoint",
+                "timepoint_datetime",
+                "appt_datetime",
+                "appt_type",
+                "appt_reason",
+                "appt_status",
+                "facility_name",
+                "site_id",
+            )
+        )
+
+    def test_bulk_create_same_as_per_visit(self):
+        self.put_on_schedule("12345", bulk=False)
+        self.put_on_schedule("67890", bulk=True)
+        self.assertEqual(len(self.get_values("12345")), 4)
+        self.assertEqual(self.get_values("12345"), self.get_values("67890"))
+        # one history record per appointment created in bulk
+        for appointment in Appointment.objects.filter(subject_identifier="67890"):
+            self.assertTrue(
+                Appointment.history.filter(id=appointment.id, history_type="+").exists()
+            )
+
+    def test_bulk_create_same_fields_as_save(self):
+        self.maxDiff = None
+        """Assert an appointment created in bulk has the same field
+        values as one created through `save`, except those unique to
+        each row.
+        """
+        self.put_on_schedule("12345", bulk=False)
+        self.put_on_schedule("67890", bulk=True)
+        exclude = ["id", "subject_identifier", "created", "modified"]
+        fields = [
+            f.attname for f in Appointment._meta.concrete_fields if f.attname not in exclude
+        ]
+        for timepoint in [0, 1, 2, 3]:
+            with self.subTest(timepoint=timepoint):
+                self.assertEqual(
+                    Appointment.objects.filter(
+                        subject_identifier="67890", timepoint=timepoint
+                    ).values(*fields)[0],
+                    Appointment.objects.filter(
+                        subject_identifier="12345", timepoint=timepoint
+                    ).values(*fields)[0],
+                )
+
+    def test_bulk_create_validates_new_appointments(self):
+        with patch.object(
+            AppointmentsCreator,
+            "get_available_appt_datetime",
+            return_value=self.now + relativedelta(days=1),
+        ):
+            with self.assertRaises(AppointmentDatetimeError):
+                self.put_on_schedule("12345", bulk=True)
+        self.assertFalse(Appointment.objects.filter(subject_identifier="12345").exists())
+
+    def test_bulk_update_same_as_per_visit(self):
+        """Assert moving the base datetime updates NEW appointments
+        and respects `skip_baseline` as in the per visit path.
+        """
+        for subject_identifier, bulk in [("12345", False), ("67890", True)]:
+            self.put_on_schedule(subject_identifier, bulk=bulk)
+            appointment = Appointment.objects.get(
+                subject_identifier=subject_identifier, timepoint=0
+            )
+            AppointmentsCreator(
+                subject_identifier=subject_identifier,
+                visit_schedule=self.visit_schedule,
+                schedule=self.schedule,
+                report_datetime=appointment.appt_datetime,
+                appointment_model="edc_appointment.appointment",
+                site_id=appointment.site_id,
+                skip_baseline=True,
+                bulk=bulk,
+            ).create_appointments(appointment.appt_datetime + relativedelta(days=3))
+        values = self.get_values("67890")
+        self.assertEqual(values, self.get_values("12345"))
+        baseline = Appointment.objects.get(subject_identifier="67890", timepoint=0)
+        # baseline is skipped, the next visit moves to 7 days after the new base
+        self.assertEqual(values[0][3], baseline.timepoint_datetime)
+        self.assertEqual(
+            values[1][3],
+            appointment.appt_datetime + relativedelta(days=3) + relativedelta(days=7),
+        )
+
+    def test_bulk_create_fewer_queries(self):
+        self.put_on_schedule("12345", bulk=True)
+        appointment = Appointment.objects.get(subject_identifier="12345", timepoint=0)
+        opts = dict(
+            subject_identifier="12345",
+            visit_schedule=self.visit_schedule,
+            schedule=self.schedule,
+            report_datetime=appointment.appt_datetime,
+            appointment_model="edc_appointment.appointment",
+            site_id=appointment.site_id,
+            skip_baseline=True,
+        )
+        with CaptureQueriesContext(connection) as bulk_context:
+            AppointmentsCreator(**opts, bulk=True).create_appointments(
+                appointment.appt_datetime + relativedelta(days=1)
+            )
+        with CaptureQueriesContext(connection) as context:
+            AppointmentsCreator(**opts, bulk=False).create_appointments(
+                appointment.appt_datetime + relativedelta(days=2)
+            )
+        self.assertLess(len(bulk_context.captured_queries), len(context.captured_queries))
+
+    def test_retimepoint_same_as_create_appointments(self):
+        """Assert moving NEW appointments after baseline gives the same
+        datetimes as re-running `create_appointments`.
+        """
+        for subject_identifier in ["12345", "67890"]:
+            self.put_on_schedule(subject_identifier, bulk=False)
+            appointment = Appointment.objects.get(
+                subject_identifier=subject_identifier, timepoint=0
+            )
+            creator = AppointmentsCreator(
+                subject_identifier=subject_identifier,
+                visit_schedule=self.visit_schedule,
+                schedule=self.schedule,
+                report_datetime=appointment.appt_datetime,
+                appointment_model="edc_appointment.appointment",
+                site_id=appointment.site_id,
+                skip_baseline=True,
+            )
+            base_appt_datetime = appointment.appt_datetime + relativedelta(days=3)
+            if subject_identifier == "12345":
+                creator.create_appointments(base_appt_datetime)
+            else:
+                self.assertEqual(creator.retimepoint_appointments(base_appt_datetime), 3)
+        self.assertEqual(self.get_values("67890"), self.get_values("12345"))
+
+    def test_retimepoint_skips_appointments_not_new(self):
+        self.put_on_schedule("12345", bulk=False)
+        appointment = Appointment.objects.get(subject_identifier="12345", timepoint=1)
+        appointment.appt_status = INCOMPLETE_APPT
+        appointment.save_base(update_fields=["appt_status"])
+        values = self.get_values("12345")
+        baseline = Appointment.objects.get(subject_identifier="12345", timepoint=0)
+        AppointmentsCreator(
+            subject_identifier="12345",
+            visit_schedule=self.visit_schedule,
+            schedule=self.schedule,
+            report_datetime=baseline.appt_datetime,
+            appointment_model="edc_appointment.appointment",
+            site_id=baseline.site_id,
+            skip_baseline=True,
+        ).retimepoint_appointments(baseline.appt_datetime + relativedelta(days=3))
+        new_values = self.get_values("12345")
+        self.assertEqual(new_values[:2], values[:2])
+        self.assertNotEqual(new_values[2:], values[2:])
+
+    def get_retimepoint_creator(self, subject_identifier: str) -> AppointmentsCreator:
+        baseline = Appointment.objects.get(subject_identifier=subject_identifier, timepoint=0)
+        return AppointmentsCreator(
+            subject_identifier=subject_identifier,
+            visit_schedule=self.visit_schedule,
+            schedule=self.schedule,
+            report_datetime=baseline.appt_datetime,
+            appointment_model="edc_appointment.appointment",
+            site_id=baseline.site_id,
+            skip_baseline=True,
+        )
+
+    def test_retimepoint_only_if_on_schedule(self):
+        self.put_on_schedule("12345", bulk=False)
+        values = self.get_values("12345")
+        SubjectScheduleHistory.objects.filter(subject_identifier="12345").update(
+            schedule_status=OFF_SCHEDULE
+        )
+        creator = self.get_retimepoint_creator("12345")
+        self.assertEqual(
+            creator.retimepoint_appointments(values[0][4] + relativedelta(days=3)), 0
+        )
+        self.assertEqual(self.get_values("12345"), values)
+
+    def test_retimepoint_creates_missing_appointments(self):
+        """Assert falls back to `create_appointments` if the visits
+        are not those of the scheduled appointments.
+        """
+        for subject_identifier in ["12345", "67890"]:
+            self.put_on_schedule(subject_identifier, bulk=False)
+            creator = self.get_retimepoint_creator(subject_identifier)
+            base_appt_datetime = creator.report_datetime + relativedelta(days=3)
+            if subject_identifier == "12345":
+                creator.create_appointments(base_appt_datetime)
+            else:
+                with bulk_delete():
+                    Appointment.objects.get(
+                        subject_identifier=subject_identifier, timepoint=3
+                    ).delete()
+                self.assertIsNone(creator.retimepoint_appointments(base_appt_datetime))
+        self.assertEqual(len(self.get_values("67890")), 4)
+        self.assertEqual(self.get_values("67890"), self.get_values("12345"))
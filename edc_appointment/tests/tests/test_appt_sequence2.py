@@ -8,7 +8,7 @@ from dateutil.relativedelta import relativedelta
 from django.test import TestCase, override_settings
 from edc_consent import site_consents
 from edc_facility.import_holidays import import_holidays
-from edc_metadata.models import CrfMetadata
+from edc_metadata.models import CrfMetadata, RequisitionMetadata
 from edc_protocol.research_protocol_config import ResearchProtocolConfig
 from edc_utils import get_utcnow
 from edc_visit_schedule.site_visit_schedules import site_visit_schedules
@@ -22,7 +22,7 @@ from edc_appointment_app.tests.appointment_app_test_case_mixin import (
 from edc_appointment_app.visit_schedule import get_visit_schedule1
 
 from ...creators import UnscheduledAppointmentCreator
-from ...utils import reset_visit_code_sequence_or_pass
+from ...utils import bulk_update_visit_code_sequences, reset_visit_code_sequence_or_pass
 from ..helper import Helper
 
 utc_tz = ZoneInfo("UTC")
@@ -260,3 +260,82 @@ class TestMoveAppointment(AppointmentAppTestCaseMixin, TestCase):
         self.assertEqual(
             CrfMetadata.objects.filter(visit_code="1000", visit_code_sequence=3).count(), 3
         )
+
+    def test_repair_visit_code_sequences_creates_missing_requisition_metadata(self):
+        appointment = Appointment.objects.get(visit_code="1000", visit_code_sequence=0)
+        appt1 = self.create_unscheduled(appointment, days=2)
+        self.create_related_visit(appt1)
+        appt2 = self.create_unscheduled(appointment, days=4)
+        self.create_related_visit(appt2)
+        opts = dict(visit_code="1000", visit_code_sequence=2)
+        self.assertGreater(RequisitionMetadata.objects.filter(**opts).count(), 0)
+        requisition_count = RequisitionMetadata.objects.filter(**opts).count()
+
+        appt2.visit_code_sequence = 33
+        appt2.save_base(update_fields=["visit_code_sequence"])
+        appt2.related_visit.visit_code_sequence = 33
+        appt2.related_visit.save_base(update_fields=["visit_code_sequence"])
+        CrfMetadata.objects.filter(**opts).update(visit_code_sequence=33)
+        RequisitionMetadata.objects.filter(**opts).delete()
+
+        reset_visit_code_sequence_or_pass(
+            subject_identifier=self.subject_identifier,
+            visit_schedule_name=self.visit_schedule.name,
+            schedule_name="schedule1",
+            visit_code="1000",
+        )
+        self.assertEqual(CrfMetadata.objects.filter(**opts).count(), 3)
+        self.assertEqual(RequisitionMetadata.objects.filter(**opts).count(), requisition_count)
+
+    def test_repair_visit_code_sequences_updates_related_visit_and_history(self):
+        appointment = Appointment.objects.get(visit_code="1000", visit_code_sequence=0)
+        appts = []
+        for days in [2, 4, 5]:
+            appt = self.create_unscheduled(appointment, days=days)
+            self.create_related_visit(appt)
+            appts.append(appt)
+        for appt, visit_code_sequence in zip(appts, [11, 7, 5]):
+            appt.visit_code_sequence = visit_code_sequence
+            appt.save_base(update_fields=["visit_code_sequence"])
+            appt.related_visit.visit_code_sequence = visit_code_sequence
+            appt.related_visit.save_base(update_fields=["visit_code_sequence"])
+
+        reset_visit_code_sequence_or_pass(
+            subject_identifier=self.subject_identifier,
+            visit_schedule_name=self.visit_schedule.name,
+            schedule_name="schedule1",
+            visit_code="1000",
+        )
+
+        for appt, visit_code_sequence in zip(appts, [1, 2, 3]):
+            appt.refresh_from_db()
+            self.assertEqual(appt.visit_code_sequence, visit_code_sequence)
+            self.assertEqual(appt.related_visit.visit_code_sequence, visit_code_sequence)
+            self.assertEqual(
+                appt.history.order_by("history_date").last().visit_code_sequence,
+                visit_code_sequence,
+            )
+
+    def test_bulk_update_visit_code_sequences_history_by_sequence(self):
+        appointment = Appointment.objects.get(visit_code="1000", visit_code_sequence=0)
+        appts = [self.create_unscheduled(appointment, days=days) for days in [2, 4, 5]]
+        for appt, visit_code_sequence in zip(appts, [11, 7, 5]):
+            appt.visit_code_sequence = visit_code_sequence
+            appt.save_base(update_fields=["visit_code_sequence"])
+        history_count = Appointment.history.count()
+
+        # `lookup` is the field being updated
+        bulk_update_visit_code_sequences(
+            Appointment.objects.filter(visit_code="1000"),
+            "visit_code_sequence",
+            {11: 1, 7: 2, 5: 3},
+        )
+
+        self.assertEqual(Appointment.history.count(), history_count + 3)
+        for appt, visit_code_sequence in zip(appts, [1, 2, 3]):
+            appt.refresh_from_db()
+            self.assertEqual(appt.visit_code_sequence, visit_code_sequence)
+            self.assertEqual(
+                appt.history.order_by("history_date").last().visit_code_sequence,
+                visit_code_sequence,
+            )
@@ -1,4 +1,5 @@
 import datetime as dt
+from unittest.mock import call, patch
 from zoneinfo import ZoneInfo
 
 import time_machine
@@ -10,9 +11,19 @@ from edc_protocol.research_protocol_config import ResearchProtocolConfig
 from edc_visit_schedule.site_visit_schedules import site_visit_schedules
 from edc_visit_tracking.constants import SCHEDULED
 
-from edc_appointment.appointment_status_updater import AppointmentStatusUpdater
-from edc_appointment.constants import IN_PROGRESS_APPT, INCOMPLETE_APPT, NEW_APPT
+from edc_appointment.appointment_status_updater import (
+    AppointmentStatusUpdater,
+    BulkAppointmentStatusUpdater,
+)
+from edc_appointment.constants import (
+    COMPLETE_APPT,
+    IN_PROGRESS_APPT,
+    INCOMPLETE_APPT,
+    NEW_APPT,
+)
 from edc_appointment.models import Appointment
+from edc_appointment.subject_lock import subject_lock
+from edc_appointment.utils import update_appt_status
 from edc_appointment_app.consents import consent_v1
 from edc_appointment_app.models import SubjectVisit
 from edc_appointment_app.visit_schedule import get_visit_schedule1, get_visit_schedule2
@@ -285,3 +296,88 @@ class TestAppointmentStatus(TestCase):
         self.assertEqual(appointment_1.appt_status, IN_PROGRESS_APPT)
         self.assertEqual(appointment_2.appt_status, NEW_APPT)
         self.assertEqual(appointment_3.appt_status, NEW_APPT)
+
+    def test_bulk_appt_status_updater(self):
+        appointments = Appointment.objects.filter(
+            subject_identifier=self.subject_identifier
+        ).order_by("timepoint")
+        appointment_baseline = appointments[0]
+        appointment_1 = appointments[1]
+        SubjectVisit.objects.create(
+            appointment=appointment_baseline,
+            report_datetime=appointment_baseline.appt_datetime,
+            reason=SCHEDULED,
+        )
+        # set to values inconsistent with visit/metadata
+        Appointment.objects.filter(id=appointment_baseline.id).update(
+            appt_status=COMPLETE_APPT
+        )
+        Appointment.objects.filter(id=appointment_1.id).update(appt_status=INCOMPLETE_APPT)
+
+        transitions = BulkAppointmentStatusUpdater(appointments, dry_run=True).update()
+        self.assertEqual(
+            dict(transitions),
+            {(COMPLETE_APPT, INCOMPLETE_APPT): 1, (INCOMPLETE_APPT, NEW_APPT): 1},
+        )
+        appointment_baseline.refresh_from_db()
+        self.assertEqual(appointment_baseline.appt_status, COMPLETE_APPT)
+
+        transitions = BulkAppointmentStatusUpdater(appointments).update()
+        self.assertEqual(
+            dict(transitions),
+            {(COMPLETE_APPT, INCOMPLETE_APPT): 1, (INCOMPLETE_APPT, NEW_APPT): 1},
+        )
+        for appointment in appointments:
+            expected = update_appt_status(appointment).appt_status
+            appointment.refresh_from_db()
+            self.assertEqual(appointment.appt_status, expected)
+        self.assertEqual(BulkAppointmentStatusUpdater(appointments).update(), {})
+
+    def test_clear_others_in_progress_for_subject_only(self):
+        helper = self.helper_cls(
+            subject_identifier="67890",
+            now=ResearchProtocolConfig().study_open_datetime,
+        )
+        helper.consent_and_put_on_schedule(
+            visit_schedule_name=self.visit_schedule1.name, schedule_name="schedule1"
+        )
+        appointments = Appointment.objects.filter(
+            subject_identifier=self.subject_identifier
+        ).order_by("timepoint")
+        appointment_baseline = appointments[0]
+        appointment_1 = appointments[1]
+        other_appointment = Appointment.objects.filter(subject_identifier="67890").order_by(
+            "timepoint"
+        )[0]
+        Appointment.objects.filter(
+            id__in=[appointment_baseline.id, appointment_1.id, other_appointment.id]
+        ).update(appt_status=IN_PROGRESS_APPT)
+
+        updater = AppointmentStatusUpdater(
+            appointment_baseline, clear_others_for_subject_only=True
+        )
+        transitions = updater.clear_others_in_progress()
+        self.assertEqual(dict(transitions), {(IN_PROGRESS_APPT, NEW_APPT): 1})
+        appointment_1.refresh_from_db()
+        other_appointment.refresh_from_db()
+        self.assertEqual(appointment_1.appt_status, NEW_APPT)
+        self.assertEqual(other_appointment.appt_status, IN_PROGRESS_APPT)
+        self.assertEqual(appointment_1.history.first().appt_status, NEW_APPT)
+
+        AppointmentStatusUpdater(appointment_baseline, clear_others_in_progress=True)
+        other_appointment.refresh_from_db()
+        self.assertEqual(other_appointment.appt_status, IN_PROGRESS_APPT)
+
+        with patch(
+            "edc_appointment.appointment_status_updater.subject_lock", wraps=subject_lock
+        ) as mock_subject_lock:
+            AppointmentStatusUpdater(
+                appointment_baseline,
+                clear_others_in_progress=True,
+                clear_others_for_subject_only=False,
+            )
+        self.assertIn(call("67890"), mock_subject_lock.call_args_list)
+        other_appointment.refresh_from_db()
+        appointment_baseline.refresh_from_db()
+        self.assertEqual(other_appointment.appt_status, NEW_APPT)
+        self.assertEqual(appointment_baseline.appt_status, IN_PROGRESS_APPT)
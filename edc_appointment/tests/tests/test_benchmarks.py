@@ -0,0 +1,260 @@
+import os
+from datetime import datetime
+from unittest import skipUnless
+from zoneinfo import ZoneInfo
+
+import time_machine
+from dateutil.relativedelta import relativedelta
+from django.forms import ValidationError
+from django.test import TestCase, override_settings, tag
+from edc_consent.site_consents import site_consents
+from edc_facility.import_holidays import import_holidays
+from edc_protocol.research_protocol_config import ResearchProtocolConfig
+from edc_visit_schedule.schedule import Schedule
+from edc_visit_schedule.site_visit_schedules import site_visit_schedules
+from edc_visit_schedule.visit import Visit
+from edc_visit_schedule.visit_schedule import VisitSchedule
+
+from edc_appointment.constants import IN_PROGRESS_APPT, INCOMPLETE_APPT
+from edc_appointment.creators import AppointmentsCreator
+from edc_appointment.form_validators import AppointmentFormValidator
+from edc_appointment.models import Appointment
+from edc_appointment.skip_appointments import SkipAppointments
+from edc_appointment.utils import (
+    get_appointment_by_datetime,
+    reset_visit_code_sequence_or_pass,
+)
+from edc_appointment_app.consents import consent_v1
+from edc_appointment_app.models import CrfOne
+from edc_appointment_app.tests.appointment_app_test_case_mixin import (
+    AppointmentAppTestCaseMixin,
+)
+from edc_appointment_app.visit_schedule.crfs import (
+    crfs,
+    crfs_missed,
+    crfs_unscheduled,
+    requisitions,
+)
+
+from ..benchmark import Benchmark
+from ..helper import Helper
+
+utc_tz = ZoneInfo("UTC")
+
+
+def get_params(name: str, default: str) -> list[int]:
+    return [int(x) for x in os.environ.get(name, default).split(",") if x.strip()]
+
+
+SUBJECT_COUNTS = get_params("EDC_APPOINTMENT_BENCHMARK_SUBJECTS", "1,10")
+SCHEDULE_LENGTHS = get_params("EDC_APPOINTMENT_BENCHMARK_VISITS", "4,24")
+
+
+def get_visit_schedule(num_visits: int) -> VisitSchedule:
+    """Returns `visit_schedule1` with `num_visits` weekly visits."""
+    visit_schedule = VisitSchedule(
+        name="visit_schedule1",
+        offstudy_model="edc_appointment_app.subjectoffstudy",
+        death_report_model="edc_appointment_app.deathreport",
+    )
+    schedule = Schedule(
+        name="schedule1",
+        onschedule_model="edc_appointment_app.onscheduleone",
+        offschedule_model="edc_appointment_app.offscheduleone",
+        appointment_model="edc_appointment.appointment",
+        consent_definitions=[consent_v1],
+    )
+    for index in range(0, num_visits):
+        schedule.add_visit(
+            Visit(
+                code=f"{index + 1}000",
+                title=f"Week {index}",
+                timepoint=index,
+                rbase=relativedelta(days=7 * index),
+                rlower=relativedelta(days=0),
+                rupper=relativedelta(days=6),
+                requisitions=requisitions,
+                crfs=crfs,
+                crfs_missed=crfs_missed,
+                requisitions_unscheduled=requisitions,
+                crfs_unscheduled=crfs_unscheduled,
+                allow_unscheduled=True,
+                facility_name="5-day-clinic",
+            )
+        )
+    visit_schedule.add_schedule(schedule)
+    return visit_schedule
+
+
+@tag("benchmark")
+@skipUnless(
+    os.environ.get("EDC_APPOINTMENT_BENCHMARK"),
+    "Set EDC_APPOINTMENT_BENCHMARK=1 to run benchmarks",
+)
+@override_settings(SITE_ID=10)
+@time_machine.travel(datetime(2019, 6, 11, 8, 00, tzinfo=utc_tz))
+class TestBenchmarks(TestCase):
+    """Times the appointment hot paths for each combination of
+    subject count and schedule length.
+
+    For example:
+
+        EDC_APPOINTMENT_BENCHMARK=1 python runtests.py --tag=benchmark
+
+    See `Benchmark` for saving a baseline and setting the threshold.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        import_holidays()
+
+    def setUp(self):
+        self.benchmark = Benchmark()
+        # restore the registries replaced in `put_on_schedule`
+        self.addCleanup(
+            setattr, site_visit_schedules, "_registry", site_visit_schedules._registry
+        )
+        self.addCleanup(setattr, site_consents, "registry", site_consents.registry)
+
+    def tearDown(self):
+        if self.benchmark.save_baseline:
+            self.benchmark.save()
+        else:
+            regressions = self.benchmark.regressions()
+            self.assertFalse(regressions, "\n".join(regressions))
+
+    def put_on_schedule(self, num_subjects: int, num_visits: int) -> list[str]:
+        """Registers a schedule of `num_visits` and puts `num_subjects`
+        on it. Returns the subject identifiers.
+        """
+        visit_schedule = get_visit_schedule(num_visits)
+        site_visit_schedules._registry = {}
+        site_visit_schedules.register(visit_schedule)
+        site_consents.registry = {}
+        site_consents.register(consent_v1)
+        subject_identifiers = []
+        for index in range(0, num_subjects):
+            helper = Helper(
+                subject_identifier=f"{num_subjects}-{num_visits}-{index}",
+                now=ResearchProtocolConfig().study_open_datetime,
+            )
+            with self.benchmark.measure(f"put_on_schedule.{num_subjects}.{num_visits}"):
+                helper.consent_and_put_on_schedule(
+                    visit_schedule_name=visit_schedule.name, schedule_name="schedule1"
+                )
+            subject_identifiers.append(helper.subject_identifier)
+        return subject_identifiers
+
+    def params(self):
+        for num_subjects in SUBJECT_COUNTS:
+            for num_visits in SCHEDULE_LENGTHS:
+                with self.subTest(num_subjects=num_subjects, num_visits=num_visits):
+                    yield num_subjects, num_visits
+
+    def test_appointments_creator(self):
+        for num_subjects, num_visits in self.params():
+            subject_identifiers = self.put_on_schedule(num_subjects, num_visits)
+            visit_schedule = site_visit_schedules.get_visit_schedule("visit_schedule1")
+            schedule = visit_schedule.schedules.get("schedule1")
+            for subject_identifier in subject_identifiers:
+                first = Appointment.objects.filter(
+                    subject_identifier=subject_identifier
+                ).order_by("timepoint")[0]
+                creator = AppointmentsCreator(
+                    subject_identifier=subject_identifier,
+                    visit_schedule=visit_schedule,
+                    schedule=schedule,
+                    report_datetime=first.appt_datetime,
+                    appointment_model="edc_appointment.appointment",
+                    site_id=first.site_id,
+                )
+                with self.benchmark.measure(
+                    f"refresh_appointments.{num_subjects}.{num_visits}"
+                ):
+                    creator.create_appointments(base_appt_datetime=first.appt_datetime)
+
+    def test_unscheduled_and_reset(self):
+        for num_subjects, num_visits in self.params():
+            for subject_identifier in self.put_on_schedule(num_subjects, num_visits):
+                appointment = Appointment.objects.get(
+                    subject_identifier=subject_identifier, timepoint=0
+                )
+                AppointmentAppTestCaseMixin.create_related_visit(appointment)
+                for _ in range(0, 3):
+                    with self.benchmark.measure(
+                        f"unscheduled_appointment_creator.{num_subjects}.{num_visits}"
+                    ):
+                        appointment = Helper.add_unscheduled_appointment(appointment)
+                    appointment.appt_status = INCOMPLETE_APPT
+                    appointment.save_base(update_fields=["appt_status"])
+                with self.benchmark.measure(
+                    f"reset_visit_code_sequence.{num_subjects}.{num_visits}"
+                ):
+                    reset_visit_code_sequence_or_pass(
+                        subject_identifier=subject_identifier,
+                        visit_schedule_name=appointment.visit_schedule_name,
+                        schedule_name=appointment.schedule_name,
+                        visit_code=appointment.visit_code,
+                    )
+
+    def test_get_appointment_by_datetime(self):
+        for num_subjects, num_visits in self.params():
+            for subject_identifier in self.put_on_schedule(num_subjects, num_visits):
+                for appointment in Appointment.objects.filter(
+                    subject_identifier=subject_identifier
+                ):
+                    with self.benchmark.measure(
+                        f"get_appointment_by_datetime.{num_subjects}.{num_visits}"
+                    ):
+                        get_appointment_by_datetime(
+                            appointment.appt_datetime,
+                            subject_identifier,
+                            appointment.visit_schedule_name,
+                            appointment.schedule_name,
+                        )
+
+    def test_skip_appointments(self):
+        for num_subjects, num_visits in self.params():
+            for subject_identifier in self.put_on_schedule(num_subjects, num_visits):
+                appointments = Appointment.objects.filter(
+                    subject_identifier=subject_identifier
+                ).order_by("timepoint")
+                appointment = appointments[0]
+                related_visit = AppointmentAppTestCaseMixin.create_related_visit(appointment)
+                last_appointment = appointments.last()
+                crf_obj = CrfOne.objects.create(
+                    subject_visit=related_visit,
+                    next_appt_date=last_appointment.appt_datetime.date(),
+                    next_visit_code=last_appointment.visit_code,
+                )
+                with override_settings(
+                    EDC_APPOINTMENT_ALLOW_SKIPPED_APPT_USING={
+                        "edc_appointment_app.crfone": ("next_appt_date", "next_visit_code")
+                    }
+                ):
+                    with self.benchmark.measure(
+                        f"skip_appointments.{num_subjects}.{num_visits}"
+                    ):
+                        SkipAppointments(crf_obj).update()
+
+    def test_appointment_form_validator(self):
+        for num_subjects, num_visits in self.params():
+            for subject_identifier in self.put_on_schedule(num_subjects, num_visits):
+                for appointment in Appointment.objects.filter(
+                    subject_identifier=subject_identifier
+                ).order_by("timepoint"):
+                    cleaned_data = {
+                        field.name: getattr(appointment, field.name)
+                        for field in Appointment._meta.concrete_fields
+                    }
+                    cleaned_data.update(appt_status=IN_PROGRESS_APPT)
+                    form_validator = AppointmentFormValidator(
+                        cleaned_data=cleaned_data, instance=appointment, model=Appointment
+                    )
+                    with self.benchmark.measure(
+                        f"appointment_form_validator.{num_subjects}.{num_visits}"
+                    ):
+                        try:
+                            form_validator.validate()
+                        except ValidationError:
+                            pass
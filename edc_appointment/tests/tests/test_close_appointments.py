@@ -0,0 +1,121 @@
+import datetime as dt
+from io import StringIO
+from zoneinfo import ZoneInfo
+
+import time_machine
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from edc_consent.site_consents import site_consents
+from edc_facility.import_holidays import import_holidays
+from edc_protocol.research_protocol_config import ResearchProtocolConfig
+from edc_visit_schedule.site_visit_schedules import site_visit_schedules
+from edc_visit_tracking.constants import SCHEDULED
+
+from edc_appointment.constants import COMPLETE_APPT, INCOMPLETE_APPT, NEW_APPT
+from edc_appointment.management.commands.close_appointments import close_appointments
+from edc_appointment.models import Appointment
+from edc_appointment_app.consents import consent_v1
+from edc_appointment_app.models import SubjectVisit
+from edc_appointment_app.visit_schedule import get_visit_schedule1
+
+from ..helper import Helper
+
+utc_tz = ZoneInfo("UTC")
+
+
+@override_settings(SITE_ID=10)
+@time_machine.travel(dt.datetime(2019, 6, 11, 8, 00, tzinfo=utc_tz))
+class TestCloseAppointments(TestCase):
+    helper_cls = Helper
+
+    @classmethod
+    def setUpTestData(cls):
+        import_holidays()
+
+    def setUp(self):
+        site_visit_schedules._registry = {}
+        self.visit_schedule1 = get_visit_schedule1()
+        site_visit_schedules.register(self.visit_schedule1)
+        site_consents.registry = {}
+        site_consents.register(consent_v1)
+        self.helper_cls(
+            subject_identifier="12345",
+            now=ResearchProtocolConfig().study_open_datetime,
+        ).consent_and_put_on_schedule(
+            visit_schedule_name=self.visit_schedule1.name, schedule_name="schedule1"
+        )
+        appointments = Appointment.objects.filter(subject_identifier="12345").order_by(
+            "timepoint"
+        )
+        self.appointment_baseline = appointments[0]
+        self.appointment_1 = appointments[1]
+        SubjectVisit.objects.create(
+            appointment=self.appointment_baseline,
+            report_datetime=self.appointment_baseline.appt_datetime,
+            reason=SCHEDULED,
+        )
+        # COMPLETE with REQUIRED metadata -> INCOMPLETE
+        Appointment.objects.filter(id=self.appointment_baseline.id).update(
+            appt_status=COMPLETE_APPT
+        )
+        # INCOMPLETE without a related visit is ambiguous
+        Appointment.objects.filter(id=self.appointment_1.id).update(
+            appt_status=INCOMPLETE_APPT
+        )
+
+    def get_appt_statuses(self) -> list[str]:
+        return [
+            Appointment.objects.get(id=self.appointment_baseline.id).appt_status,
+            Appointment.objects.get(id=self.appointment_1.id).appt_status,
+        ]
+
+    def test_bulk_transitions_and_ambiguous_skipped(self):
+        transitions, ambiguous = close_appointments()
+        self.assertEqual(dict(transitions), {(COMPLETE_APPT, INCOMPLETE_APPT): 1})
+        # not moved to NEW or COMPLETE, reported instead
+        self.assertEqual(
+            {obj.id: appt_status for obj, appt_status in ambiguous.items()},
+            {self.appointment_1.id: NEW_APPT},
+        )
+        self.assertEqual(self.get_appt_statuses(), [INCOMPLETE_APPT, INCOMPLETE_APPT])
+        self.assertEqual(
+            self.appointment_baseline.history.filter(appt_status=INCOMPLETE_APPT).count(), 1
+        )
+
+    def test_dry_run(self):
+        stdout = StringIO()
+        call_command("close_appointments", "--dry-run", stdout=stdout)
+        self.assertIn(f"{COMPLETE_APPT} -> {INCOMPLETE_APPT}: 1", stdout.getvalue())
+        self.assertIn("Would update 1 appointments", stdout.getvalue())
+        self.assertIn("Skipped 1 ambiguous appointments", stdout.getvalue())
+        self.assertEqual(self.get_appt_statuses(), [COMPLETE_APPT, INCOMPLETE_APPT])
+
+    def test_command(self):
+        stdout = StringIO()
+        call_command("close_appointments", stdout=stdout)
+        self.assertIn("Updated 1 appointments", stdout.getvalue())
+        self.assertIn(
+            f"12345 {self.appointment_1.visit_code}.0 {INCOMPLETE_APPT} (computed {NEW_APPT})",
+            stdout.getvalue(),
+        )
+        self.assertEqual(self.get_appt_statuses(), [INCOMPLETE_APPT, INCOMPLETE_APPT])
+
+    def test_site(self):
+        call_command("close_appointments", "--site", "20", stdout=StringIO())
+        self.assertEqual(self.get_appt_statuses(), [COMPLETE_APPT, INCOMPLETE_APPT])
+        call_command("close_appointments", "--site", "10,20", stdout=StringIO())
+        self.assertEqual(self.get_appt_statuses(), [INCOMPLETE_APPT, INCOMPLETE_APPT])
+
+    def test_since(self):
+        call_command("close_appointments", "--since", "2019-06-12", stdout=StringIO())
+        self.assertEqual(self.get_appt_statuses(), [COMPLETE_APPT, INCOMPLETE_APPT])
+        call_command("close_appointments", "--since", "2019-06-11", stdout=StringIO())
+        self.assertEqual(self.get_appt_statuses(), [INCOMPLETE_APPT, INCOMPLETE_APPT])
+        with self.assertRaises(CommandError):
+            call_command("close_appointments", "--since", "11/06/2019", stdout=StringIO())
+
+    def test_new_appointments_not_selected(self):
+        Appointment.objects.filter(id=self.appointment_1.id).update(appt_status=NEW_APPT)
+        transitions, ambiguous = close_appointments()
+        self.assertEqual(ambiguous, {})
+        self.assertEqual(dict(transitions), {(COMPLETE_APPT, INCOMPLETE_APPT): 1})
@@ -11,6 +11,7 @@ from edc_protocol.research_protocol_config import ResearchProtocolConfig
 from edc_visit_schedule.site_visit_schedules import site_visit_schedules
 from edc_visit_tracking.constants import SCHEDULED
 
+from edc_appointment.appointment_deleter import AppointmentDeleter
 from edc_appointment.constants import INCOMPLETE_APPT
 from edc_appointment.creators import UnscheduledAppointmentCreator
 from edc_appointment.managers import AppointmentDeleteError
@@ -182,3 +183,46 @@ class TestDeleteAppointment(TestCase):
                 )
             ],
         )
+
+    def test_appointment_deleter_stops_at_first_protected(self):
+        appointments = Appointment.objects.filter(
+            subject_identifier=self.subject_identifier
+        ).order_by("-timepoint", "-visit_code_sequence")
+        # 1000.3, 1000.2 and 1000.1 are deleted, stops at 1000.0 (has a
+        # visit). The scheduled appointments are skipped since the
+        # subject is on schedule.
+        deleted = AppointmentDeleter(appointments).delete(stop_if_protected=True)
+        self.assertEqual(deleted, 3)
+        self.assertEqual(
+            [("1000", 0), ("2000", 0), ("3000", 0), ("4000", 0)],
+            [
+                (o.visit_code, o.visit_code_sequence)
+                for o in Appointment.objects.all().order_by("timepoint")
+            ],
+        )
+
+    def test_appointment_deleter_raises_before_deleting(self):
+        appointments = Appointment.objects.filter(
+            subject_identifier=self.subject_identifier
+        ).order_by("-timepoint", "-visit_code_sequence")
+        self.assertRaises(
+            AppointmentDeleteError,
+            AppointmentDeleter(appointments).delete,
+            raise_if_not_deletable=True,
+        )
+        self.assertEqual(Appointment.objects.all().count(), 7)
+
+    def test_appointment_deleter_resets_sequence(self):
+        appointments = Appointment.objects.filter(
+            visit_code="1000", visit_code_sequence__in=[1, 2]
+        )
+        self.assertEqual(AppointmentDeleter(appointments).delete(), 2)
+        self.assertEqual(
+            [0, 1],
+            [
+                o.visit_code_sequence
+                for o in Appointment.objects.filter(visit_code="1000").order_by(
+                    "appt_datetime"
+                )
+            ],
+        )
@@ -0,0 +1,165 @@
+import json
+from datetime import datetime
+from importlib.util import find_spec
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import skipUnless
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+import time_machine
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from edc_consent.site_consents import site_consents
+from edc_facility.import_holidays import import_holidays
+from edc_visit_schedule.site_visit_schedules import site_visit_schedules
+
+from edc_appointment.analytics.export_appointment_dataset import (
+    WATERMARK_FILENAME,
+    compact_appointment_dataset,
+    export_appointment_dataset,
+)
+from edc_appointment.models import Appointment
+from edc_appointment_app.consents import consent_v1
+from edc_appointment_app.visit_schedule import get_visit_schedule1
+
+from ..helper import Helper
+
+utc_tz = ZoneInfo("UTC")
+
+
+@skipUnless(find_spec("pyarrow"), "pyarrow is not installed")
+@override_settings(SITE_ID=10)
+@time_machine.travel(datetime(2019, 6, 11, 8, 00, tzinfo=utc_tz))
+class TestExportAppointmentDataset(TestCase):
+    helper_cls = Helper
+
+    @classmethod
+    def setUpTestData(cls):
+        import_holidays()
+
+    def setUp(self):
+        site_visit_schedules._registry = {}
+        self.visit_schedule1 = get_visit_schedule1()
+        site_visit_schedules.register(visit_schedule=self.visit_schedule1)
+        site_consents.registry = {}
+        site_consents.register(consent_v1)
+        for subject_identifier in ["12345", "67890"]:
+            self.helper_cls(
+                subject_identifier=subject_identifier,
+                now=datetime(2017, 1, 7, tzinfo=utc_tz),
+            ).consent_and_put_on_schedule(
+                visit_schedule_name=self.visit_schedule1.name, schedule_name="schedule1"
+            )
+        Appointment.objects.filter(subject_identifier="67890").update(site_id=20)
+
+    @staticmethod
+    def read(path: Path):
+        import pyarrow.parquet as pq
+
+        return pq.read_table(path).to_pandas()
+
+    @staticmethod
+    def parts(path: Path, site_id: int) -> list[Path]:
+        return sorted(path.glob(f"site_id={site_id}/**/*.parquet"))
+
+    def test_full_incremental_compact(self):
+        with TemporaryDirectory() as folder:
+            path = Path(folder)
+            self.assertEqual(export_appointment_dataset(path), Appointment.objects.count())
+            self.assertEqual(
+                set(json.loads((path / WATERMARK_FILENAME).read_text())), {"10", "20"}
+            )
+            self.assertEqual(len(self.parts(path, 10)), 1)
+            self.assertEqual(len(self.parts(path, 20)), 1)
+
+            # nothing modified since the last export
+            self.assertEqual(export_appointment_dataset(path, incremental=True), 0)
+
+            # only the modified subject is written, as new part files
+            with time_machine.travel(datetime(2019, 6, 12, 8, 00, tzinfo=utc_tz)):
+                appointment = Appointment.objects.filter(subject_identifier="12345").first()
+                appointment.comment = "modified"
+                appointment.save()
+            self.assertEqual(
+                export_appointment_dataset(path, incremental=True),
+                Appointment.objects.filter(subject_identifier="12345").count(),
+            )
+            self.assertEqual(len(self.parts(path, 10)), 2)
+            self.assertEqual(len(self.parts(path, 20)), 1)
+
+            self.assertEqual(compact_appointment_dataset(path), 1)
+            self.assertEqual(len(self.parts(path, 10)), 1)
+            df = self.read(path)
+            self.assertEqual(len(df), Appointment.objects.count())
+            self.assertEqual(
+                df[df["appointment_id"] == str(appointment.id)]["comment"].tolist(),
+                ["modified"],
+            )
+
+    def test_full_export_by_site_keeps_other_sites(self):
+        with TemporaryDirectory() as folder:
+            path = Path(folder)
+            export_appointment_dataset(path)
+            parts = self.parts(path, 20)
+            self.assertEqual(
+                export_appointment_dataset(path, site_id=10),
+                Appointment.objects.filter(site_id=10).count(),
+            )
+            self.assertEqual(self.parts(path, 20), parts)
+            self.assertEqual(len(self.parts(path, 10)), 1)
+            self.assertEqual(len(self.read(path)), Appointment.objects.count())
+
+    def test_incremental_watermark_by_site(self):
+        with TemporaryDirectory() as folder:
+            path = Path(folder)
+            export_appointment_dataset(path, site_id=10)
+            self.assertEqual(list(json.loads((path / WATERMARK_FILENAME).read_text())), ["10"])
+            # site 20 was never exported, so all of its appointments are written
+            self.assertEqual(
+                export_appointment_dataset(path, incremental=True),
+                Appointment.objects.filter(site_id=20).count(),
+            )
+
+    def test_command(self):
+        with TemporaryDirectory() as folder:
+            stdout = StringIO()
+            call_command("export_appointment_dataset", folder, "--compact", stdout=stdout)
+            call_command("export_appointment_dataset", folder, "--incremental", stdout=stdout)
+            self.assertIn("Exported 0 appointments", stdout.getvalue())
+            self.assertEqual(len(self.read(Path(folder))), Appointment.objects.count())
+
+    def test_compact_parts_with_different_category_counts(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        with TemporaryDirectory() as folder:
+            path = Path(folder)
+            export_appointment_dataset(path)
+            self.assertFalse(
+                any(
+                    pa.types.is_dictionary(field.type)
+                    for field in pq.read_schema(self.parts(path, 10)[0])
+                )
+            )
+            # part files with categoricals of int16 and int8 indices
+            partition = self.parts(path, 10)[0].parent
+            for index, subject_identifiers in enumerate(
+                [[str(i) for i in range(200)], ["12345"]]
+            ):
+                df = pd.DataFrame(
+                    {
+                        "appointment_id": [f"{index}-{i}" for i in subject_identifiers],
+                        "subject_identifier": pd.Categorical(subject_identifiers),
+                    }
+                )
+                pq.write_table(
+                    pa.Table.from_pandas(df, preserve_index=False),
+                    partition / f"part-{index}.parquet",
+                )
+            self.assertEqual(compact_appointment_dataset(path), 1)
+            self.assertEqual(
+                len(self.read(self.parts(path, 10)[0])),
+                Appointment.objects.filter(site_id=10).count() + 201,
+            )
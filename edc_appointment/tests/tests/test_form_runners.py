@@ -0,0 +1,81 @@
+import csv
+import json
+from datetime import datetime
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from zoneinfo import ZoneInfo
+
+import time_machine
+from django.test import TestCase, override_settings
+from edc_consent.site_consents import site_consents
+from edc_facility.import_holidays import import_holidays
+from edc_visit_schedule.site_visit_schedules import site_visit_schedules
+
+from edc_appointment.form_runners import (
+    ISSUE_FIELDS,
+    AppointmentFormRunner,
+    IssueWriter,
+)
+from edc_appointment.models import Appointment
+from edc_appointment_app.consents import consent_v1
+from edc_appointment_app.visit_schedule import get_visit_schedule1
+
+from ..helper import Helper
+
+utc_tz = ZoneInfo("UTC")
+
+
+@override_settings(SITE_ID=10)
+@time_machine.travel(datetime(2019, 6, 11, 8, 00, tzinfo=utc_tz))
+class TestFormRunners(TestCase):
+    helper_cls = Helper
+
+    @classmethod
+    def setUpTestData(cls):
+        import_holidays()
+
+    def setUp(self):
+        site_visit_schedules._registry = {}
+        self.visit_schedule1 = get_visit_schedule1()
+        site_visit_schedules.register(visit_schedule=self.visit_schedule1)
+        site_consents.registry = {}
+        site_consents.register(consent_v1)
+        for subject_identifier in ["12345", "67890"]:
+            self.helper_cls(
+                subject_identifier=subject_identifier,
+                now=datetime(2017, 1, 7, tzinfo=utc_tz),
+            ).consent_and_put_on_schedule(
+                visit_schedule_name=self.visit_schedule1.name, schedule_name="schedule1"
+            )
+
+    def test_run_subjects(self):
+        runner = AppointmentFormRunner()
+        self.assertEqual(runner.get_subject_identifiers(), ["12345", "67890"])
+        count, issues = runner.run_subjects(["12345"])
+        self.assertEqual(count, Appointment.objects.filter(subject_identifier="12345").count())
+        for issue in issues:
+            self.assertEqual(list(issue), ISSUE_FIELDS)
+            self.assertEqual(issue["subject_identifier"], "12345")
+
+    def test_issue_writer(self):
+        issue = dict(
+            subject_identifier="12345",
+            visit_schedule_name="visit_schedule1",
+            schedule_name="schedule1",
+            visit_code="1000",
+            visit_code_sequence=0,
+            field_name="appt_datetime",
+            message="Invalid.",
+        )
+        with TemporaryDirectory() as folder:
+            path = Path(folder) / "issues.csv"
+            with IssueWriter(path) as writer:
+                writer.write([issue])
+            with path.open() as f:
+                self.assertEqual(list(csv.DictReader(f))[0]["field_name"], "appt_datetime")
+            path = Path(folder) / "issues.jsonl"
+            with IssueWriter(path) as writer:
+                writer.write([issue, issue])
+            lines = path.read_text().splitlines()
+            self.assertEqual(len(lines), 2)
+            self.assertEqual(json.loads(lines[0]), issue)
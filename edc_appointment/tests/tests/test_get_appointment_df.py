@@ -0,0 +1,167 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+import time_machine
+from django.test import TestCase, override_settings
+from edc_consent.site_consents import site_consents
+from edc_facility.import_holidays import import_holidays
+from edc_pdutils.utils import convert_dates_from_model
+from edc_visit_schedule.site_visit_schedules import site_visit_schedules
+
+from edc_appointment.analytics.dataframes.get_appointment_df import (
+    get_appointment_df,
+    get_appointment_df_by_site,
+)
+from edc_appointment.constants import INCOMPLETE_APPT, NEW_APPT
+from edc_appointment.models import Appointment, AppointmentType
+from edc_appointment_app.consents import consent_v1
+from edc_appointment_app.visit_schedule import get_visit_schedule1
+
+from ..helper import Helper
+
+utc_tz = ZoneInfo("UTC")
+
+COMPARE_COLUMNS = [
+    "visit_code",
+    "visit_code_str",
+    "visit_code_sequence",
+    "baseline_datetime",
+    "endline_visit_code",
+    "endline_visit_code_str",
+    "last_appt_datetime",
+    "next_visit_code",
+    "next_visit_code_str",
+    "next_appt_datetime",
+    "appt_type",
+]
+
+
+def get_merged_appointment_df(site_id: int | None = None) -> pd.DataFrame:
+    """Returns the appointment dataframe built with merges, as
+    `get_appointment_df` did before reading in typed chunks.
+    """
+    queryset = Appointment.objects.all()
+    if site_id:
+        queryset = queryset.filter(site_id=site_id)
+    df_appt = pd.DataFrame.from_records(
+        queryset.values(*[f.attname for f in Appointment._meta.concrete_fields])
+    )
+    df_appt = convert_dates_from_model(df_appt, Appointment, normalize=True, localize=True)
+    df_appt = df_appt.rename(columns={"id": "appointment_id", "appt_type_id": "appt_type"})
+    df_appt["visit_code_str"] = df_appt["visit_code"]
+    df_appt["visit_code"] = df_appt["visit_code"].astype(float)
+    df_appt["visit_code_sequence"] = df_appt["visit_code_sequence"].astype(float)
+    df_appt["visit_code_sequence"] = df_appt["visit_code_sequence"].apply(
+        lambda x: x / 10.0 if x > 0.0 else 0.0
+    )
+    df_appt["visit_code"] = df_appt["visit_code"] + df_appt["visit_code_sequence"]
+
+    df_baseline = df_appt[(df_appt["visit_code"] == 1000.0)]
+    df_baseline = df_baseline.rename(columns={"appt_datetime": "baseline_datetime"})
+    df_baseline = df_baseline[["subject_identifier", "baseline_datetime"]]
+    df_appt = df_appt.merge(df_baseline, on="subject_identifier", how="left")
+
+    df_last = (
+        df_appt[df_appt.appt_status != NEW_APPT]
+        .groupby("subject_identifier")
+        .agg({"visit_code": "max", "appt_datetime": "max"})
+    ).copy()
+    df_last = df_last.rename(
+        columns={"visit_code": "endline_visit_code", "appt_datetime": "last_appt_datetime"}
+    )
+    df_last["endline_visit_code_str"] = (
+        df_last["endline_visit_code"].astype("int64").apply(lambda x: str(x))
+    )
+    df_appt = df_appt.merge(df_last.reset_index(), on="subject_identifier", how="left")
+
+    df_next = (
+        df_appt[df_appt.appt_status == NEW_APPT]
+        .groupby("subject_identifier")
+        .agg({"visit_code": "min", "appt_datetime": "min"})
+    ).copy()
+    df_next = df_next.rename(
+        columns={"visit_code": "next_visit_code", "appt_datetime": "next_appt_datetime"}
+    )
+    df_next["next_visit_code_str"] = (
+        df_next["next_visit_code"].astype("int64").apply(lambda x: str(x))
+    )
+    df_appt = df_appt.merge(df_next.reset_index(), on="subject_identifier", how="left")
+
+    appt_types = dict(AppointmentType.objects.values_list("id", "name"))
+    df_appt["appt_type"] = df_appt["appt_type"].map(appt_types)
+    return df_appt
+
+
+def to_records(df: pd.DataFrame) -> dict:
+    """Returns {appointment_id: {column: value}} with missing values
+    as None so that dtypes do not affect the comparison.
+    """
+    df = df.set_index(df["appointment_id"].astype(str))[COMPARE_COLUMNS].astype(object)
+    return df.where(df.notna(), None).to_dict(orient="index")
+
+
+@override_settings(SITE_ID=10)
+@time_machine.travel(datetime(2019, 6, 11, 8, 00, tzinfo=utc_tz))
+class TestGetAppointmentDf(TestCase):
+    helper_cls = Helper
+
+    @classmethod
+    def setUpTestData(cls):
+        import_holidays()
+
+    def setUp(self):
+        site_visit_schedules._registry = {}
+        self.visit_schedule1 = get_visit_schedule1()
+        site_visit_schedules.register(visit_schedule=self.visit_schedule1)
+        site_consents.registry = {}
+        site_consents.register(consent_v1)
+        for subject_identifier in ["12345", "67890", "54321"]:
+            self.helper_cls(
+                subject_identifier=subject_identifier,
+                now=datetime(2017, 1, 7, tzinfo=utc_tz),
+            ).consent_and_put_on_schedule(
+                visit_schedule_name=self.visit_schedule1.name, schedule_name="schedule1"
+            )
+        # 12345 attended the first two visits
+        appointments = Appointment.objects.filter(subject_identifier="12345").order_by(
+            "timepoint"
+        )
+        Appointment.objects.filter(id__in=[obj.id for obj in appointments[:2]]).update(
+            appt_status=INCOMPLETE_APPT, appt_type=AppointmentType.objects.first()
+        )
+        # 67890 has no NEW appointments
+        Appointment.objects.filter(subject_identifier="67890").update(
+            appt_status=INCOMPLETE_APPT
+        )
+        # 54321 is at another site and has only NEW appointments
+        Appointment.objects.filter(subject_identifier="54321").update(site_id=20)
+
+    def test_same_as_merged(self):
+        df = get_appointment_df()
+        self.assertEqual(len(df), Appointment.objects.count())
+        self.assertEqual(to_records(df), to_records(get_merged_appointment_df()))
+
+    def test_same_as_merged_in_chunks(self):
+        self.assertEqual(
+            to_records(get_appointment_df(chunk_size=3)),
+            to_records(get_merged_appointment_df()),
+        )
+
+    def test_subject_without_new_appointments(self):
+        df = get_appointment_df()
+        df = df[df["subject_identifier"] == "67890"]
+        self.assertTrue(df["next_visit_code"].isna().all())
+        self.assertTrue(df["next_appt_datetime"].isna().all())
+        self.assertTrue(df["next_visit_code_str"].isna().all())
+        self.assertEqual(set(df["endline_visit_code_str"]), {"4000"})
+
+    def test_by_site(self):
+        frames = dict(get_appointment_df_by_site())
+        self.assertEqual(list(frames), [10, 20])
+        for site_id, df in frames.items():
+            with self.subTest(site_id=site_id):
+                self.assertEqual(
+                    to_records(df), to_records(get_merged_appointment_df(site_id=site_id))
+                )
+        self.assertEqual(set(frames[20]["subject_identifier"]), {"54321"})
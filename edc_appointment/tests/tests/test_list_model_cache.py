@@ -0,0 +1,48 @@
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from edc_constants.constants import CLINIC, PATIENT
+
+from edc_appointment.list_model_cache import get_list_model_cache
+from edc_appointment.models import AppointmentType, InfoSources
+
+
+class TestListModelCache(TestCase):
+    def setUp(self):
+        self.cache = get_list_model_cache("edc_appointment.appointmenttype")
+        self.cache.invalidate()
+
+    def test_get(self):
+        appt_type = AppointmentType.objects.get(name=CLINIC)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cache.get(name=CLINIC), appt_type)
+            self.assertEqual(self.cache.get(pk=appt_type.pk), appt_type)
+            self.assertEqual(self.cache.get_display_name(appt_type.pk), appt_type.display_name)
+        self.assertRaises(AppointmentType.DoesNotExist, self.cache.get, name="blah")
+        self.assertIsNone(self.cache.get_or_none("blah"))
+
+    def test_info_sources(self):
+        self.assertEqual(
+            get_list_model_cache("edc_appointment.infosources").get(name=PATIENT),
+            InfoSources.objects.get(name=PATIENT),
+        )
+
+    def test_invalidated_on_save_and_delete(self):
+        appt_type = self.cache.get(name=CLINIC)
+        appt_type.display_name = "Clinic visit"
+        appt_type.save()
+        self.assertIsNone(self.cache._data)
+        self.assertEqual(self.cache.get(name=CLINIC).display_name, "Clinic visit")
+        obj = AppointmentType.objects.create(name="blah", display_name="Blah")
+        self.assertEqual(self.cache.get(name="blah"), obj)
+        obj.delete()
+        self.assertIsNone(self.cache.get_or_none("blah"))
+
+    @override_settings(EDC_APPOINTMENT_LIST_MODEL_CACHE="default")
+    def test_shared_version(self):
+        self.cache.get(name=CLINIC)
+        with self.assertNumQueries(0):
+            self.cache.get(name=CLINIC)
+        # as if invalidated in another process
+        caches["default"].incr(self.cache.version_key)
+        with self.assertNumQueries(1):
+            self.cache.get(name=CLINIC)
@@ -0,0 +1,148 @@
+from datetime import datetime
+from io import StringIO
+from unittest.mock import patch
+from zoneinfo import ZoneInfo
+
+import time_machine
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from edc_consent.site_consents import site_consents
+from edc_facility.import_holidays import import_holidays
+from edc_protocol.research_protocol_config import ResearchProtocolConfig
+from edc_visit_schedule.site_visit_schedules import site_visit_schedules
+
+from edc_appointment import profiling
+from edc_appointment.profiling import (
+    PROCESSES_KEY,
+    OperationStats,
+    get_exporters,
+    get_profile_stats,
+    get_shared_profile_stats,
+    profile,
+    register_exporter,
+    reset_profile_stats,
+)
+from edc_appointment_app.consents import consent_v1
+from edc_appointment_app.visit_schedule import get_visit_schedule1
+
+from ..helper import Helper
+
+utc_tz = ZoneInfo("UTC")
+
+
+@override_settings(SITE_ID=10)
+@time_machine.travel(datetime(2019, 6, 11, 8, 00, tzinfo=utc_tz))
+class TestProfiling(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        import_holidays()
+
+    def setUp(self):
+        reset_profile_stats()
+        site_visit_schedules._registry = {}
+        site_visit_schedules.register(get_visit_schedule1())
+        site_consents.registry = {}
+        site_consents.register(consent_v1)
+        self.helper = Helper(
+            subject_identifier="12345",
+            now=ResearchProtocolConfig().study_open_datetime,
+        )
+
+    def tearDown(self):
+        profiling._exporters.clear()
+        reset_profile_stats()
+        cache.clear()
+
+    def test_not_enabled(self):
+        self.helper.consent_and_put_on_schedule(
+            visit_schedule_name="visit_schedule1", schedule_name="schedule1"
+        )
+        self.assertEqual(get_profile_stats(), {})
+
+    @override_settings(EDC_APPOINTMENT_PROFILE=True)
+    def test_enabled(self):
+        exported = []
+        register_exporter(lambda name, seconds, queries: exported.append(name))
+        self.helper.consent_and_put_on_schedule(
+            visit_schedule_name="visit_schedule1", schedule_name="schedule1"
+        )
+        stats = get_profile_stats()
+        self.assertIn("appointments_creator.create_appointments", stats)
+        self.assertIn("edc_appointment.models.signals.appointment_post_save", stats)
+        obj = stats["appointments_creator.create_appointments"]
+        self.assertEqual(obj.calls, 1)
+        self.assertGreater(obj.queries, 0)
+        self.assertGreater(obj.as_dict()["p99"], 0.0)
+        self.assertIn("appointments_creator.create_appointments", exported)
+        # cheap receivers are not profiled
+        self.assertNotIn(
+            "edc_appointment.models.signals.invalidate_timeline_on_post_save", stats
+        )
+
+    @override_settings(EDC_APPOINTMENT_PROFILE=True)
+    def test_nested(self):
+        with self.assertNumQueries(2):
+            with profile("outer"):
+                with profile("inner"):
+                    self.helper.screening_model_cls.objects.count()
+                self.helper.screening_model_cls.objects.count()
+        stats = get_profile_stats()
+        self.assertEqual(stats["outer"].queries, 2)
+        self.assertEqual(stats["inner"].queries, 1)
+
+    @override_settings(EDC_APPOINTMENT_PROFILE=True)
+    def test_exporter_error_is_logged(self):
+        exported = []
+
+        def failing_exporter(name, seconds, queries):
+            raise ValueError("exporter failed")
+
+        register_exporter(failing_exporter)
+        register_exporter(lambda name, seconds, queries: exported.append(name))
+        with self.assertLogs("edc_appointment.profiling", level="ERROR") as cm:
+            with profile("outer"):
+                pass
+        self.assertIn("failing_exporter", cm.output[0])
+        self.assertEqual(exported, ["outer"])
+        self.assertEqual(get_profile_stats()["outer"].calls, 1)
+
+    def test_setting_exporters_imported_once(self):
+        path = "edc_appointment.profiling.reset_profile_stats"
+        with override_settings(EDC_APPOINTMENT_PROFILE_EXPORTERS=[path]):
+            with patch.object(
+                profiling, "import_string", wraps=profiling.import_string
+            ) as import_string:
+                self.assertEqual(get_exporters(), [reset_profile_stats])
+                self.assertEqual(get_exporters(), [reset_profile_stats])
+            import_string.assert_called_once_with(path)
+        # reset when the setting changes
+        self.assertEqual(get_exporters(), [])
+
+    @override_settings(
+        EDC_APPOINTMENT_PROFILE=True,
+        EDC_APPOINTMENT_PROFILE_CACHE="default",
+        EDC_APPOINTMENT_PROFILE_FLUSH_INTERVAL=0,
+    )
+    def test_shared_stats(self):
+        # stats written by another process
+        other = OperationStats("outer")
+        other.add(1.0, 3)
+        cache.set("edc_appointment.profiling.otherhost.1", {"outer": other.to_cache()})
+        cache.set(PROCESSES_KEY, ["edc_appointment.profiling.otherhost.1"])
+        with profile("outer"):
+            self.helper.screening_model_cls.objects.count()
+        stats = get_shared_profile_stats()
+        self.assertEqual(stats["outer"].calls, 2)
+        self.assertEqual(stats["outer"].queries, 4)
+        self.assertEqual(len(cache.get(PROCESSES_KEY)), 2)
+
+        out = StringIO()
+        call_command("appointment_profile", "--from-cache", "--json", stdout=out)
+        self.assertIn('"calls": 2', out.getvalue())
+
+    @override_settings(EDC_APPOINTMENT_PROFILE=True, EDC_APPOINTMENT_PROFILE_FLUSH_INTERVAL=0)
+    def test_shared_stats_not_set(self):
+        with profile("outer"):
+            pass
+        self.assertEqual(get_shared_profile_stats(), {})
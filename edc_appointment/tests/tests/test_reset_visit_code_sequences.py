@@ -0,0 +1,137 @@
+from contextlib import redirect_stdout
+from datetime import datetime
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from zoneinfo import ZoneInfo
+
+import time_machine
+from dateutil.relativedelta import relativedelta
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from edc_facility.import_holidays import import_holidays
+
+from edc_appointment.management.commands.reset_visit_code_sequences import (
+    get_groups,
+    reset_chunk,
+)
+from edc_appointment.models import Appointment
+from edc_appointment.parallel import Checkpoint, chunked, run_chunks
+from edc_appointment_app.tests.appointment_app_test_case_mixin import (
+    AppointmentAppTestCaseMixin,
+)
+
+from ..helper import Helper
+
+utc_tz = ZoneInfo("UTC")
+
+GROUP = ("12345", "visit_schedule1", "schedule1", "1000")
+
+
+def double(chunk):
+    return [x * 2 for x in chunk]
+
+
+class TestParallel(TestCase):
+    def test_chunked(self):
+        self.assertEqual(list(chunked([1, 2, 3, 4, 5], 2)), [[1, 2], [3, 4], [5]])
+        self.assertEqual(list(chunked([], 2)), [])
+
+    def test_run_chunks(self):
+        self.assertEqual(
+            list(run_chunks(double, chunked([1, 2, 3], 2))),
+            [([1, 2], [2, 4]), ([3], [6])],
+        )
+
+    def test_checkpoint_resume(self):
+        with TemporaryDirectory() as folder:
+            path = Path(folder) / "checkpoint.jsonl"
+            checkpoint = Checkpoint(path)
+            self.assertEqual(len(checkpoint), 0)
+            checkpoint.add([GROUP, ("67890", "visit_schedule1", "schedule1", "2000")])
+            checkpoint = Checkpoint(path)
+            self.assertEqual(len(checkpoint), 2)
+            self.assertIn(GROUP, checkpoint)
+            self.assertIn(list(GROUP), checkpoint)
+            self.assertNotIn(("12345", "visit_schedule1", "schedule1", "2000"), checkpoint)
+
+    def test_checkpoint_without_path(self):
+        checkpoint = Checkpoint()
+        checkpoint.add([GROUP])
+        self.assertIn(GROUP, checkpoint)
+
+
+@override_settings(SITE_ID=10)
+@time_machine.travel(datetime(2019, 6, 11, 8, 00, tzinfo=utc_tz))
+class TestResetVisitCodeSequences(AppointmentAppTestCaseMixin, TestCase):
+    helper_cls = Helper
+
+    @classmethod
+    def setUpTestData(cls):
+        import_holidays()
+
+    def setUp(self):
+        super().setUp()
+        # move 1000.1 after 1000.3 so that the visit code sequences
+        # are out of order
+        appointment3 = Appointment.objects.get(visit_code="1000", visit_code_sequence=3)
+        Appointment.objects.filter(visit_code="1000", visit_code_sequence=1).update(
+            appt_datetime=appointment3.appt_datetime + relativedelta(hours=1)
+        )
+
+    @staticmethod
+    def get_sequences() -> list[int]:
+        return list(
+            Appointment.objects.filter(visit_code="1000")
+            .order_by("appt_datetime")
+            .values_list("visit_code_sequence", flat=True)
+        )
+
+    def call_command(self, *args) -> str:
+        stdout = StringIO()
+        with redirect_stdout(stdout):
+            call_command("reset_visit_code_sequences", *args)
+        return stdout.getvalue()
+
+    def test_get_groups(self):
+        self.assertEqual(get_groups(), [GROUP])
+        self.assertEqual(get_groups([10]), [GROUP])
+        self.assertEqual(get_groups([20]), [])
+
+    def test_reset_chunk(self):
+        self.assertEqual(reset_chunk([GROUP], dry_run=True), [GROUP])
+        self.assertEqual(self.get_sequences(), [0, 2, 3, 1])
+        self.assertEqual(reset_chunk([GROUP]), [GROUP])
+        self.assertEqual(self.get_sequences(), [0, 1, 2, 3])
+        self.assertEqual(reset_chunk([GROUP]), [])
+
+    def test_dry_run(self):
+        output = self.call_command("--dry-run")
+        self.assertIn("Would reset for 12345 schedule1 1000", output)
+        self.assertIn("Found 1 out of order visit codes", output)
+        self.assertEqual(self.get_sequences(), [0, 2, 3, 1])
+
+    def test_reset(self):
+        output = self.call_command()
+        self.assertIn("Reset 1 out of order visit codes", output)
+        self.assertEqual(self.get_sequences(), [0, 1, 2, 3])
+
+    def test_site(self):
+        output = self.call_command("--site", "20")
+        self.assertIn("Found 0 subject visit codes", output)
+        self.assertEqual(self.get_sequences(), [0, 2, 3, 1])
+        self.call_command("--site", "10,20")
+        self.assertEqual(self.get_sequences(), [0, 1, 2, 3])
+
+    def test_checkpoint(self):
+        with TemporaryDirectory() as folder:
+            path = str(Path(folder) / "checkpoint.jsonl")
+            # a dry run does not add to the checkpoint
+            self.call_command("--dry-run", "--checkpoint", path)
+            self.assertEqual(len(Checkpoint(path)), 0)
+            self.call_command("--checkpoint", path)
+            self.assertIn(GROUP, Checkpoint(path))
+            # groups in the checkpoint are skipped
+            output = self.call_command("--checkpoint", path)
+            self.assertIn("Found 0 subject visit codes", output)
+            self.assertIn("(1 already done)", output)
@@ -0,0 +1,93 @@
+from dateutil.relativedelta import relativedelta
+from django.test import TestCase
+from edc_visit_schedule.site_visit_schedules import site_visit_schedules
+from edc_visit_schedule.visit import Visit
+
+from edc_appointment.schedule_index import get_schedule_index, invalidate_schedule_index
+from edc_appointment_app.visit_schedule import (
+    get_visit_schedule1,
+    get_visit_schedule2,
+    get_visit_schedule4,
+)
+
+
+class TestScheduleIndex(TestCase):
+    def setUp(self):
+        site_visit_schedules._registry = {}
+        site_visit_schedules.register(get_visit_schedule1())
+        site_visit_schedules.register(get_visit_schedule2())
+
+    def test_same_as_visit_schedules(self):
+        index = get_schedule_index()
+        for visit_schedule in site_visit_schedules.visit_schedules.values():
+            for schedule in visit_schedule.schedules.values():
+                self.assertIs(index.get_schedule(visit_schedule.name, schedule.name), schedule)
+                for visit_code, visit in schedule.visits.items():
+                    with self.subTest(schedule=schedule, visit_code=visit_code):
+                        entry = index.get_visit(visit_schedule.name, schedule.name, visit_code)
+                        self.assertIs(entry.visit, visit)
+                        self.assertEqual(entry.timepoint, visit.timepoint)
+                        self.assertEqual(entry.rupper, visit.rupper)
+                        self.assertEqual(entry.allow_unscheduled, visit.allow_unscheduled)
+                        self.assertEqual(
+                            entry.next_visit_code,
+                            getattr(schedule.visits.next(visit_code), "code", None),
+                        )
+                        self.assertEqual(
+                            entry.previous_visit_code,
+                            getattr(schedule.visits.previous(visit_code), "code", None),
+                        )
+
+    def test_unknown(self):
+        index = get_schedule_index()
+        self.assertIsNone(index.get_visit("visit_schedule1", "schedule1", "9999"))
+        self.assertIsNone(index.next_visit_code("visit_schedule1", "schedule1", "9999"))
+        self.assertIsNone(index.get_schedule("visit_schedule1", "blah"))
+
+    def test_visit_added_after_index_is_built(self):
+        index = get_schedule_index()
+        schedule = site_visit_schedules.get_visit_schedule("visit_schedule1").schedules.get(
+            "schedule1"
+        )
+        schedule.add_visit(
+            Visit(
+                code="5000",
+                title="Day 5",
+                timepoint=4,
+                rbase=relativedelta(days=28),
+                rlower=relativedelta(days=0),
+                rupper=relativedelta(days=6),
+                facility_name="5-day-clinic",
+            )
+        )
+        self.assertIs(get_schedule_index(), index)
+        entry = index.get_visit("visit_schedule1", "schedule1", "5000")
+        self.assertEqual(entry.visit.title, "Day 5")
+        self.assertEqual(entry.previous_visit_code, "4000")
+        self.assertIsNone(entry.next_visit_code)
+        self.assertIsNone(index.get_visit("blah", "schedule1", "5000"))
+
+    def test_immutable(self):
+        index = get_schedule_index()
+        with self.assertRaises(TypeError):
+            index.visits[("visit_schedule1", "schedule1", "1000")] = None
+
+    def test_rebuilt_when_registry_changes(self):
+        index = get_schedule_index()
+        self.assertIs(get_schedule_index(), index)
+        visit_schedule4 = get_visit_schedule4()
+        site_visit_schedules.register(visit_schedule4)
+        self.assertIsNot(get_schedule_index(), index)
+        self.assertIn(visit_schedule4.name, get_schedule_index().visit_schedules)
+
+    def test_rebuilt_when_registry_replaced(self):
+        index = get_schedule_index()
+        site_visit_schedules._registry = {}
+        site_visit_schedules.register(get_visit_schedule1())
+        self.assertIsNot(get_schedule_index(), index)
+        self.assertEqual(list(get_schedule_index().visit_schedules), ["visit_schedule1"])
+
+    def test_invalidate(self):
+        index = get_schedule_index()
+        invalidate_schedule_index()
+        self.assertIsNot(get_schedule_index(), index)
@@ -0,0 +1,54 @@
+from django.db.models.signals import post_save
+from django.test import TestCase, override_settings
+
+from edc_appointment.models.signals import get_senders
+from edc_appointment_app.models import (
+    CrfOne,
+    CrfTwo,
+    NextAppointmentCrf,
+    SubjectVisit,
+    SubjectVisit2,
+)
+
+
+class TestSignalSenders(TestCase):
+    def test_senders(self):
+        senders = get_senders()
+        self.assertEqual(
+            senders["update_appt_status_on_related_visit_post_save"],
+            [SubjectVisit, SubjectVisit2],
+        )
+        self.assertEqual(
+            senders["update_appointment_from_nextappointment_post_save"], [NextAppointmentCrf]
+        )
+        self.assertEqual(senders["update_appointments_to_next_on_post_save"], [])
+        self.assertNotIn(CrfTwo, [obj for objs in senders.values() for obj in objs])
+
+    @override_settings(
+        EDC_APPOINTMENT_ALLOW_SKIPPED_APPT_USING={
+            "edc_appointment_app.crfone": ("next_appt_date", "next_visit_code")
+        }
+    )
+    def test_senders_on_setting_changed(self):
+        self.assertEqual(get_senders()["update_appointments_to_next_on_post_save"], [CrfOne])
+        self.assertTrue(
+            any(
+                "update_appointments_to_next_on_post_save.edc_appointment_app.crfone"
+                in str(lookup_key)
+                for lookup_key, *_ in post_save.receivers
+            )
+        )
+
+    @override_settings(
+        EDC_APPOINTMENT_ALLOW_SKIPPED_APPT_USING={
+            "edc_appointment_app.crfone": ("next_appt_date", "next_visit_code"),
+            "edc_appointment_app.crftwo": ("next_appt_date", "next_visit_code"),
+        }
+    )
+    def test_senders_with_invalid_setting(self):
+        """Asserts an invalid setting does not raise when connecting
+        receivers. `get_allow_skipped_appt_using` raises at use time.
+        """
+        self.assertEqual(
+            get_senders()["update_appointments_to_next_on_post_save"], [CrfOne, CrfTwo]
+        )
@@ -16,6 +16,7 @@ from edc_visit_schedule.site_visit_schedules import site_visit_schedules
 from edc_visit_tracking.constants import SCHEDULED
 
 from edc_appointment.constants import (
+    CANCELLED_APPT,
     COMPLETE_APPT,
     IN_PROGRESS_APPT,
     INCOMPLETE_APPT,
@@ -24,6 +25,7 @@ from edc_appointment.constants import (
 )
 from edc_appointment.models import Appointment
 from edc_appointment.skip_appointments import (
+    SkipAppointments,
     SkipAppointmentsFieldError,
     SkipAppointmentsValueError,
 )
@@ -238,6 +240,86 @@ class TestSkippedAppt(AppointmentTestCaseMixin, TestCase):
         self.assertEqual(appointments[2].appt_status, SKIPPED_APPT)
         self.assertEqual(appointments[3].appt_status, NEW_APPT)
 
+    @override_settings(
+        EDC_APPOINTMENT_ALLOW_SKIPPED_APPT_USING={
+            "edc_appointment_app.crfthree": ("report_datetime", "f1"),
+        }
+    )
+    def test_skip_appointments_plan(self):
+        self.helper.consent_and_put_on_schedule(
+            visit_schedule_name="visit_schedule1", schedule_name="schedule1"
+        )
+        appointments = Appointment.objects.all().order_by("timepoint", "visit_code_sequence")
+        appointments[0].appt_status = IN_PROGRESS_APPT
+        appointments[0].save()
+        subject_visit = SubjectVisit.objects.create(
+            appointment=appointments[0],
+            report_datetime=appointments[0].appt_datetime,
+            reason=SCHEDULED,
+        )
+        # create without skipping
+        with override_settings(EDC_APPOINTMENT_ALLOW_SKIPPED_APPT_USING={}):
+            crf_obj = CrfThree.objects.create(
+                subject_visit=subject_visit,
+                report_datetime=appointments[3].appt_datetime,
+                f1=appointments[3].visit_code,
+            )
+        skip_appointments = SkipAppointments(crf_obj)
+
+        # dry run
+        plan = skip_appointments.get_plan()
+        self.assertEqual([obj.visit_code for obj in plan.skipped], ["2000", "3000"])
+        self.assertEqual(plan.next_appointment.visit_code, "4000")
+        self.assertTrue(plan.next_scheduled_appointment_updated)
+        self.assertEqual(
+            [obj.appt_status for obj in Appointment.objects.all().order_by("timepoint")],
+            [IN_PROGRESS_APPT, NEW_APPT, NEW_APPT, NEW_APPT],
+        )
+
+        self.assertTrue(skip_appointments.apply_plan(plan))
+        self.assertEqual(
+            [obj.appt_status for obj in Appointment.objects.all().order_by("timepoint")],
+            [IN_PROGRESS_APPT, SKIPPED_APPT, SKIPPED_APPT, NEW_APPT],
+        )
+        # nothing left to change
+        self.assertEqual(SkipAppointments(crf_obj).get_plan().changed, [])
+
+    @override_settings(
+        EDC_APPOINTMENT_ALLOW_SKIPPED_APPT_USING={
+            "edc_appointment_app.crfthree": ("report_datetime", "f1"),
+        }
+    )
+    def test_skip_appointments_plan_validates_planned_values(self):
+        """Assert the next appointment is validated as it will be
+        once reset, e.g. CANCELLED in the DB but NEW in the plan.
+        """
+        self.helper.consent_and_put_on_schedule(
+            visit_schedule_name="visit_schedule1", schedule_name="schedule1"
+        )
+        appointments = Appointment.objects.all().order_by("timepoint", "visit_code_sequence")
+        appointments[0].appt_status = IN_PROGRESS_APPT
+        appointments[0].save()
+        subject_visit = SubjectVisit.objects.create(
+            appointment=appointments[0],
+            report_datetime=appointments[0].appt_datetime,
+            reason=SCHEDULED,
+        )
+        with override_settings(EDC_APPOINTMENT_ALLOW_SKIPPED_APPT_USING={}):
+            crf_obj = CrfThree.objects.create(
+                subject_visit=subject_visit,
+                report_datetime=appointments[2].appt_datetime,
+                f1=appointments[2].visit_code,
+            )
+        Appointment.objects.filter(id=appointments[2].id).update(appt_status=CANCELLED_APPT)
+
+        plan = SkipAppointments(crf_obj).get_plan()
+
+        self.assertEqual(plan.next_appointment.visit_code, "3000")
+        self.assertEqual(plan.next_appointment.appt_status, NEW_APPT)
+        self.assertEqual(
+            Appointment.objects.get(id=appointments[2].id).appt_status, CANCELLED_APPT
+        )
+
     @override_settings(
         EDC_APPOINTMENT_ALLOW_SKIPPED_APPT_USING={
             "edc_appointment_app.crfthree": ("appt_date", "f1"),
@@ -0,0 +1,113 @@
+import datetime as dt
+from unittest.mock import patch
+from zoneinfo import ZoneInfo
+
+import time_machine
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from edc_facility.import_holidays import import_holidays
+
+from edc_appointment import subject_appointment_timeline
+from edc_appointment.models import Appointment
+from edc_appointment.subject_appointment_timeline import (
+    SubjectAppointmentTimeline,
+    SubjectAppointmentTimelineError,
+    get_version_key,
+    invalidate_timeline,
+)
+from edc_appointment_app.tests.appointment_app_test_case_mixin import (
+    AppointmentAppTestCaseMixin,
+)
+
+from ..helper import Helper
+
+utc_tz = ZoneInfo("UTC")
+
+test_datetime = dt.datetime(2019, 6, 11, 8, 00, tzinfo=utc_tz)
+
+attrs = [
+    "next",
+    "previous",
+    "relative_next",
+    "relative_previous",
+    "first",
+    "next_by_timepoint",
+    "previous_by_timepoint",
+    "last_visit_code_sequence",
+]
+
+
+@override_settings(SITE_ID=10)
+@time_machine.travel(test_datetime)
+class TestSubjectAppointmentTimeline(AppointmentAppTestCaseMixin, TestCase):
+    helper_cls = Helper
+
+    @classmethod
+    def setUpTestData(cls):
+        import_holidays()
+
+    def test_same_as_queries(self):
+        appointments = Appointment.objects.filter(
+            subject_identifier=self.subject_identifier
+        ).order_by("timepoint", "visit_code_sequence")
+        self.assertEqual(appointments.count(), 7)
+        timeline = SubjectAppointmentTimeline(self.subject_identifier)
+        for appointment in appointments:
+            attached = timeline.attach(Appointment.objects.get(id=appointment.id))
+            for attr in attrs:
+                with self.subTest(appointment=appointment, attr=attr):
+                    self.assertEqual(getattr(attached, attr), getattr(appointment, attr))
+
+    def test_no_queries_once_loaded(self):
+        appointment = Appointment.objects.get(timepoint=0, visit_code_sequence=0)
+        timeline = SubjectAppointmentTimeline(self.subject_identifier)
+        timeline.attach(appointment)
+        with self.assertNumQueries(1):
+            appointment = appointment.relative_next
+        with self.assertNumQueries(0):
+            while appointment:
+                for attr in attrs:
+                    getattr(appointment, attr)
+                appointment = appointment.relative_next
+
+    def test_reloads_on_save_and_delete(self):
+        appointment = Appointment.objects.get(timepoint=0, visit_code_sequence=3)
+        timeline = SubjectAppointmentTimeline(self.subject_identifier)
+        timeline.attach(appointment)
+        self.assertEqual(appointment.last_visit_code_sequence, None)
+        self.assertEqual(appointment.relative_previous.visit_code_sequence, 2)
+        Appointment.objects.get(timepoint=0, visit_code_sequence=2).delete()
+        self.assertTrue(timeline.stale)
+        appointment = Appointment.objects.get(timepoint=0, visit_code_sequence=2)
+        timeline.attach(appointment)
+        self.assertEqual(appointment.relative_previous.visit_code_sequence, 1)
+        self.assertFalse(timeline.stale)
+
+    def test_attach_other_subject_raises(self):
+        appointment = Appointment.objects.get(timepoint=0, visit_code_sequence=0)
+        timeline = SubjectAppointmentTimeline("99999")
+        self.assertRaises(SubjectAppointmentTimelineError, timeline.attach, appointment)
+
+    @patch.object(subject_appointment_timeline, "MAX_VERSIONS", 2)
+    def test_versions_bounded(self):
+        timeline = SubjectAppointmentTimeline(self.subject_identifier)
+        timeline.load()
+        for subject_identifier in [self.subject_identifier, "22222", "33333", "44444"]:
+            invalidate_timeline(subject_identifier)
+        self.assertEqual(list(subject_appointment_timeline._versions), ["33333", "44444"])
+        self.assertTrue(timeline.stale)
+        timeline.load()
+        self.assertFalse(timeline.stale)
+
+    @override_settings(EDC_APPOINTMENT_TIMELINE_CACHE="default")
+    def test_versions_in_shared_cache(self):
+        timeline = SubjectAppointmentTimeline(self.subject_identifier)
+        timeline.load()
+        self.assertFalse(timeline.stale)
+        invalidate_timeline(self.subject_identifier)
+        self.assertTrue(timeline.stale)
+        timeline.load()
+        self.assertFalse(timeline.stale)
+        # e.g. evicted from the cache
+        cache.delete(get_version_key(self.subject_identifier))
+        self.assertTrue(timeline.stale)
@@ -0,0 +1,64 @@
+from unittest.mock import patch
+
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+
+from edc_appointment.exceptions import SubjectLockTimeout
+from edc_appointment.subject_lock import (
+    acquire_subject_lock,
+    get_held,
+    subject_lock,
+    subject_locked,
+)
+
+
+class Locked:
+    def __init__(self, subject_identifier):
+        self.subject_identifier = subject_identifier
+
+    @subject_locked()
+    def update(self):
+        return dict(get_held())
+
+
+class TestSubjectLock(TestCase):
+    def test_reentrant(self):
+        key = (connection.alias, "12345")
+        with subject_lock("12345"):
+            self.assertEqual(get_held()[key], 1)
+            with subject_lock("12345"):
+                self.assertEqual(get_held()[key], 2)
+            self.assertEqual(get_held()[key], 1)
+        self.assertNotIn(key, get_held())
+
+    def test_decorator(self):
+        self.assertEqual(Locked("12345").update(), {(connection.alias, "12345"): 1})
+        self.assertNotIn((connection.alias, "12345"), get_held())
+
+    @patch("edc_appointment.subject_lock.acquire_subject_lock", return_value=False)
+    def test_timeout(self, acquire_subject_lock):
+        with self.assertRaises(SubjectLockTimeout):
+            with subject_lock("12345", timeout=0.1):
+                pass
+        self.assertGreater(acquire_subject_lock.call_count, 1)
+        self.assertNotIn((connection.alias, "12345"), get_held())
+
+    @override_settings(EDC_APPOINTMENT_SUBJECT_LOCKING=False)
+    @patch("edc_appointment.subject_lock.acquire_subject_lock", return_value=False)
+    def test_disabled(self, acquire_subject_lock):
+        with subject_lock("12345", timeout=0):
+            pass
+        acquire_subject_lock.assert_not_called()
+
+    def test_no_select_for_update_not_locked(self):
+        self.assertFalse(connection.features.has_select_for_update)
+        with self.assertNoLogs("edc_appointment.subject_lock"):
+            self.assertTrue(acquire_subject_lock("12345", connection.alias))
+
+    @patch.object(QuerySet, "select_for_update", lambda self, **kwargs: self)
+    @patch.object(connection.features, "has_select_for_update", True)
+    def test_select_for_update_without_registered_subject_logs(self):
+        with self.assertLogs("edc_appointment.subject_lock", level="WARNING") as cm:
+            self.assertTrue(acquire_subject_lock("12345", connection.alias))
+        self.assertIn("Subject 12345 not locked", cm.output[0])
@@ -0,0 +1,182 @@
+import csv
+import json
+from contextlib import redirect_stdout
+from datetime import datetime
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+from zoneinfo import ZoneInfo
+
+import time_machine
+from dateutil.relativedelta import relativedelta
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from edc_consent.site_consents import site_consents
+from edc_facility import import_holidays
+from edc_visit_schedule.site_visit_schedules import site_visit_schedules
+from edc_visit_tracking.constants import SCHEDULED
+
+from edc_appointment.constants import NEW_APPT, SKIPPED_APPT
+from edc_appointment.management.commands.update_skipped_appointments import (
+    get_latest_crfs,
+)
+from edc_appointment.models import Appointment
+from edc_appointment.parallel import Checkpoint
+from edc_appointment.skip_appointments import (
+    SkipAppointments,
+    SkipAppointmentsValueError,
+)
+from edc_appointment.tests.helper import Helper
+from edc_appointment_app.consents import consent_v1
+from edc_appointment_app.models import CrfOne, SubjectVisit
+from edc_appointment_app.visit_schedule import get_visit_schedule1
+
+utc = ZoneInfo("UTC")
+
+
+@override_settings(
+    SITE_ID=10,
+    EDC_APPOINTMENT_ALLOW_SKIPPED_APPT_USING={
+        "edc_appointment_app.crfone": ("next_appt_date", "next_visit_code")
+    },
+)
+@time_machine.travel(datetime(2019, 6, 11, 8, 00, tzinfo=utc))
+class TestUpdateSkippedAppointments(TestCase):
+    helper_cls = Helper
+
+    @classmethod
+    def setUpTestData(cls):
+        import_holidays()
+
+    def setUp(self):
+        site_visit_schedules._registry = {}
+        site_visit_schedules.register(get_visit_schedule1())
+        site_consents.registry = {}
+        site_consents.register(consent_v1)
+        self.subject_identifiers = ["12345", "67890"]
+        for subject_identifier in self.subject_identifiers:
+            self.helper_cls(
+                subject_identifier=subject_identifier,
+                now=datetime(2017, 6, 5, 8, 0, 0, tzinfo=utc),
+            ).consent_and_put_on_schedule(
+                visit_schedule_name="visit_schedule1", schedule_name="schedule1"
+            )
+            appointments = Appointment.objects.filter(
+                subject_identifier=subject_identifier
+            ).order_by("timepoint", "visit_code_sequence")
+            subject_visit = SubjectVisit.objects.create(
+                appointment=appointments[0],
+                report_datetime=appointments[0].appt_datetime,
+                reason=SCHEDULED,
+            )
+            CrfOne.objects.create(
+                subject_visit=subject_visit,
+                next_appt_date=subject_visit.report_datetime + relativedelta(weeks=3),
+                next_visit_code=appointments[3].visit_code,
+            )
+
+    @staticmethod
+    def call_command(*args) -> str:
+        stdout = StringIO()
+        with redirect_stdout(stdout):
+            call_command("update_skipped_appointments", *args)
+        return stdout.getvalue()
+
+    def test_integrity_error_reported_per_subject(self):
+        with (
+            TemporaryDirectory() as folder,
+            patch.object(
+                SkipAppointments,
+                "update",
+                autospec=True,
+                side_effect=[IntegrityError("duplicate key"), True],
+            ) as update,
+        ):
+            report = Path(folder) / "report.json"
+            self.call_command("--report", report)
+            errors = json.loads(report.read_text())
+        self.assertEqual(update.call_count, 2)
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0]["subject_identifier"], "12345")
+        self.assertEqual(errors[0]["error"], "duplicate key")
+
+    def test_get_latest_crfs(self):
+        # a later CRF for 12345, at the skipped 2000 visit
+        appointments = Appointment.objects.filter(
+            subject_identifier="12345", visit_code_sequence=0
+        ).order_by("timepoint")
+        subject_visit = SubjectVisit.objects.create(
+            appointment=appointments[1],
+            report_datetime=appointments[1].appt_datetime,
+            reason=SCHEDULED,
+        )
+        crf_obj = CrfOne.objects.create(
+            subject_visit=subject_visit,
+            next_appt_date=appointments[3].appt_datetime.date(),
+            next_visit_code=appointments[3].visit_code,
+        )
+        crfs = get_latest_crfs("edc_appointment_app.crfone")
+        # one per subject schedule
+        self.assertEqual(
+            [crf[2:] for crf in crfs],
+            [
+                ("12345", "visit_schedule1", "schedule1"),
+                ("67890", "visit_schedule1", "schedule1"),
+            ],
+        )
+        # the latest by report_datetime
+        self.assertEqual(crfs[0][:2], ("edc_appointment_app.crfone", str(crf_obj.pk)))
+
+    def test_updates(self):
+        Appointment.objects.filter(appt_status=SKIPPED_APPT).update(appt_status=NEW_APPT)
+        self.call_command()
+        self.assertEqual(
+            Appointment.objects.filter(appt_status=SKIPPED_APPT).count(),
+            2 * len(self.subject_identifiers),
+        )
+
+    def test_dry_run(self):
+        Appointment.objects.filter(appt_status=SKIPPED_APPT).update(appt_status=NEW_APPT)
+        self.call_command("--dry-run")
+        self.assertFalse(Appointment.objects.filter(appt_status=SKIPPED_APPT).exists())
+
+    def test_report(self):
+        with (
+            TemporaryDirectory() as folder,
+            patch.object(
+                SkipAppointments,
+                "get_plan",
+                autospec=True,
+                side_effect=SkipAppointmentsValueError("invalid date"),
+            ),
+        ):
+            for filename in ["report.csv", "report.json"]:
+                report = Path(folder) / filename
+                self.call_command("--dry-run", "--report", report)
+                if report.suffix == ".json":
+                    errors = json.loads(report.read_text())
+                else:
+                    with report.open() as f:
+                        errors = list(csv.DictReader(f))
+                self.assertEqual(
+                    [(e["subject_identifier"], e["error"]) for e in errors],
+                    [("12345", "invalid date"), ("67890", "invalid date")],
+                )
+                self.assertEqual(errors[0]["model"], "edc_appointment_app.crfone")
+                self.assertEqual(errors[0]["visit_code"], "1000")
+
+    def test_checkpoint(self):
+        with TemporaryDirectory() as folder:
+            path = str(Path(folder) / "checkpoint.jsonl")
+            self.call_command("--dry-run", "--checkpoint", path)
+            self.assertEqual(len(Checkpoint(path)), 0)
+            self.call_command("--checkpoint", path)
+            self.assertIn(
+                ("edc_appointment_app.crfone", "12345", "visit_schedule1", "schedule1"),
+                Checkpoint(path),
+            )
+            with patch.object(SkipAppointments, "update", autospec=True) as update:
+                self.call_command("--checkpoint", path)
+            update.assert_not_called()
@@ -8,19 +8,59 @@ from edc_facility import import_holidays
 from edc_sites.tests import SiteTestCaseMixin
 from edc_utils import get_utcnow
 from edc_visit_schedule.site_visit_schedules import site_visit_schedules
+from edc_visit_schedule.utils import is_baseline
 
+from edc_appointment.appointment_window_index import (
+    AppointmentWindowIndex,
+    get_window_bounds,
+)
+from edc_appointment.constants import CANCELLED_APPT
+from edc_appointment.exceptions import AppointmentWindowError
 from edc_appointment.models import Appointment
 from edc_appointment.tests.helper import Helper
 from edc_appointment.utils import (
     AppointmentDateWindowPeriodGapError,
+    appt_datetime_in_gap,
+    appt_datetime_in_next_window_adjusted_for_gap,
     get_appointment_by_datetime,
     get_window_gap_days,
+    raise_on_appt_datetime_not_in_window,
 )
 from edc_appointment_app.visit_schedule import get_visit_schedule4
 
 utc = ZoneInfo("UTC")
 
 
+def get_appointment_by_datetime_per_appointment(
+    suggested_appt_datetime, appointments, raise_if_in_gap
+):
+    """Checks each appointment in turn. Used to compare with
+    AppointmentWindowIndex.
+    """
+    appointment = None
+    for appointment in appointments:
+        if appointment.appt_status == CANCELLED_APPT or is_baseline(appointment):
+            continue
+        try:
+            raise_on_appt_datetime_not_in_window(
+                appointment, appt_datetime=suggested_appt_datetime
+            )
+        except AppointmentWindowError:
+            in_gap = appt_datetime_in_gap(appointment, suggested_appt_datetime)
+            in_next_window_adjusted = appt_datetime_in_next_window_adjusted_for_gap(
+                appointment, suggested_appt_datetime
+            )
+            if in_gap and raise_if_in_gap:
+                raise AppointmentDateWindowPeriodGapError()
+            elif in_gap and appointment.next.visit.add_window_gap_to_lower:
+                return appointment.next if in_next_window_adjusted else None
+            else:
+                appointment = appointment.next
+        else:
+            break
+    return appointment
+
+
 @time_machine.travel(dt.datetime(2019, 7, 11, 8, 00, tzinfo=utc))
 @override_settings(SITE_ID=10)
 class TestAppointmentWindowPeriod2(SiteTestCaseMixin, TestCase):
@@ -165,3 +205,109 @@ class TestAppointmentWindowPeriod2(SiteTestCaseMixin, TestCase):
         appointment_1030 = appointments[1]
         gap_days = get_window_gap_days(appointment_1030)
         self.assertEqual(gap_days, 62)
+
+    def test_window_index_same_as_per_appointment(self):
+        self.helper.consent_and_put_on_schedule(
+            visit_schedule_name=self.visit_schedule4.name,
+            schedule_name=self.schedule4.name,
+        )
+        appointments = Appointment.objects.filter(
+            subject_identifier=self.subject_identifier, visit_code_sequence=0
+        ).order_by("timepoint_datetime")
+        index = AppointmentWindowIndex(
+            self.subject_identifier, self.visit_schedule4.name, self.schedule4.name
+        )
+        suggested_appt_datetime = appointments.first().appt_datetime
+        while suggested_appt_datetime < appointments.last().appt_datetime + relativedelta(
+            months=3
+        ):
+            for raise_if_in_gap in [True, False]:
+                with self.subTest(
+                    suggested_appt_datetime=suggested_appt_datetime,
+                    raise_if_in_gap=raise_if_in_gap,
+                ):
+                    try:
+                        expected = get_appointment_by_datetime_per_appointment(
+                            suggested_appt_datetime, appointments, raise_if_in_gap
+                        )
+                    except AppointmentDateWindowPeriodGapError:
+                        self.assertRaises(
+                            AppointmentDateWindowPeriodGapError,
+                            index.get,
+                            suggested_appt_datetime,
+                            raise_if_in_gap=raise_if_in_gap,
+                        )
+                    else:
+                        self.assertEqual(
+                            index.get(
+                                suggested_appt_datetime, raise_if_in_gap=raise_if_in_gap
+                            ),
+                            expected,
+                        )
+            suggested_appt_datetime += relativedelta(hours=12)
+
+    def test_get_appointment_by_datetime_queries(self):
+        self.helper.consent_and_put_on_schedule(
+            visit_schedule_name=self.visit_schedule4.name,
+            schedule_name=self.schedule4.name,
+        )
+        appointment = Appointment.objects.filter(
+            subject_identifier=self.subject_identifier
+        ).order_by("appt_datetime")[3]
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                get_appointment_by_datetime(
+                    appointment.appt_datetime,
+                    self.subject_identifier,
+                    self.visit_schedule4.name,
+                    self.schedule4.name,
+                ),
+                appointment,
+            )
+
+    def test_persisted_window_bounds(self):
+        self.helper.consent_and_put_on_schedule(
+            visit_schedule_name=self.visit_schedule4.name,
+            schedule_name=self.schedule4.name,
+        )
+        appointments = Appointment.objects.filter(
+            subject_identifier=self.subject_identifier
+        ).order_by("timepoint_datetime")
+        for appointment in appointments:
+            with self.subTest(appointment=appointment):
+                self.assertEqual(
+                    (appointment.window_lower_datetime, appointment.window_upper_datetime),
+                    get_window_bounds(appointment),
+                )
+                self.assertIn(
+                    appointment, Appointment.objects.in_window_at(appointment.appt_datetime)
+                )
+                self.assertIn(
+                    appointment,
+                    Appointment.objects.window_closing_between(
+                        appointment.window_upper_datetime - relativedelta(days=1),
+                        appointment.window_upper_datetime,
+                    ),
+                )
+                self.assertNotIn(
+                    appointment,
+                    Appointment.objects.in_window_at(
+                        appointment.window_upper_datetime + relativedelta(minutes=1)
+                    ),
+                )
+
+    def test_persisted_window_bounds_updated_with_timepoint_datetime(self):
+        self.helper.consent_and_put_on_schedule(
+            visit_schedule_name=self.visit_schedule4.name,
+            schedule_name=self.schedule4.name,
+        )
+        appointment = Appointment.objects.filter(
+            subject_identifier=self.subject_identifier
+        ).order_by("timepoint_datetime")[1]
+        window_lower_datetime = appointment.window_lower_datetime
+        appointment.timepoint_datetime += relativedelta(days=1)
+        appointment.save(update_fields=["timepoint_datetime"])
+        appointment.refresh_from_db()
+        self.assertEqual(
+            appointment.window_lower_datetime, window_lower_datetime + relativedelta(days=1)
+        )
@@ -18,8 +18,8 @@ from django.core.exceptions import (
     ValidationError,
 )
 from django.core.handlers.wsgi import WSGIRequest
-from django.db import IntegrityError, transaction
-from django.db.models import Count, ProtectedError
+from django.db import transaction
+from django.db.models import Case, Count, F, Min, ProtectedError, Value, When
 from django.urls import reverse
 from django.utils.translation import gettext as _
 from edc_constants.constants import CLINIC
@@ -33,7 +33,6 @@ from edc_metadata.utils import (
     get_requisition_metadata_model_cls,
     has_keyed_metadata,
 )
-from edc_utils import convert_php_dateformat
 from edc_utils.date import to_local
 from edc_visit_schedule.exceptions import (
     ScheduledVisitWindowError,
@@ -42,7 +41,10 @@ from edc_visit_schedule.exceptions import (
 from edc_visit_schedule.site_visit_schedules import site_visit_schedules
 from edc_visit_schedule.utils import get_default_max_visit_window_gap, is_baseline
 from edc_visit_tracking.utils import get_allow_missed_unscheduled_appts
+from simple_history.exceptions import NotHistoricalModelError
+from simple_history.utils import get_history_manager_for_model
 
+from .appointment_window_index import AppointmentWindowIndex
 from .choices import DEFAULT_APPT_REASON_CHOICES
 from .constants import (
     CANCELLED_APPT,
@@ -54,6 +56,7 @@ from .constants import (
     SKIPPED_APPT,
     UNSCHEDULED_APPT,
 )
+from .exceptions import AppointmentDateWindowPeriodGapError  # noqa: F401
 from .exceptions import (
     AppointmentBaselineError,
     AppointmentDatetimeError,
@@ -61,6 +64,9 @@ from .exceptions import (
     AppointmentWindowError,
     UnscheduledAppointmentError,
 )
+from .profiling import profiled
+from .subject_appointment_timeline import get_timeline, invalidate_timeline
+from .subject_lock import subject_lock
 
 if TYPE_CHECKING:
     from decimal import Decimal
@@ -75,10 +81,6 @@ if TYPE_CHECKING:
         appointment: Appointment
 
 
-class AppointmentDateWindowPeriodGapError(Exception):
-    pass
-
-
 class AppointmentAlreadyStarted(Exception):
     pass
 
@@ -269,66 +271,153 @@ def reset_visit_code_sequence_or_pass(
     relative to the appt_datetime and reset the visit code sequences
     if needed.
 
-    Delete and recreate metadata
+    Also do the same for the `related_visit` and metadata, if they
+    exist.
 
-    Also do the same for the `related_visit`, if it exists.
+    Sequences are changed in bulk, first to a temporary negative
+    value and then to the new value, so the unique constraint on
+    visit_code_sequence is never violated. Runs in `subject_lock`.
     """
-    opts = dict(
-        subject_identifier=subject_identifier,
-        visit_schedule_name=visit_schedule_name,
-        schedule_name=schedule_name,
-        visit_code=visit_code,
-    )
-    qs = get_appointment_model_cls().objects.filter(**opts).order_by("appt_datetime")
-    expected = list(range(0, qs.count()))
-    actual = [o.visit_code_sequence for o in qs]
-    if actual != expected:
-        if write_stdout:
-            sys.stdout.write(
-                "     - Resetting for "
-                f"{subject_identifier} {visit_code}: {actual=} {expected=} ...\n"
+    with subject_lock(subject_identifier):
+        opts = dict(
+            subject_identifier=subject_identifier,
+            visit_schedule_name=visit_schedule_name,
+            schedule_name=schedule_name,
+            visit_code=visit_code,
+        )
+        appointment_model_cls = get_appointment_model_cls()
+        related_visit_model_cls = appointment_model_cls.related_visit_model_cls()
+        related_visit_model_attr = appointment_model_cls.related_visit_model_attr()
+        rows = list(
+            appointment_model_cls.objects.filter(**opts)
+            .order_by("appt_datetime")
+            .values_list(
+                "id",
+                "visit_code_sequence",
+                f"{related_visit_model_attr}__id",
+                f"{related_visit_model_attr}__visit_code_sequence",
             )
-        # reset visit code sequence for this visit code
-        get_crf_metadata_model_cls().objects.filter(visit_code_sequence__gt=0, **opts).delete()
-        get_requisition_metadata_model_cls().objects.filter(
-            visit_code_sequence__gt=0, **opts
-        ).delete()
-
-        try:
+        )
+        expected = list(range(0, len(rows)))
+        actual = [row[1] for row in rows]
+        if actual != expected:
+            if write_stdout:
+                sys.stdout.write(
+                    "     - Resetting for "
+                    f"{subject_identifier} {visit_code}: {actual=} {expected=} ...\n"
+                )
+            # new sequence order by appt_datetime, visit_code_sequence=0
+            # is left as is.
+            sequences = {}
+            related_visit_sequences = {}
+            metadata_sequences = {}
+            for index, (
+                pk,
+                visit_code_sequence,
+                related_visit_id,
+                related_visit_sequence,
+            ) in enumerate([row for row in rows if row[1] != 0], start=1):
+                if visit_code_sequence != index:
+                    sequences.update({pk: index})
+                if related_visit_id:
+                    metadata_sequences.update({related_visit_sequence: index})
+                    if related_visit_sequence != index:
+                        related_visit_sequences.update({pk: index})
             with transaction.atomic():
-                # set appt and related visit visit_code_sequences to the
-                # negative of the current value
-                for obj in get_appointment_model_cls().objects.filter(
-                    visit_code_sequence__gt=0, **opts
-                ):
-                    obj.visit_code_sequence = obj.visit_code_sequence * -1
-                    obj.save_base(update_fields=["visit_code_sequence"])
-                    if getattr(obj, "related_visit", None):
-                        obj.related_visit.visit_code_sequence = obj.visit_code_sequence
-                        obj.related_visit.save_base(update_fields=["visit_code_sequence"])
-                        obj.related_visit.metadata_create()
-
-                # reset sequence order by appt_datetime
-                for index, obj in enumerate(
-                    get_appointment_model_cls()
-                    .objects.filter(visit_code_sequence__lt=0, **opts)
-                    .order_by("appt_datetime"),
-                    start=1,
-                ):
-                    obj.visit_code_sequence = index
-                    obj.save_base(update_fields=["visit_code_sequence"])
-                    if getattr(obj, "related_visit", None):
-                        obj.related_visit.visit_code_sequence = index
-                        obj.related_visit.save_base(update_fields=["visit_code_sequence"])
-                        obj.related_visit.metadata_create()
-
-        except IntegrityError:
-            raise
-        if appointment:
-            # refresh the given appt if not None since
-            # appointment visit_code_sequence may have changed
-            appointment = get_appointment_model_cls().objects.get(id=appointment.id)
-    return appointment
+                bulk_update_visit_code_sequences(
+                    appointment_model_cls.objects.filter(**opts), "id", sequences
+                )
+                bulk_update_visit_code_sequences(
+                    related_visit_model_cls.objects.filter(
+                        appointment__in=list(related_visit_sequences)
+                    ),
+                    "appointment_id",
+                    related_visit_sequences,
+                )
+                # move metadata with the related visit, delete any other
+                for metadata_model_cls in [
+                    get_crf_metadata_model_cls(),
+                    get_requisition_metadata_model_cls(),
+                ]:
+                    metadata_model_cls.objects.filter(
+                        visit_code_sequence__gt=0, **opts
+                    ).exclude(visit_code_sequence__in=list(metadata_sequences)).delete()
+                    bulk_update_visit_code_sequences(
+                        metadata_model_cls.objects.filter(**opts),
+                        "visit_code_sequence",
+                        {k: v for k, v in metadata_sequences.items() if k != v},
+                    )
+                # create metadata for any related visit without CRF or
+                # without requisition metadata
+                missing = set()
+                for metadata_model_cls in [
+                    get_crf_metadata_model_cls(),
+                    get_requisition_metadata_model_cls(),
+                ]:
+                    missing.update(
+                        set(metadata_sequences.values())
+                        - set(
+                            metadata_model_cls.objects.filter(**opts)
+                            .values_list("visit_code_sequence", flat=True)
+                            .distinct()
+                        )
+                    )
+                if missing:
+                    for related_visit in related_visit_model_cls.objects.filter(
+                        visit_code_sequence__in=missing, **opts
+                    ):
+                        related_visit.metadata_create()
+            invalidate_timeline(subject_identifier)
+            if appointment:
+                # refresh the given appt if not None since
+                # appointment visit_code_sequence may have changed
+                appointment = appointment_model_cls.objects.get(id=appointment.id)
+        return appointment
+
+
+def bulk_update_visit_code_sequences(
+    queryset: QuerySet, lookup: str, sequences: dict[Any, int]
+) -> None:
+    """Update `visit_code_sequence` for the rows in the queryset
+    where `lookup` matches a key in `sequences` to the new value.
+
+    Rows are first set to a temporary negative sequence less than
+    any existing sequence, then to the new sequence. This uses two
+    UPDATE statements.
+
+    A history record is added for each updated row if the model
+    is tracked by simple_history.
+    """
+    if not sequences:
+        return
+    lowest = queryset.aggregate(lowest=Min("visit_code_sequence"))["lowest"] or 0
+    temporary = {key: min(lowest, 0) - 1 - index for index, key in enumerate(sequences)}
+    # the pks are selected before updating since `lookup` may be
+    # `visit_code_sequence` itself
+    pks = list(
+        queryset.filter(**{f"{lookup}__in": list(sequences)}).values_list("pk", flat=True)
+    )
+    queryset.filter(pk__in=pks).update(
+        visit_code_sequence=Case(
+            *[When(**{lookup: key}, then=Value(value)) for key, value in temporary.items()],
+            default=F("visit_code_sequence"),
+        )
+    )
+    queryset.filter(pk__in=pks).update(
+        visit_code_sequence=Case(
+            *[
+                When(visit_code_sequence=temporary[key], then=Value(value))
+                for key, value in sequences.items()
+            ],
+            default=F("visit_code_sequence"),
+        )
+    )
+    try:
+        history_manager = get_history_manager_for_model(queryset.model)
+    except NotHistoricalModelError:
+        pass
+    else:
+        history_manager.bulk_history_create(queryset.filter(pk__in=pks), update=True)
 
 
 def reset_visit_code_sequence_for_subject(
@@ -408,6 +497,8 @@ def get_previous_appointment(
     See also: `AppointmentMethodsModelMixin`
     """
     check_appointment_required_values_or_raise(appointment)
+    if timeline := get_timeline(appointment):
+        return timeline.previous(appointment, include_interim=include_interim)
     opts: dict[str, str | int | Decimal] = dict(
         subject_identifier=appointment.subject_identifier,
         visit_schedule_name=appointment.visit_schedule_name,
@@ -452,6 +543,8 @@ def get_next_appointment(appointment: Appointment, include_interim=None) -> Appo
     """
     next_appt: Appointment | None = None
     check_appointment_required_values_or_raise(appointment)
+    if timeline := get_timeline(appointment):
+        return timeline.next(appointment, include_interim=include_interim)
     opts: dict[str, str | int | Decimal] = dict(
         subject_identifier=appointment.subject_identifier,
         visit_schedule_name=appointment.visit_schedule_name,
@@ -597,6 +690,7 @@ def get_appointment_by_datetime(
     visit_schedule_name: str,
     schedule_name: str,
     raise_if_in_gap: bool | None = None,
+    window_index: AppointmentWindowIndex | None = None,
 ) -> Appointment | None:
     """Returns an appointment where the suggested datetime falls
     within the window period.
@@ -604,58 +698,16 @@ def get_appointment_by_datetime(
     * Returns None if no appointment is found.
     * Raises an exception if there is a gap between upper and lower
       boundaries and the date falls within the gap.
+
+    Pass a `window_index` to reuse the index for more than one
+    lookup for this subject and schedule.
+
+    See also AppointmentWindowIndex.
     """
-    appointment = None
-    raise_if_in_gap = True if raise_if_in_gap is None else raise_if_in_gap
-    appointments = (
-        django_apps.get_model("edc_appointment.appointment")
-        .objects.filter(
-            subject_identifier=subject_identifier,
-            visit_schedule_name=visit_schedule_name,
-            schedule_name=schedule_name,
-            visit_code_sequence=0,
-        )
-        .order_by("timepoint_datetime")
+    window_index = window_index or AppointmentWindowIndex(
+        subject_identifier, visit_schedule_name, schedule_name
     )
-    for appointment in appointments:
-        if appointment.appt_status == CANCELLED_APPT or is_baseline(appointment):
-            continue
-        try:
-            raise_on_appt_datetime_not_in_window(
-                appointment, appt_datetime=suggested_appt_datetime
-            )
-        except AppointmentWindowError:
-            in_gap = appt_datetime_in_gap(appointment, suggested_appt_datetime)
-            in_next_window_adjusted = appt_datetime_in_next_window_adjusted_for_gap(
-                appointment, suggested_appt_datetime
-            )
-            if in_gap and raise_if_in_gap:
-                dt = suggested_appt_datetime.strftime(
-                    convert_php_dateformat(settings.SHORT_DATE_FORMAT)
-                )
-                raise AppointmentDateWindowPeriodGapError(
-                    f"Date falls in a `window period gap` between {appointment.visit_code} "
-                    f"and {appointment.next.visit_code}. Got {dt}."
-                )
-            elif (
-                in_gap
-                and in_next_window_adjusted
-                and appointment.next.visit.add_window_gap_to_lower
-            ):
-                appointment = appointment.next
-                break
-            elif (
-                in_gap
-                and not in_next_window_adjusted
-                and appointment.next.visit.add_window_gap_to_lower
-            ):
-                appointment = None
-                break
-            else:
-                appointment = appointment.next
-        else:
-            break
-    return appointment
+    return window_index.get(suggested_appt_datetime, raise_if_in_gap=raise_if_in_gap)
 
 
 def reset_appointment(appointment: Appointment, **kwargs):
@@ -754,6 +806,7 @@ def update_appt_status_for_timepoint(related_visit: RelatedVisitModel) -> None:
             related_visit.appointment.save_base(update_fields=["appt_status"])
 
 
+@profiled("refresh_appointments")
 def refresh_appointments(
     subject_identifier: str = None,
     visit_schedule_name: str = None,
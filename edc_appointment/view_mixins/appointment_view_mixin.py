@@ -16,11 +16,13 @@ from ..constants import (
     NEW_APPT,
     SKIPPED_APPT,
 )
+from ..view_utils import AppointmentDashboardLoader
 
 if TYPE_CHECKING:
     from django.db.models import QuerySet
 
     from ..models import Appointment
+    from ..view_utils import AppointmentRow
 
 
 class AppointmentViewMixin:
@@ -29,6 +31,7 @@ class AppointmentViewMixin:
     def __init__(self, **kwargs):
         self._appointment = None
         self._appointments = None
+        self._appointment_rows = None
         self.appointment_model: str = "edc_appointment.appointment"
         self.appointment_id: str | None = None
         super().__init__(**kwargs)
@@ -52,7 +55,7 @@ class AppointmentViewMixin:
         has_call_manager = True if django_apps.app_configs.get("edc_call_manager") else False
         kwargs.update(
             appointment=self.appointment,
-            appointments=self.appointments,
+            appointments=self.appointment_rows,
             CANCELLED_APPT=CANCELLED_APPT,
             COMPLETE_APPT=COMPLETE_APPT,
             INCOMPLETE_APPT=INCOMPLETE_APPT,
@@ -109,9 +112,32 @@ class AppointmentViewMixin:
     def appointments(self) -> QuerySet[Appointment]:
         """Returns a Queryset of all appointments for this subject."""
         if not self._appointments:
-            self._appointments = self.appointment_model_cls.objects.filter(
-                subject_identifier=self.subject_identifier,
-                site_id__in=sites.get_site_ids_for_user(request=self.request),
-            ).order_by("timepoint", "visit_code_sequence")
+            self._appointments = (
+                self.appointment_model_cls.objects.filter(
+                    subject_identifier=self.subject_identifier,
+                    site_id__in=sites.get_site_ids_for_user(request=self.request),
+                )
+                .select_related(
+                    "appt_type", self.appointment_model_cls.related_visit_model_attr()
+                )
+                .order_by("timepoint", "visit_code_sequence")
+            )
 
         return self._appointments
+
+    @property
+    def appointment_rows(self) -> list[AppointmentRow]:
+        """Returns a list of rows, one per appointment for this subject,
+        with the related visit and metadata counts loaded.
+
+        Added to the context as `appointments`.
+
+        See `AppointmentDashboardLoader`.
+        """
+        if self._appointment_rows is None:
+            self._appointment_rows = AppointmentDashboardLoader(
+                self.subject_identifier,
+                site_ids=sites.get_site_ids_for_user(request=self.request),
+                appointment_model=self.appointment_model,
+            ).rows
+        return self._appointment_rows
@@ -1 +1,2 @@
 from .appointment_button import AppointmentButton
+from .appointment_dashboard_loader import AppointmentDashboardLoader, AppointmentRow
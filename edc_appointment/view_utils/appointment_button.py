@@ -9,6 +9,7 @@ from django.utils.translation import gettext as _
 from edc_utils import get_utcnow
 from edc_view_utils.dashboard_model_button import DashboardModelButton
 from edc_view_utils.model_button import ADD
+from edc_view_utils.perms import Perms
 
 from ..constants import IN_PROGRESS_APPT, NEW_APPT
 
@@ -29,6 +30,23 @@ class AppointmentButton(DashboardModelButton):
     def __post_init__(self):
         self.model_cls = django_apps.get_model("edc_appointment.appointment")
 
+    @property
+    def perms(self) -> Perms:
+        """Returns the Perms for this user and site.
+
+        Perms are cached on the user by current site and site, as
+        Django caches permissions on the user, so that a button per
+        appointment on the dashboard does not query the user profile
+        per appointment.
+        """
+        if not self._perms:
+            perms_cache = self.user.__dict__.setdefault("_appointment_perms_cache", {})
+            key = (self.current_site.id, self.site.id)
+            if key not in perms_cache:
+                perms_cache[key] = super().perms
+            self._perms = perms_cache[key]
+        return self._perms
+
     @property
     def disabled(self) -> str:
         disabled = "disabled"
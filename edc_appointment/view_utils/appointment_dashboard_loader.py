@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Type
+
+from django.apps import apps as django_apps
+from django.db.models import Count
+from edc_metadata.constants import KEYED, REQUIRED
+from edc_metadata.utils import (
+    get_crf_metadata_model_cls,
+    get_requisition_metadata_model_cls,
+)
+
+if TYPE_CHECKING:
+    from edc_visit_tracking.model_mixins import VisitModelMixin
+
+    from ..models import Appointment
+
+__all__ = ["AppointmentDashboardLoader", "AppointmentRow"]
+
+
+@dataclass(eq=False)
+class AppointmentRow:
+    """An appointment on the subject dashboard with its related visit,
+    next appointment and metadata counts already loaded.
+
+    Other attributes are read from the appointment, e.g.
+    `row.visit_code`, so a row may be passed to templates, template
+    tags and buttons written for an appointment.
+    """
+
+    appointment: Appointment
+    crf_counts: dict[str, int] = field(default_factory=dict)
+    requisition_counts: dict[str, int] = field(default_factory=dict)
+    relative_next: Appointment | None = None
+
+    def __getattr__(self, attr: str) -> Any:
+        if attr == "appointment":
+            raise AttributeError(attr)
+        return getattr(self.appointment, attr)
+
+    @property
+    def __class__(self) -> Type[Appointment]:
+        # as django's SimpleLazyObject, e.g. for
+        # `appointment.__class__.objects` in edc_subject_dashboard
+        return self.appointment.__class__
+
+    @property
+    def related_visit(self) -> VisitModelMixin | None:
+        return self.appointment.related_visit
+
+    @property
+    def crf_required(self) -> bool:
+        return self.crf_counts.get(REQUIRED, 0) > 0
+
+    @property
+    def requisition_required(self) -> bool:
+        return self.requisition_counts.get(REQUIRED, 0) > 0
+
+    @property
+    def has_required_metadata(self) -> bool:
+        return self.crf_required or self.requisition_required
+
+    @property
+    def has_keyed_metadata(self) -> bool:
+        return self.crf_counts.get(KEYED, 0) > 0 or self.requisition_counts.get(KEYED, 0) > 0
+
+
+class AppointmentDashboardLoader:
+    """Loads a subject's appointments for the dashboard in three
+    queries.
+
+    Appointments are fetched with the related visit, appointment
+    type and site. CRF and requisition metadata are counted by
+    entry_status for all appointments in one query each. The
+    `relative_next` of each row is the next loaded appointment in
+    the same schedule.
+
+    For example:
+
+        loader = AppointmentDashboardLoader(subject_identifier, site_ids=[10])
+        for row in loader.rows:
+            row.appt_status, row.related_visit, row.crf_required
+    """
+
+    def __init__(
+        self,
+        subject_identifier: str,
+        site_ids: list[int] | None = None,
+        appointment_model: str | None = None,
+    ):
+        self._rows = None
+        self.subject_identifier = subject_identifier
+        self.site_ids = site_ids
+        self.appointment_model = appointment_model or "edc_appointment.appointment"
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(subject_identifier={self.subject_identifier})"
+
+    @property
+    def appointment_model_cls(self) -> Type[Appointment]:
+        return django_apps.get_model(self.appointment_model)
+
+    @property
+    def appointments(self) -> list[Appointment]:
+        opts = dict(subject_identifier=self.subject_identifier)
+        if self.site_ids is not None:
+            opts.update(site_id__in=self.site_ids)
+        return list(
+            self.appointment_model_cls.objects.filter(**opts)
+            .select_related(
+                "appt_type", "site", self.appointment_model_cls.related_visit_model_attr()
+            )
+            .order_by("timepoint", "visit_code_sequence")
+        )
+
+    def get_metadata_counts(self, model_cls) -> dict[tuple, dict[str, int]]:
+        """Returns a dictionary of {(visit_schedule_name, schedule_name,
+        visit_code, visit_code_sequence): {entry_status: count}}.
+        """
+        counts = defaultdict(dict)
+        for row in (
+            model_cls.objects.filter(subject_identifier=self.subject_identifier)
+            .values(
+                "visit_schedule_name",
+                "schedule_name",
+                "visit_code",
+                "visit_code_sequence",
+                "entry_status",
+            )
+            .annotate(count=Count("id"))
+            .order_by()
+        ):
+            key = (
+                row["visit_schedule_name"],
+                row["schedule_name"],
+                row["visit_code"],
+                row["visit_code_sequence"],
+            )
+            counts[key][row["entry_status"]] = row["count"]
+        return counts
+
+    @property
+    def rows(self) -> list[AppointmentRow]:
+        if self._rows is None:
+            crf_counts = self.get_metadata_counts(get_crf_metadata_model_cls())
+            requisition_counts = self.get_metadata_counts(get_requisition_metadata_model_cls())
+            self._rows = []
+            for appointment in self.appointments:
+                key = (
+                    appointment.visit_schedule_name,
+                    appointment.schedule_name,
+                    appointment.visit_code,
+                    appointment.visit_code_sequence,
+                )
+                self._rows.append(
+                    AppointmentRow(
+                        appointment=appointment,
+                        crf_counts=crf_counts.get(key, {}),
+                        requisition_counts=requisition_counts.get(key, {}),
+                    )
+                )
+            last_rows = {}
+            for row in self._rows:
+                schedule = (row.visit_schedule_name, row.schedule_name)
+                if last_row := last_rows.get(schedule):
+                    last_row.relative_next = row.appointment
+                last_rows[schedule] = row
+        return self._rows